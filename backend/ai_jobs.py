@@ -0,0 +1,295 @@
+# ai_jobs.py
+# Background image analysis for /ai/analyze.
+#
+# Requests are turned into jobs that run on a small bounded thread pool, so a
+# slow Gemini call never holds a web worker. Identical image sets are keyed by
+# a content hash and answered from the cache without calling the model again.
+# Job state is kept in the ai_jobs table (migrations/015_ai_jobs.sql), so a
+# poll can land on any worker process, and a duplicate submit joins the
+# unfinished job for the same images wherever it is running. A job whose
+# worker died stops heartbeating and is marked failed after stale_after.
+# The model client is pluggable: AI_CLIENT=fake swaps Gemini for a local
+# deterministic stand-in (tests, local dev, load testing).
+
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from psycopg2 import extras
+
+from metrics import external_call
+
+log = logging.getLogger("plink")
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+
+ANALYSIS_PROMPT = """
+    Analyze the provided image(s) of a property. Focus on the visual details. Return ONLY a single JSON object.
+    Keys MUST include: propertyType, locationType, ageOfProperty, interiorDescription, exteriorDescription, and locationDescription.
+    Combine analysis from all images if multiple are provided.
+    """
+
+
+class AIError(Exception):
+    pass
+
+
+class RetryableAIError(AIError):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(Exception):
+    pass
+
+
+# --- Model clients ---
+
+class GeminiClient:
+    def __init__(self, api_key, timeout=60):
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def analyze(self, image_data_list):
+        parts = [{"text": ANALYSIS_PROMPT}]
+        for item in image_data_list:
+            parts.append({"inlineData": {"mimeType": item['mimeType'], "data": item['data']}})
+
+        payload = {
+            "contents": [{"role": "user", "parts": parts}],
+            "generationConfig": {"responseMimeType": "application/json"}
+        }
+        headers = {'Content-Type': 'application/json', 'X-goog-api-key': self.api_key}
+
+        try:
+            with external_call("gemini"):
+                response = requests.post(GEMINI_API_URL, headers=headers, json=payload, timeout=self.timeout)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            raise RetryableAIError(f"Gemini request failed: {e}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get('Retry-After')
+            raise RetryableAIError(
+                f"Gemini returned status {response.status_code}",
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        if response.status_code not in [200, 201]:
+            try:
+                details = response.json().get("error", {}).get("message", "API key or billing issue.")
+            except ValueError:
+                details = "API key or billing issue."
+            raise AIError(f"AI analysis failed (Status {response.status_code}): {details}")
+
+        result = response.json()
+        text = result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            raise AIError("AI returned data in an invalid format. Please try again.")
+
+
+class FakeClient:
+    # Deterministic local stand-in: same images -> same answer, no network.
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def analyze(self, image_data_list):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return {
+            "propertyType": "House - family",
+            "locationType": "Residential",
+            "ageOfProperty": "Victorian",
+            "interiorDescription": f"Fake analysis of {len(image_data_list)} image(s).",
+            "exteriorDescription": "Brick facade with a front garden.",
+            "locationDescription": "Quiet residential street."
+        }
+
+
+def client_from_env(api_key):
+    if os.environ.get("AI_CLIENT", "gemini") == "fake":
+        return FakeClient(delay=float(os.environ.get("AI_FAKE_DELAY", 0)))
+    if not api_key:
+        return None
+    return GeminiClient(api_key, timeout=float(os.environ.get("AI_REQUEST_TIMEOUT", 60)))
+
+
+# --- Job manager ---
+
+def images_hash(image_data_list):
+    digest = hashlib.sha256()
+    for item in image_data_list:
+        digest.update(item['mimeType'].encode())
+        digest.update(b"\0")
+        digest.update(item['data'].encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+JOB_COLUMNS = """
+    id, content_hash AS hash, status, ai_data AS "aiData", error, attempts
+"""
+
+
+class AIJobManager:
+    def __init__(self, client, cache, get_conn, release_conn, max_workers=2, max_pending=50,
+                 max_retries=3, backoff_base=1.0, result_ttl=7 * 24 * 3600, job_ttl=3600, stale_after=600):
+        self.client = client
+        self.cache = cache
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.result_ttl = result_ttl
+        self.job_ttl = job_ttl
+        self.stale_after = stale_after
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+
+    def _result_key(self, content_hash):
+        return self.cache.make_key("ai", content_hash)
+
+    def _transaction(self, fn):
+        conn = self.get_conn()
+        try:
+            with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+                result = fn(cur)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+    def _expire(self, cur):
+        # Forget finished jobs after job_ttl, and fail unfinished ones whose
+        # worker stopped heartbeating (so their images can be submitted again)
+        cur.execute("""
+            DELETE FROM ai_jobs
+            WHERE created_at < NOW() - make_interval(secs => %s) AND status IN ('done', 'failed')
+        """, (self.job_ttl,))
+        cur.execute("""
+            UPDATE ai_jobs SET status = 'failed', error = 'Analysis was interrupted, please retry.',
+                               updated_at = NOW()
+            WHERE status IN ('queued', 'running') AND updated_at < NOW() - make_interval(secs => %s)
+        """, (self.stale_after,))
+
+    def _inflight(self, cur, content_hash):
+        cur.execute(f"""
+            SELECT {JOB_COLUMNS} FROM ai_jobs
+            WHERE content_hash = %s AND status IN ('queued', 'running')
+        """, (content_hash,))
+        return cur.fetchone()
+
+    def _enqueue(self, cur, content_hash):
+        # Returns (job, created); created is False when another submit of the
+        # same images is already queued or running.
+        self._expire(cur)
+        existing = self._inflight(cur, content_hash)
+        if existing:
+            return existing, False
+
+        if self._pending(cur) >= self.max_pending:
+            raise QueueFull("Too many analyses in progress, please retry shortly.")
+
+        cur.execute(f"""
+            INSERT INTO ai_jobs (id, content_hash, status, worker_id)
+            VALUES (%s, %s, 'queued', %s)
+            ON CONFLICT (content_hash) WHERE status IN ('queued', 'running') DO NOTHING
+            RETURNING {JOB_COLUMNS}
+        """, (uuid.uuid4().hex, content_hash, self.worker_id))
+        job = cur.fetchone()
+        if job is None:  # another worker queued the same images just now
+            return self._inflight(cur, content_hash), False
+        return job, True
+
+    def _record_done(self, cur, content_hash, ai_data):
+        cur.execute(f"""
+            INSERT INTO ai_jobs (id, content_hash, status, ai_data, worker_id)
+            VALUES (%s, %s, 'done', %s, %s)
+            RETURNING {JOB_COLUMNS}
+        """, (uuid.uuid4().hex, content_hash, extras.Json(ai_data), self.worker_id))
+        return cur.fetchone()
+
+    def _pending(self, cur):
+        cur.execute("SELECT COUNT(*) AS pending FROM ai_jobs WHERE status IN ('queued', 'running')")
+        return cur.fetchone()["pending"]
+
+    def pending_count(self):
+        return self._transaction(self._pending)
+
+    def submit(self, image_data_list):
+        content_hash = images_hash(image_data_list)
+        cached = self.cache.get(self._result_key(content_hash))
+        if cached is not None:
+            return dict(self._transaction(lambda cur: self._record_done(cur, content_hash, cached)))
+
+        job, created = self._transaction(lambda cur: self._enqueue(cur, content_hash))
+        if created:
+            self._executor.submit(self._run, job["id"], job["hash"], image_data_list)
+        return dict(job)
+
+    def get(self, job_id):
+        def read(cur):
+            cur.execute(f"SELECT {JOB_COLUMNS} FROM ai_jobs WHERE id = %s", (job_id,))
+            return cur.fetchone()
+        job = self._transaction(read)
+        return dict(job) if job else None
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{column} = %s" for column in fields)
+        values = [extras.Json(v) if column == "ai_data" else v for column, v in fields.items()]
+        self._transaction(lambda cur: cur.execute(
+            f"UPDATE ai_jobs SET {assignments}, updated_at = NOW() WHERE id = %s", values + [job_id]))
+
+    def _run(self, job_id, content_hash, image_data_list):
+        try:
+            self._update(job_id, status="running", worker_id=self.worker_id)
+            ai_data = self._analyze_with_retry(job_id, image_data_list)
+            self.cache.set(self._result_key(content_hash), ai_data, self.result_ttl)
+            self._update(job_id, status="done", ai_data=ai_data)
+        except Exception as e:
+            log.exception(f"AI job {job_id} failed")
+            try:
+                self._update(job_id, status="failed", error=str(e)[:1000])
+            except Exception:
+                # Left unfinished; _expire() fails it once it goes stale
+                log.exception(f"Could not record failure of AI job {job_id}")
+
+    def _analyze_with_retry(self, job_id, image_data_list):
+        attempts = 0
+        while True:
+            attempts += 1
+            self._update(job_id, attempts=attempts)  # doubles as the heartbeat
+            try:
+                return self.client.analyze(image_data_list)
+            except RetryableAIError as e:
+                if attempts > self.max_retries:
+                    raise AIError(f"AI service unavailable after {attempts} attempts: {e}")
+                # Exponential backoff with jitter, or whatever the server asked for.
+                delay = e.retry_after or self.backoff_base * (2 ** (attempts - 1))
+                time.sleep(delay + random.uniform(0, self.backoff_base))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def public_job(job):
+    data = {"jobId": job["id"], "status": job["status"]}
+    if job["status"] == "done":
+        data["aiData"] = job["aiData"]
+    elif job["status"] == "failed":
+        data["error"] = job["error"]
+    return data
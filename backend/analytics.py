@@ -0,0 +1,149 @@
+# analytics.py
+# Incremental rollups for the admin dashboard (tables from
+# migrations/005_analytics_rollups.sql).
+#
+# Every write that changes a count calls one of the record_* hooks with the
+# cursor of the same transaction, so the rollup and the row commit together.
+# rebuild_rollups() recomputes everything from the base tables; it runs as the
+# "rebuild_analytics" job to repair drift from writes made outside the app.
+#
+# pending_locations has no rollup: its rows are only ever created outside the
+# app, so no hook could see them. pending_statuses() counts it directly.
+
+
+def bump_total(cur, metric, delta=1):
+    cur.execute("""
+        INSERT INTO analytics_totals (metric, count) VALUES (%s, %s)
+        ON CONFLICT (metric) DO UPDATE SET count = analytics_totals.count + EXCLUDED.count
+    """, (metric, delta))
+
+
+def bump_daily(cur, metric, delta=1, day=None):
+    cur.execute("""
+        INSERT INTO analytics_daily_counts (day, metric, count) VALUES (COALESCE(%s, CURRENT_DATE), %s, %s)
+        ON CONFLICT (metric, day) DO UPDATE SET count = analytics_daily_counts.count + EXCLUDED.count
+    """, (day, metric, delta))
+
+
+def bump_property_type(cur, property_type, delta=1):
+    cur.execute("""
+        INSERT INTO analytics_property_type_counts (property_type, count) VALUES (%s, %s)
+        ON CONFLICT (property_type) DO UPDATE SET count = analytics_property_type_counts.count + EXCLUDED.count
+    """, (property_type or 'Unknown', delta))
+
+
+def bump_status(cur, source, status, delta=1):
+    cur.execute("""
+        INSERT INTO analytics_status_counts (source, status, count) VALUES (%s, %s, %s)
+        ON CONFLICT (source, status) DO UPDATE SET count = analytics_status_counts.count + EXCLUDED.count
+    """, (source, status or 'pending', delta))
+
+
+# --- write hooks ---
+
+def record_user_registered(cur):
+    bump_total(cur, 'users')
+    bump_daily(cur, 'users')
+
+
+def record_location_created(cur, property_type, status, count=1):
+    bump_total(cur, 'locations', count)
+    bump_daily(cur, 'locations', count)
+    bump_property_type(cur, property_type, count)
+    bump_status(cur, 'locations', status, count)
+
+
+def record_status_change(cur, source, old_status, new_status, count=1):
+    if (old_status or 'pending') == (new_status or 'pending'):
+        return
+    bump_status(cur, source, old_status, -count)
+    bump_status(cur, source, new_status, count)
+
+
+def record_property_type_change(cur, old_type, new_type):
+    if (old_type or 'Unknown') == (new_type or 'Unknown'):
+        return
+    bump_property_type(cur, old_type, -1)
+    bump_property_type(cur, new_type, 1)
+
+
+# --- reads ---
+
+def overview(cur):
+    cur.execute("SELECT metric, count FROM analytics_totals WHERE metric IN ('users', 'locations')")
+    totals = {row['metric']: row['count'] for row in cur.fetchall()}
+    return {
+        "total_users": totals.get('users', 0),
+        "total_locations": totals.get('locations', 0)
+    }
+
+
+def categories(cur):
+    cur.execute("""
+        SELECT property_type AS category, count FROM analytics_property_type_counts
+        WHERE count > 0 ORDER BY count DESC
+    """)
+    return cur.fetchall()
+
+
+def daily(cur, metric, days):
+    cur.execute("""
+        SELECT day, count FROM analytics_daily_counts
+        WHERE metric = %s AND day > CURRENT_DATE - %s
+        ORDER BY day
+    """, (metric, days))
+    return [{"day": row['day'].isoformat(), "count": row['count']} for row in cur.fetchall()]
+
+
+def statuses(cur, source):
+    cur.execute("""
+        SELECT status, count FROM analytics_status_counts
+        WHERE source = %s AND count > 0 ORDER BY status
+    """, (source,))
+    return {row['status']: row['count'] for row in cur.fetchall()}
+
+
+def pending_statuses(cur):
+    cur.execute("""
+        SELECT COALESCE(status, 'pending') AS status, COUNT(*) AS count
+        FROM pending_locations GROUP BY 1 ORDER BY 1
+    """)
+    return {row['status']: row['count'] for row in cur.fetchall()}
+
+
+# --- full rebuild ---
+
+REBUILD_SQL = [
+    "TRUNCATE analytics_totals, analytics_property_type_counts, analytics_status_counts",
+    "DELETE FROM analytics_daily_counts WHERE metric = 'locations'",
+    """
+    INSERT INTO analytics_totals (metric, count)
+    SELECT 'users', COUNT(*) FROM auth_users
+    UNION ALL SELECT 'locations', COUNT(*) FROM locations
+    """,
+    """
+    INSERT INTO analytics_daily_counts (day, metric, count)
+    SELECT created_at::date, 'locations', COUNT(*) FROM locations
+    WHERE created_at IS NOT NULL GROUP BY 1
+    """,
+    """
+    INSERT INTO analytics_property_type_counts (property_type, count)
+    SELECT COALESCE(property_type, 'Unknown'), COUNT(*) FROM locations GROUP BY 1
+    """,
+    """
+    INSERT INTO analytics_status_counts (source, status, count)
+    SELECT 'locations', COALESCE(status, 'pending'), COUNT(*) FROM locations GROUP BY 2
+    """,
+]
+
+
+def rebuild_rollups(conn, args=None):
+    # Locks the rollup tables for the duration so hooks wait instead of being lost.
+    cur = conn.cursor()
+    cur.execute("""
+        LOCK TABLE analytics_totals, analytics_daily_counts,
+                   analytics_property_type_counts, analytics_status_counts IN EXCLUSIVE MODE
+    """)
+    for sql in REBUILD_SQL:
+        cur.execute(sql)
+    cur.close()
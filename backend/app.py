@@ -1,21 +1,40 @@
-from flask import Flask, request, jsonify, send_from_directory 
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, g
 from flask_cors import CORS
 from functools import wraps
 import json
 import datetime
 import os
-import requests 
 from werkzeug.utils import secure_filename
-from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
+import time
+import uuid
 import psycopg2 
 from psycopg2 import pool, extras
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 
+from db_pool import pool_from_env, PoolTimeout
+import metrics
+from cache import cache_from_env, make_etag
+from auth_tokens import KeyRing, TokenVerifier
+from passwords import PasswordHasher, HashQueueFull, HashTimeout
+from storage import storage_from_env
+from uploads import UploadManager, UploadError, OffsetMismatch, public_upload
+from mailer import EmailWorker, create_campaign, expand_recipients, cancel_campaign
+from jobs import JobScheduler
+import analytics
+import crm
+import duplicates
+import bulk_io
+import saved
+import images
+import listings
+import location_detail
+import messaging
+import review_queue
+from streaming import ServerCursorStream, iter_json_object, rename_keys
+from ai_jobs import AIJobManager, QueueFull, client_from_env, public_job
+from search import normalise_filters, build_search_query, build_batch_query, build_facet_query, group_facets, paginate, page_size, sort_mode, InvalidCursor, InvalidFilter
+from geocoding import geocoder_from_env
 
-import bcrypt      # For password hashing
 import jwt         # For creating secure session tokens (JWTs)
 from datetime import timedelta
 import random      # ADDED: Needed for forgot password
@@ -26,33 +45,42 @@ DATABASE_URL = os.environ.get("DATABASE_URL")
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "SUPER_SECRET_FALLBACK_KEY_NEEDS_TO_BE_REPLACED") 
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
+# Structured JSON logs on stderr (see metrics.py); queries slower than
+# SLOW_QUERY_MS are logged with their SQL and counted in /metrics.
+log = metrics.configure_logging(os.environ.get("LOG_LEVEL", "INFO"))
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_MS", 500)) / 1000
+
 if not DATABASE_URL:
-    print("FATAL: DATABASE_URL environment variable not set.")
+    log.critical("DATABASE_URL environment variable not set.")
 
 # --- POSTGRESQL CONNECTION POOL SETUP ---
+# Sized per worker via DB_POOL_MIN / DB_POOL_MAX (see db_pool.py). Callers wait
+# up to DB_POOL_TIMEOUT seconds for a free connection instead of failing.
 db_pool = None
 try:
-    db_pool = psycopg2.pool.SimpleConnectionPool(1, 10, DATABASE_URL)
-    print("PostgreSQL connection pool initialized.")
+    db_pool = pool_from_env(DATABASE_URL)
+    log.info("PostgreSQL connection pool initialized.")
 except Exception as e:
-    print(f"Error initializing PostgreSQL connection pool: {e}")
+    log.error(f"Error initializing PostgreSQL connection pool: {e}")
 
 # Database Helper Functions
-def get_db_connection():
+def get_db_connection(timeout=None):
     if db_pool:
-        return db_pool.getconn()
+        with metrics.pool_wait_time.time():
+            return db_pool.getconn(timeout=timeout)
     raise Exception("Database connection pool is not initialized.")
 
-def release_db_connection(conn):
+def release_db_connection(conn, close=False):
     if db_pool and conn:
-        db_pool.putconn(conn)
+        db_pool.putconn(conn, close=close)
         
 def execute_sql(sql_query, params=None, fetch_one=False, fetch_all=False, commit=False):
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor(cursor_factory=extras.RealDictCursor) 
-        cur.execute(sql_query, params)
+        with metrics.QueryTimer("query", sql_query, SLOW_QUERY_SECONDS):
+            cur.execute(sql_query, params)
         
         if commit:
             conn.commit()
@@ -69,6 +97,8 @@ def execute_sql(sql_query, params=None, fetch_one=False, fetch_all=False, commit
             
         return {"success": True}
 
+    except PoolTimeout:
+        raise
     except Exception as e:
         if conn and commit:
             conn.rollback()
@@ -77,6 +107,49 @@ def execute_sql(sql_query, params=None, fetch_one=False, fetch_all=False, commit
         if conn:
             release_db_connection(conn)
 
+def run_in_transaction(fn):
+    # For writes that need several statements to commit together: fn(cur)
+    # gets a RealDictCursor and everything it does is committed (or rolled back) as one.
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+        # Timed as a whole; the slow log names the function rather than one statement
+        with metrics.QueryTimer("transaction", f"transaction: {getattr(fn, '__name__', 'fn')}", SLOW_QUERY_SECONDS):
+            result = fn(cur)
+            conn.commit()
+        return result
+    except PoolTimeout:
+        raise
+    except psycopg2.Error as e:
+        if conn:
+            conn.rollback()
+        raise ValueError(f"PostgreSQL Error: {e}")
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            release_db_connection(conn)
+
+
+def stream_sql(sql_query, params=None, itersize=500):
+    # Like execute_sql(fetch_all=True) but rows come from a server-side cursor,
+    # itersize at a time. The connection is held until the stream is closed.
+    conn = get_db_connection()
+    try:
+        with metrics.QueryTimer("stream", sql_query, SLOW_QUERY_SECONDS):
+            return ServerCursorStream(conn, release_db_connection, sql_query, params,
+                                      itersize=itersize, cursor_factory=extras.RealDictCursor)
+    except Exception as e:
+        raise ValueError(f"PostgreSQL Error: {e}")
+
+def stream_json_response(key, rows, transform=None):
+    # Same body as jsonify({key: [...]}) but sent in chunks as rows arrive.
+    response = Response(iter_json_object(key, rows, transform), mimetype='application/json')
+    response.call_on_close(rows.close)
+    return response
 
 app = Flask(__name__)
 
@@ -85,6 +158,24 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Cap for routes that parse a whole body in one go (limit_request_body below);
+# files bigger than this use /upload/chunked. Streamed bodies - chunks, bulk
+# import - are bounded by their handlers instead.
+UPLOAD_MAX_REQUEST_BYTES = int(os.environ.get("UPLOAD_MAX_REQUEST_BYTES", 50 * 1024 * 1024))
+
+def limit_request_body(max_bytes):
+    # Refuses the request before its body is read: 411 without a
+    # Content-Length, 413 over max_bytes
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.content_length is None:
+                return jsonify({"error": "Content-Length is required"}), 411
+            if request.content_length > max_bytes:
+                return jsonify({"error": f"Request body exceeds the {max_bytes // (1024 * 1024)} MB limit"}), 413
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
 
 CORS(app, resources={r"/*": {
     "origins": [
@@ -92,20 +183,136 @@ CORS(app, resources={r"/*": {
         "http://localhost:3000",            # Your Localhost (for testing)
         "https://plink-backend-api.onrender.com" # Self (sometimes needed)
     ],
-    "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     "allow_headers": ["Content-Type", "Authorization"],
     "supports_credentials": True
 }})
 
-# Initialize APScheduler
-scheduler = BackgroundScheduler()
-scheduler.start()
-atexit.register(lambda: scheduler.shutdown())
+# --- BACKGROUND JOBS ---
+# Jobs live in the scheduled_jobs table (see jobs.py), so they survive restarts
+# and every worker can poll safely: row locks make each job run exactly once.
+# Set SCHEDULER_ENABLED=false on processes that should only serve requests.
+job_scheduler = JobScheduler(get_db_connection, release_db_connection,
+                             poll_interval=float(os.environ.get("SCHEDULER_POLL_INTERVAL", 5)))
+RUN_BACKGROUND_WORKERS = bool(db_pool) and os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+
+# Pool exhaustion is a temporary overload, not a server bug: tell the client to retry.
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    response = jsonify({"error": "Server is busy, please retry shortly."})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+# --- RESPONSE CACHE ---
+# Namespaces: "search" (location search pages) and "reference" (property types/styles).
+# Writes that change what those endpoints return must call response_cache.invalidate().
+response_cache = cache_from_env()
+SEARCH_CACHE_TTL = int(os.environ.get("CACHE_SEARCH_TTL", 60))
+REFERENCE_CACHE_TTL = int(os.environ.get("CACHE_REFERENCE_TTL", 3600))
+
+def cached_json_response(namespace, key_params, ttl, loader, max_age=0):
+    # Serves loader() through the cache with an ETag. A matching If-None-Match
+    # gets a 304 without touching the database.
+    key = response_cache.make_key(namespace, key_params)
+    entry = response_cache.get(key)
+    if entry is None:
+        body = json.dumps(loader(), default=str)
+        entry = {"etag": make_etag(body), "body": body}
+        response_cache.set(key, entry, ttl)
+
+    if request.if_none_match.contains(entry["etag"]):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(entry["body"], status=200, mimetype='application/json')
+    response.set_etag(entry["etag"])
+    response.headers['Cache-Control'] = f"public, max-age={max_age}" if max_age else "no-cache"
+    return response
+
+# --- PASSWORD HASHING ---
+# bcrypt runs on a bounded pool (see passwords.py). When it is saturated we
+# answer 429 straight away rather than queueing auth work behind other traffic.
+password_hasher = PasswordHasher.from_env()
+atexit.register(lambda: password_hasher.shutdown())
+
+@app.errorhandler(HashQueueFull)
+def handle_hash_queue_full(e):
+    # Also catches HashTimeout: the pool is saturated rather than the client too fast
+    response = jsonify({"error": str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503 if isinstance(e, HashTimeout) else 429
+
+@app.route("/health/cache", methods=["GET"])
+def cache_health():
+    return jsonify(response_cache.stats()), 200
+
+@app.route("/health/db-pool", methods=["GET"])
+def db_pool_health():
+    if not db_pool:
+        return jsonify({"error": "Database connection pool is not initialized."}), 503
+    return jsonify(db_pool.stats()), 200
+
+# --- METRICS & REQUEST LOGS ---
+# Every request gets an id (X-Request-ID is honoured if the proxy sets one),
+# a latency/status sample and a JSON log line with its DB time and query count.
+# GET /metrics serves everything in the Prometheus text format; set
+# METRICS_TOKEN to require "Authorization: Bearer <token>" for it.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+@app.before_request
+def start_request_metrics():
+    request_id = (request.headers.get('X-Request-ID') or '')[:64] or uuid.uuid4().hex
+    metrics.start_request(request_id)
+
+@app.after_request
+def finish_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    elapsed = metrics.finish_request(route, request.method, response.status_code)
+    response.headers['X-Request-ID'] = metrics.current_request_id()
+    if route != "/metrics":
+        log.info("request", extra={"fields": {
+            "method": request.method,
+            "route": route,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 1),
+            "db_ms": round(g.db_seconds * 1000, 1),
+            "db_queries": g.db_queries,
+        }})
+    return response
+
+def pool_stat(name):
+    return lambda: db_pool.stats()[name] if db_pool else None
+
+metrics.registry.gauge_callback("plink_db_pool_in_use", "Pooled connections checked out.", pool_stat("in_use"))
+metrics.registry.gauge_callback("plink_db_pool_idle", "Pooled connections idle.", pool_stat("idle"))
+metrics.registry.gauge_callback("plink_db_pool_waiters", "Requests waiting for a pooled connection.", pool_stat("waiters"))
+metrics.registry.gauge_callback("plink_db_pool_timeouts_total", "Connection checkouts that timed out.",
+                                pool_stat("timeouts_total"), metric_type="counter")
+metrics.registry.gauge_callback("plink_cache_hits_total", "Response cache hits.",
+                                lambda: response_cache.hits, metric_type="counter")
+metrics.registry.gauge_callback("plink_cache_misses_total", "Response cache misses.",
+                                lambda: response_cache.misses, metric_type="counter")
+metrics.registry.gauge_callback("plink_password_hash_in_flight", "bcrypt operations running or queued.",
+                                lambda: password_hasher.in_flight)
+metrics.registry.gauge_callback("plink_password_hash_rejected_total", "bcrypt operations refused with 429.",
+                                lambda: password_hasher.rejected, metric_type="counter")
+metrics.registry.gauge_callback("plink_scheduler_queue_depth", "Jobs queued in scheduled_jobs.",
+                                lambda: job_scheduler.queue_depth() if db_pool else None)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 # =======================================================
 # === AUTHENTICATION DECORATOR ===
 # =======================================================
 
+# Signing keys (with key ids for rotation) and the verified-token cache live in auth_tokens.py
+jwt_keys = KeyRing.from_env(JWT_SECRET_KEY)
+token_verifier = TokenVerifier(jwt_keys, max_entries=int(os.environ.get("JWT_CACHE_SIZE", 10000)))
+
 def jwt_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -121,8 +328,8 @@ def jwt_required(f):
         token = auth_header.split("Bearer ")[1]
         
         try:
-            # Decode the JWT token
-            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
+            # Decode the JWT token (cached after the first successful check)
+            payload = token_verifier.verify(token)
             request.user_id = payload['user_id']
             request.user_email = payload['email']
             request.user_role = payload['role']
@@ -140,29 +347,36 @@ def jwt_required(f):
             return jsonify({"error": f"Authentication failed: {e}"}), 500
     return decorated
 
-# Function to send the email (uses PostgreSQL for analytics)
-def send_scheduled_email(recipients_type, subject, body, file_paths):
-    print(f"Sending email at {datetime.datetime.now()}...")
-    
-    metrics = {
-        "sent": 150, "opens_rate": 35.5, "clicks_rate": 12.1, 
-        "bounces": 2, "unsubscribes": 1 
-    }
-
+# --- OUTBOUND EMAIL ---
+# Emails go through the Postgres queue in mailer.py: queue_email() stores the
+# campaign and (now, or at send_at via a "send_campaign" job) one email_outbox
+# row per recipient; the EmailWorker thread sends them over SMTP in batches.
+job_scheduler.register(
+    "send_campaign",
+    lambda conn, args: expand_recipients(conn, args['campaign_id']),
+    on_cancel=lambda conn, args: cancel_campaign(conn, args['campaign_id'])
+)
+
+def queue_email(recipients_type, subject, body, attachments=(), send_at=None, created_by=None):
+    conn = get_db_connection()
     try:
-        sql = """
-        INSERT INTO email_analytics (subject, recipients_type, sent_date, metrics)
-        VALUES (%s, %s, NOW(), %s)
-        """
-        execute_sql(sql, (subject, recipients_type, json.dumps(metrics)), commit=True)
-    except Exception as e:
-        print(f"Error saving email analytics to PostgreSQL: {e}")
+        campaign_id = create_campaign(conn, recipients_type, subject, body, attachments, send_at)
+        job_id = None
+        if send_at:
+            job_id = job_scheduler.schedule(conn, "send_campaign", {"campaign_id": campaign_id},
+                                            run_at=send_at, created_by=created_by)
+            queued = 0
+        else:
+            queued = expand_recipients(conn, campaign_id)
+        conn.commit()
+        return campaign_id, job_id, queued
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_db_connection(conn)
 
-    for path in file_paths:
-        try:
-            os.remove(path)
-        except OSError as e:
-            print(f"Error deleting file {path}: {e}")
+email_worker = EmailWorker.from_env(get_db_connection, release_db_connection)
 
 
 # =======================================================
@@ -173,8 +387,6 @@ def send_scheduled_email(recipients_type, subject, body, file_paths):
 def register():
     data = request.json
 
-    print(f"🔥 BACKEND RECEIVED: {data}", flush=True)
-
     email = data.get("email")
     password = data.get("password")
     
@@ -188,14 +400,17 @@ def register():
     if not email or not password:
         return jsonify({"error": "Email and password required"}), 400
         
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed_password = password_hasher.hash(password)
     
     try:
         sql = """
             INSERT INTO auth_users (email, password_hash, user_role, phone_number, bio) 
             VALUES (%s, %s, %s, %s, %s)
         """
-        execute_sql(sql, (email, hashed_password, 'user', phone_number, bio), commit=True)
+        def insert_user(cur):
+            cur.execute(sql, (email, hashed_password, 'user', phone_number, bio))
+            analytics.record_user_registered(cur)
+        run_in_transaction(insert_user)
         
         return jsonify({"message": "Registration successful"}), 201
     except Exception as e:
@@ -213,7 +428,17 @@ def login():
     user = execute_sql(sql, (email,), fetch_one=True)
     
     # Check if user exists and password is correct
-    if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+    if user and password and password_hasher.verify(password, user['password_hash']):
+        # Upgrade hashes made with an old cost factor while we have the plain password
+        if password_hasher.needs_rehash(user['password_hash']):
+            try:
+                new_hash = password_hasher.hash(password)
+                execute_sql("UPDATE auth_users SET password_hash = %s WHERE id = %s",
+                            (new_hash, user['id']), commit=True)
+            except Exception as e:
+                # Not fatal - we'll try again on the next login
+                log.warning(f"Password rehash skipped for user {user['id']}: {e}")
+
         # Create JWT payload
         payload = {
             'user_id': str(user['id']), # Ensure ID is string for JWT
@@ -221,7 +446,7 @@ def login():
             'role': user['user_role'],
             'exp': datetime.datetime.utcnow() + timedelta(hours=24) # Token expires in 24 hours
         }
-        token = jwt.encode(payload, JWT_SECRET_KEY, algorithm='HS256')
+        token = jwt_keys.sign(payload)
         
         return jsonify({
             "message": "Login successful", 
@@ -232,25 +457,46 @@ def login():
         return jsonify({"error": "Invalid credentials"}), 401
     
 
+# Profile rows are cached in the shared response cache so /auth/me (hit on
+# every page load) doesn't need a DB round-trip. Each user has their own
+# "user:<id>" namespace; update_user_profile invalidates it, which every
+# worker sees when CACHE_REDIS_URL is set.
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 30))
+
+def user_cache_namespace(user_id):
+    return f"user:{user_id}"
+
+def user_to_dict(user):
+    return {
+        "id": str(user['id']),
+        "email": user['email'],
+        "role": user['user_role'],
+        # Use .get() to handle cases where they might be NULL in the DB
+        "phone_number": user.get('phone_number', ''),
+        "bio": user.get('bio', '')
+    }
+
+def load_user_profile(user_id):
+    key = response_cache.make_key(user_cache_namespace(user_id)) if USER_CACHE_TTL else None
+    user = response_cache.get(key) if key else None
+    if user is None:
+        sql = "SELECT id, email, user_role, phone_number, bio FROM auth_users WHERE id = %s"
+        row = execute_sql(sql, (user_id,), fetch_one=True)
+        if not row:
+            return None
+        user = user_to_dict(row)
+        if key:
+            response_cache.set(key, user, USER_CACHE_TTL)
+    return user
+
 @app.route("/auth/me", methods=["GET", "OPTIONS"])
 @jwt_required
 def get_current_user():
     try:
-        # UPDATED SQL: Added phone_number and bio to the SELECT list
-        sql = "SELECT id, email, user_role, phone_number, bio FROM auth_users WHERE id = %s"
-        user = execute_sql(sql, (request.user_id,), fetch_one=True)
+        user = load_user_profile(request.user_id)
         
         if user:
-            return jsonify({
-                "user": {
-                    "id": str(user['id']),
-                    "email": user['email'],
-                    "role": user['user_role'],
-                    # Use .get() to handle cases where they might be NULL in the DB
-                    "phone_number": user.get('phone_number', ''),
-                    "bio": user.get('bio', '')
-                }
-            }), 200
+            return jsonify({"user": user}), 200
         else:
             return jsonify({"error": "User not found"}), 404
     except Exception as e:
@@ -270,43 +516,65 @@ def update_user_profile():
         if not new_email:
              return jsonify({"error": "Email is required"}), 400
 
-        # 1. Base Update SQL for non-password fields
-        sql = """
+        # 1. Password hash first (if provided) so everything goes in one UPDATE
+        set_clause = "email = %s, phone_number = %s, bio = %s"
+        params = [new_email, new_phone, new_bio]
+        if new_password:
+             hashed_password = password_hasher.hash(new_password)
+             set_clause += ", password_hash = %s"
+             params.append(hashed_password)
+        params.append(request.user_id)
+
+        # 2. Update and return the new row in the same round-trip
+        sql = f"""
             UPDATE auth_users 
-            SET email = %s, phone_number = %s, bio = %s
+            SET {set_clause}
             WHERE id = %s
+            RETURNING id, email, user_role, phone_number, bio
         """
-        params = [new_email, new_phone, new_bio, request.user_id]
-
-        execute_sql(sql, tuple(params), commit=True)
-
-        # 2. Handle Password Update (if provided)
-        if new_password:
-             hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-             sql_pass = "UPDATE auth_users SET password_hash = %s WHERE id = %s"
-             execute_sql(sql_pass, (hashed_password, request.user_id), commit=True)
-
-        # 3. Fetch the updated user to return back to the frontend
-        fetch_sql = "SELECT id, email, user_role, phone_number, bio FROM auth_users WHERE id = %s"
-        updated_user = execute_sql(fetch_sql, (request.user_id,), fetch_one=True)
+        updated_user = execute_sql(sql, tuple(params), commit=True)
+        response_cache.invalidate(user_cache_namespace(request.user_id))
+        if not updated_user:
+            return jsonify({"error": "User not found"}), 404
+        user = user_to_dict(updated_user)
 
         return jsonify({
             "message": "Profile updated successfully",
-            "user": {
-                "id": str(updated_user['id']),
-                "email": updated_user['email'],
-                "role": updated_user['user_role'],
-                "phone_number": updated_user.get('phone_number', ''),
-                "bio": updated_user.get('bio', '')
-            }
+            "user": user
         }), 200
 
+    except HashQueueFull:
+        raise
     except Exception as e:
         # Catch duplicate email errors
         if "duplicate key value violates unique constraint" in str(e):
             return jsonify({"error": "This email address is already in use."}), 409
         return jsonify({"error": f"Failed to update profile: {str(e)}"}), 500
 
+# Postcode -> coordinates for radius search (GEOCODER, see geocoding.py)
+geocoder = geocoder_from_env()
+
+@app.route("/users/<user_id>/listings", methods=["GET"])
+@jwt_required
+def get_user_listings(user_id):
+    # Owners see their own listings; admins can look at anyone's
+    if str(user_id) != str(request.user_id) and request.user_role != 'admin':
+        return jsonify({"error": "You can only view your own listings"}), 403
+    try:
+        limit = max(1, min(request.args.get('limit', listings.DEFAULT_PAGE_SIZE, type=int), listings.MAX_PAGE_SIZE))
+        status = request.args.get('status') or None
+        if status and status not in listings.STATUSES:
+            return jsonify({"error": f"Unknown status: {status}"}), 400
+        sql, params = listings.build_listings_query(user_id, status=status, cursor=request.args.get('cursor'),
+                                                    limit=limit + 1)
+        return jsonify(listings.paginate(execute_sql(sql, params, fetch_one=True), limit)), 200
+    except listings.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/locations", methods=["POST"])
 @jwt_required
 def create_location():
@@ -341,59 +609,135 @@ def create_location():
             (user_id, contact_name, contact_email, contact_phone, 
              street_address, city, postcode, property_type, description,
              property_styles, rooms, interior_features, exterior_features, 
-             image_urls, video_url)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
+             image_urls, video_url, latitude, longitude)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id, property_type, status
         """
         
-        params = (
-            request.user_id, contact_name, contact_email, contact_phone,
-            street, city, postcode, p_type, desc,
-            styles, rooms, interior, exterior, 
-            images, video
-        )
-        
-        new_loc = execute_sql(sql, params, fetch_one=True, commit=True)
+        def insert_location(cur):
+            coords = geocoder.lookup(cur, postcode) or (None, None)
+            params = (
+                request.user_id, contact_name, contact_email, contact_phone,
+                street, city, postcode, p_type, desc,
+                styles, rooms, interior, exterior, 
+                images, video, coords[0], coords[1]
+            )
+            cur.execute(sql, params)
+            row = cur.fetchone()
+            analytics.record_location_created(cur, row['property_type'], row['status'])
+            # Same photos as an existing listing? Flag the pair for admin review
+            row['duplicates'] = duplicates.flag_location(cur, row['id'])
+            return row
+
+        new_loc = run_in_transaction(insert_location)
+        response_cache.invalidate("search")
         
-        return jsonify({"message": "Location created successfully", "id": new_loc['id']}), 201
+        return jsonify({"message": "Location created successfully", "id": new_loc['id'],
+                        "possibleDuplicates": new_loc['duplicates']}), 201
 
     except Exception as e:
-        print(f"Error creating location: {e}")
+        log.exception("Error creating location")
         return jsonify({"error": str(e)}), 500
 
 
 
-# REPLACE THE OLD upload_file FUNCTION WITH THIS:
+# --- MEDIA UPLOADS ---
+# Uploads are spooled to disk and pushed to storage (STORAGE_BACKEND) in the
+# background - see uploads.py. Clients get an upload id straight away and poll
+# GET /upload/<id> until it reports the final URL. Images then get thumbnail /
+# medium derivatives (images.py, IMAGE_DERIVATIVES=false to turn off) recorded
+# in location_images, which search cards use instead of the originals.
+media_storage = storage_from_env(UPLOAD_FOLDER)
+
+def record_derived_image(url, meta):
+    def record(cur):
+        images.record_image(cur, url, meta)
+        # Listings created before this hash existed get their duplicate check now
+        duplicates.flag_for_url(cur, url)
+    run_in_transaction(record)
+
+upload_manager = UploadManager(
+    media_storage,
+    os.environ.get("UPLOAD_TMP_DIR", "temp_uploads/media"),
+    max_bytes=int(os.environ.get("UPLOAD_MAX_BYTES", 500 * 1024 * 1024)),
+    max_workers=int(os.environ.get("UPLOAD_WORKERS", 4)),
+    image_processor=images.images_from_env(media_storage),
+    on_image=record_derived_image
+)
+atexit.register(lambda: upload_manager.shutdown())
+
+def upload_error_response(e):
+    body = {"error": str(e)}
+    if isinstance(e, OffsetMismatch):
+        body["received"] = e.received
+    return jsonify(body), e.status_code
 
 @app.route('/upload', methods=['POST'])
 @jwt_required
+@limit_request_body(UPLOAD_MAX_REQUEST_BYTES)
 def upload_file():
-    if 'file' not in request.files:
+    # Parsed by upload_manager rather than request.files, which would spool the
+    # file to a temp file of its own first
+    if request.mimetype != 'multipart/form-data':
         return jsonify({'error': 'No file part'}), 400
-    
-    file = request.files['file']
-    
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    
-    if file:
-        try:
-            # Upload directly to Cloudinary
-            # "folder" helps organize your images in their dashboard
-            upload_result = cloudinary.uploader.upload(
-                file, 
-                folder="plink_locations",
-                resource_type="auto" # Auto-detects image vs video
-            )
-            
-            # Get the secure URL (https)
-            file_url = upload_result.get('secure_url')
-            
-            return jsonify({'url': file_url}), 200
-            
-        except Exception as e:
-            print(f"Cloudinary Upload Error: {e}")
-            return jsonify({'error': 'Upload to cloud failed'}), 500
+    try:
+        record = upload_manager.receive_multipart(request.stream, request.mimetype, request.content_length,
+                                                  request.mimetype_params, request.user_id)
+        return jsonify(public_upload(record)), 202
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception:
+        log.exception("Upload failed")
+        return jsonify({'error': 'Upload failed'}), 500
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+@jwt_required
+def upload_status(upload_id):
+    try:
+        record = upload_manager.get(upload_id, request.user_id)
+        return jsonify(public_upload(record)), 200
+    except UploadError as e:
+        return upload_error_response(e)
+
+# Chunked / resumable uploads for large files:
+#   POST /upload/chunked                {filename, contentType, size}
+#   PUT  /upload/chunked/<id>?offset=N  raw chunk bytes (409 + "received" if out of order)
+#   POST /upload/chunked/<id>/complete
+@app.route('/upload/chunked', methods=['POST'])
+@jwt_required
+def start_chunked_upload():
+    data = request.json or {}
+    if not data.get('filename'):
+        return jsonify({'error': 'filename is required'}), 400
+    try:
+        size = int(data['size']) if data.get('size') is not None else None
+        record = upload_manager.start_chunked(request.user_id, data['filename'], data.get('contentType'), size)
+        return jsonify(public_upload(record)), 201
+    except ValueError:
+        return jsonify({'error': 'size must be an integer'}), 400
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.route('/upload/chunked/<upload_id>', methods=['PUT'])
+@jwt_required
+def upload_chunk(upload_id):
+    try:
+        offset = int(request.args.get('offset', 0))
+        record = upload_manager.append_chunk(upload_id, request.user_id, offset, request.stream)
+        return jsonify(public_upload(record)), 200
+    except ValueError:
+        return jsonify({'error': 'offset must be an integer'}), 400
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.route('/upload/chunked/<upload_id>/complete', methods=['POST'])
+@jwt_required
+def complete_chunked_upload(upload_id):
+    try:
+        record = upload_manager.complete_chunked(upload_id, request.user_id)
+        return jsonify(public_upload(record)), 202
+    except UploadError as e:
+        return upload_error_response(e)
 
 # 2. SERVE UPLOADED FILES
 @app.route('/static/uploads/<filename>')
@@ -404,8 +748,12 @@ def serve_upload(filename):
 @app.route('/static/property-types', methods=['GET'])
 def get_property_types():
     try:
-        types = execute_sql("SELECT label, image_url FROM property_types", fetch_all=True)
-        return jsonify(types), 200
+        # Reference data almost never changes: let browsers keep it for an hour too
+        return cached_json_response(
+            "reference", "property_types", REFERENCE_CACHE_TTL,
+            lambda: execute_sql("SELECT label, image_url FROM property_types", fetch_all=True),
+            max_age=REFERENCE_CACHE_TTL
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -413,132 +761,449 @@ def get_property_types():
 @app.route('/static/property_styles', methods=['GET'])
 def get_property_styles():
     try:
-        styles = execute_sql("SELECT label, image_url FROM property_styles", fetch_all=True)
-        return jsonify(styles), 200
+        return cached_json_response(
+            "reference", "property_styles", REFERENCE_CACHE_TTL,
+            lambda: execute_sql("SELECT label, image_url FROM property_styles", fetch_all=True),
+            max_age=REFERENCE_CACHE_TTL
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # --- ADD THIS TO app.py ---
 
+def thumbnail(img):
+    # One card image: src plus srcset / size / placeholder when derivatives exist
+    if not img['thumb']:
+        return {"src": img['url']}
+    return {
+        "src": img['thumb'],
+        "srcSet": f"{img['thumb']} {images.VARIANTS['thumb']}w, {img['medium']} {images.VARIANTS['medium']}w",
+        "width": img['width'],
+        "height": img['height'],
+        "placeholder": img['lqip'],
+    }
+
+def location_card(loc):
+    # Compact card shared by search results and saved lists (CARD_COLUMNS rows)
+    card = {
+        "id": loc['id'],
+        "title": f"{loc['property_type']} in {loc['city']}", 
+        "type": loc['property_type'],
+        "location": loc['city'],
+        "age": loc['age'] or 'Unknown',
+        "rooms": loc['rooms'] or [],
+        # Thumbnails only (the original until its derivatives exist); the full
+        # set comes from GET /locations/<id>
+        "images": [img['thumb'] or img['url'] for img in loc['images'] or []],
+        "thumbnails": [thumbnail(img) for img in loc['images'] or []],
+        "postcode": loc['postcode']
+    }
+    if loc['latitude'] is not None and loc['longitude'] is not None:
+        card["coords"] = [loc['latitude'], loc['longitude']]
+    if 'distance_km' in loc:
+        card["distanceKm"] = round(loc['distance_km'], 2)
+    return card
+
 @app.route("/locations/search", methods=["GET"])
 def search_locations():
     try:
-        p_type = request.args.get('propertyType')
-        age = request.args.get('age') 
-        room = request.args.get('rooms')
-        postcode = request.args.get('postcode')
-        
-        sql = "SELECT * FROM locations WHERE status != 'archived'"
-        params = []
-        
-        if p_type:
-            sql += " AND property_type = %s"
-            params.append(p_type)
-        if age:
-            sql += " AND %s = ANY(property_styles)"
-            params.append(age)
-        if room:
-            sql += " AND %s = ANY(rooms)"
-            params.append(room)
-        if postcode:
-            sql += " AND postcode ILIKE %s"
-            params.append(f"%{postcode}%")
-            
-        sql += " ORDER BY created_at DESC"
-        
-        locations = execute_sql(sql, tuple(params), fetch_all=True)
-        
-        results = []
-        for loc in locations:
-            img_list = loc.get('image_urls')
-            if img_list is None:
-                img_list = []
-                
-            results.append({
-                "id": loc['id'],
-                "title": f"{loc['property_type']} in {loc['city']}", 
-                "type": loc['property_type'],
-                "location": loc['city'],
-                "age": loc['property_styles'][0] if loc['property_styles'] else 'Unknown',
-                "rooms": loc['rooms'] or [],
-                "internalFeatures": loc['interior_features'] or [],
-                "externalFeatures": loc['exterior_features'] or [],
-                "description": loc['description'],
-                "parking": "Details on request", 
-                "images": img_list, # <--- THIS MAPS IT TO THE FRONTEND KEY
-                "videoUrl": loc['video_url'],
-                "postcode": loc['postcode']
-            })
+        # Filters: propertyType, age, rooms, postcode, city, free-text q and
+        # lat/lng/radius_km (see search.py for the index each one relies on)
+        filters = normalise_filters(request.args)
+        limit = page_size(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        # Facet counts describe the whole filtered set, so only the first page carries them
+        with_facets = request.args.get('facets', '').lower() == 'true' and not cursor
+
+        def load_page():
+            # Fetch one extra row to know whether there is a next page
+            sql, params = build_search_query(filters, cursor=cursor, limit=limit + 1)
+            locations = execute_sql(sql, tuple(params), fetch_all=True)
+            locations, next_cursor = paginate(locations, limit, sort_mode(filters))
             
-        return jsonify(results), 200
+            # Compact cards only - the full record comes from GET /locations/<id>
+            page = {"results": [location_card(loc) for loc in locations], "nextCursor": next_cursor}
 
+            if with_facets:
+                sql, params = build_facet_query(filters)
+                page["facets"] = group_facets(execute_sql(sql, tuple(params), fetch_all=True))
+            return page
+
+        key_params = {"filters": filters, "limit": limit, "cursor": cursor, "facets": with_facets}
+        return cached_json_response("search", key_params, SEARCH_CACHE_TTL, load_page)
+
+    except (InvalidCursor, InvalidFilter) as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolTimeout:
+        raise
     except Exception as e:
-        print(f"Search error: {e}")
+        log.exception("Search failed")
         return jsonify({"error": str(e)}), 500
-    
-# --- AI ANALYSIS ROUTE ---
+
+# Detail pages are served from a per-id cache entry ("location:<id>"), dropped
+# by PATCH and by status changes, and revalidated with ETag / Last-Modified.
+LOCATION_CACHE_TTL = int(os.environ.get("CACHE_LOCATION_TTL", 300))
+# 0 = browsers/CDNs must revalidate every time (a cheap 304); raise to let them serve stale briefly
+LOCATION_MAX_AGE = int(os.environ.get("LOCATION_MAX_AGE", 0))
+
+def location_cache_namespace(location_id):
+    return f"location:{location_id}"
+
+def load_location_detail(location_id):
+    # Read-through: returns the cached detail, or loads and caches it (None if not found)
+    key = response_cache.make_key(location_cache_namespace(location_id))
+    detail = response_cache.get(key)
+    if detail is None:
+        row = execute_sql(location_detail.DETAIL_SQL, (location_id,), fetch_one=True)
+        if not row:
+            return None
+        detail = location_detail.to_detail(row)
+        response_cache.set(key, detail, LOCATION_CACHE_TTL)
+    return detail
+
+@app.route("/locations/<int:location_id>", methods=["GET"])
+def get_location(location_id):
+    # ?fields=title,images,... returns only those keys (id is always included)
+    try:
+        fields = location_detail.parse_fields(request.args.get('fields'))
+    except location_detail.InvalidField as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        detail = load_location_detail(location_id)
+        if detail is None:
+            return jsonify({"error": "Location not found"}), 404
+
+        body = json.dumps(location_detail.project(detail, fields), default=str)
+        response = app.response_class(body, status=200, mimetype='application/json')
+        response.set_etag(make_etag(body))
+        if detail['updatedAt']:
+            response.last_modified = datetime.datetime.fromisoformat(detail['updatedAt'])
+        response.headers['Cache-Control'] = f"public, max-age={LOCATION_MAX_AGE}" if LOCATION_MAX_AGE else "no-cache"
+        # 304 when If-None-Match / If-Modified-Since still match
+        return response.make_conditional(request)
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/locations/<int:location_id>", methods=["PATCH"])
+@jwt_required
+def edit_location(location_id):
+    # Body: any subset of the POST /locations fields. Only columns whose value
+    # changed are written; the owner or an admin may edit.
+    try:
+        changed = run_in_transaction(lambda cur: location_detail.update_location(
+            cur, location_id, request.json, request.user_id, request.user_role == 'admin', geocoder))
+        if changed:
+            response_cache.invalidate("search", location_cache_namespace(location_id))
+        return jsonify({"message": "Location updated" if changed else "No changes", "changed": changed}), 200
+    except location_detail.LocationNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
+    except location_detail.InvalidField as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        log.exception("Error updating location")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/locations/batch", methods=["GET"])
+def get_locations_batch():
+    # ?ids=3,1,2 -> cards in that order from a single query. Ids that are gone
+    # (deleted or archived) come back in "missing" so clients can drop them.
+    try:
+        ids = saved.parse_ids(request.args.get('ids', ''), limit=200)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not ids:
+        return jsonify({"results": [], "missing": []}), 200
+    try:
+        sql, params = build_batch_query(ids)
+        rows = {row['id']: row for row in execute_sql(sql, tuple(params), fetch_all=True)}
+        return jsonify({
+            "results": [location_card(rows[i]) for i in ids if i in rows],
+            "missing": [i for i in ids if i not in rows]
+        }), 200
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- SAVED LOCATIONS ---
+# Stored per user (saved.py); the client keeps ids only and loads cards from
+# GET /locations/batch.
+@app.route("/saved", methods=["GET"])
+@jwt_required
+def get_saved():
+    try:
+        return jsonify({"ids": run_in_transaction(lambda cur: saved.list_ids(cur, request.user_id))}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/saved/<int:location_id>", methods=["PUT"])
+@jwt_required
+def add_saved(location_id):
+    try:
+        if not run_in_transaction(lambda cur: saved.add(cur, request.user_id, location_id)):
+            return jsonify({"error": "Location not found"}), 404
+        return jsonify({"message": "Location saved", "id": location_id}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/saved/<int:location_id>", methods=["DELETE"])
+@jwt_required
+def remove_saved(location_id):
+    try:
+        run_in_transaction(lambda cur: saved.remove(cur, request.user_id, location_id))
+        return jsonify({"message": "Location removed", "id": location_id}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/saved/sync", methods=["POST"])
+@jwt_required
+def sync_saved():
+    # Body: {"ids": [...]} - the client's local list, newest first. Returns the
+    # merged list so the client can replace its copy in one round-trip.
+    try:
+        ids = saved.parse_ids((request.json or {}).get('ids', []))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        return jsonify({"ids": run_in_transaction(lambda cur: saved.merge(cur, request.user_id, ids))}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- MESSAGING ---
+# Conversations and paged history live in Postgres (messaging.py). New messages
+# are pushed to GET /messages/stream (Server-Sent Events) through message_broker:
+# in-process by default, or Postgres LISTEN/NOTIFY with MESSAGE_BROKER=postgres
+# when several workers serve streams. Each open stream holds a worker thread
+# but no database connection, so run gunicorn with --threads and cap streams per
+# process with MESSAGE_STREAMS_MAX.
+message_broker = messaging.broker_from_env(DATABASE_URL, get_db_connection, release_db_connection)
+MESSAGE_STREAMS_MAX = int(os.environ.get("MESSAGE_STREAMS_MAX", 50))
+MESSAGE_STREAM_HEARTBEAT = float(os.environ.get("MESSAGE_STREAM_HEARTBEAT", 15))
+# Streams end after this long and EventSource reconnects, so workers can recycle
+MESSAGE_STREAM_MAX_SECONDS = float(os.environ.get("MESSAGE_STREAM_MAX_SECONDS", 300))
+atexit.register(lambda: message_broker.stop())
+
+metrics.registry.gauge_callback("plink_message_streams", "Open message streams in this process.",
+                                lambda: message_broker.subscriber_count)
+
+def message_page_size():
+    return max(1, min(request.args.get('limit', messaging.DEFAULT_PAGE_SIZE, type=int), messaging.MAX_PAGE_SIZE))
+
+@app.route("/conversations", methods=["POST"])
+@jwt_required
+def start_conversation():
+    # Body: {"locationId": ...}. Returns the caller's conversation with the
+    # location's owner, creating it the first time.
+    try:
+        location_id = int((request.json or {}).get('locationId'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "locationId is required"}), 400
+    try:
+        conversation, created = run_in_transaction(
+            lambda cur: messaging.get_or_create_conversation(cur, location_id, request.user_id))
+        return jsonify({"conversation": messaging.to_conversation(conversation, request.user_id)}), 201 if created else 200
+    except messaging.ConversationNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/conversations", methods=["GET"])
+@jwt_required
+def get_conversations():
+    try:
+        limit = message_page_size()
+        rows = run_in_transaction(lambda cur: messaging.list_conversations(
+            cur, request.user_id, cursor=request.args.get('cursor'), limit=limit + 1))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return jsonify({
+            "conversations": [messaging.to_conversation(row, request.user_id) for row in rows],
+            "nextCursor": messaging.encode_cursor(rows[-1]['last_message_at'], rows[-1]['id']) if has_more else None,
+        }), 200
+    except messaging.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/conversations/<int:conversation_id>/messages", methods=["GET"])
+@jwt_required
+def get_conversation_messages(conversation_id):
+    # Newest page first; ?cursor=<nextCursor> walks back through older messages.
+    try:
+        limit = message_page_size()
+
+        def load(cur):
+            conversation = messaging.get_conversation(cur, conversation_id, request.user_id)
+            rows = messaging.history(cur, conversation_id, cursor=request.args.get('cursor'), limit=limit + 1)
+            return conversation, rows
+
+        conversation, rows = run_in_transaction(load)
+        page = messaging.paginate(rows, limit)
+        page["conversation"] = messaging.to_conversation(conversation, request.user_id)
+        return jsonify(page), 200
+    except messaging.ConversationNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except messaging.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/conversations/<int:conversation_id>/messages", methods=["POST"])
+@jwt_required
+def send_message(conversation_id):
+    # Body: {"text", "fileUrl", "fileName"} - attachments are uploaded first via /upload.
+    try:
+        text, file_url, file_name = messaging.validate_message(request.json or {}, media_storage.url_prefix)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        def post(cur):
+            conversation = messaging.get_conversation(cur, conversation_id, request.user_id)
+            return conversation, messaging.post_message(cur, conversation_id, request.user_id,
+                                                        text, file_url, file_name)
+
+        conversation, row = run_in_transaction(post)
+        message = messaging.to_message(row)
+        try:
+            message_broker.publish(
+                [messaging.user_channel(conversation['owner_id']), messaging.user_channel(conversation['enquirer_id'])],
+                {"type": "message", "message": message})
+        except Exception:
+            # The message is stored; open streams pick it up when they reconnect
+            log.exception(f"Publishing message {row['id']} failed")
+        return jsonify({"message": message}), 201
+    except messaging.ConversationNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def sse_event(event_type, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event_type}", f"data: {json.dumps(data, default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+@app.route("/messages/stream", methods=["GET"])
+def message_stream():
+    # EventSource can't send an Authorization header, so the token comes as ?token=.
+    try:
+        payload = token_verifier.verify(request.args.get('token', ''))
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token has expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    if message_broker.subscriber_count >= MESSAGE_STREAMS_MAX:
+        response = jsonify({"error": "Too many open streams, please retry shortly."})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    user_id = payload['user_id']
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0)
+    except ValueError:
+        last_event_id = 0
+
+    # Subscribe before replaying so nothing posted in between is lost. Live
+    # events are passed on as they come: ids are not committed in order, so
+    # one lower than the last replayed id can still be new. The client drops
+    # any message it already has by id.
+    subscription = message_broker.subscribe(messaging.user_channel(user_id))
+    try:
+        missed = run_in_transaction(lambda cur: messaging.messages_since(cur, user_id, last_event_id)) \
+            if last_event_id else []
+    except Exception:
+        message_broker.unsubscribe(subscription)
+        raise
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            for row in missed:
+                yield sse_event("message", {"type": "message", "message": messaging.to_message(row)}, row['id'])
+            deadline = time.monotonic() + MESSAGE_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline and not subscription.overflowed:
+                event = subscription.get(timeout=MESSAGE_STREAM_HEARTBEAT)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield sse_event(event["type"], event, event["message"]["id"])
+        finally:
+            message_broker.unsubscribe(subscription)
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Also covers clients that disconnect before the generator starts
+    response.call_on_close(lambda: message_broker.unsubscribe(subscription))
+    return response
+
+# --- AI ANALYSIS ROUTES ---
+# Analysis runs as a background job (see ai_jobs.py). Submitting returns a job id
+# straight away; clients poll GET /ai/analyze/<job_id> for the result.
+ai_client = client_from_env(GEMINI_API_KEY)
+ai_jobs = AIJobManager(
+    ai_client, response_cache, get_db_connection, release_db_connection,
+    max_workers=int(os.environ.get("AI_MAX_CONCURRENCY", 2)),
+    max_pending=int(os.environ.get("AI_MAX_PENDING", 50)),
+    max_retries=int(os.environ.get("AI_MAX_RETRIES", 3))
+)
+atexit.register(lambda: ai_jobs.shutdown())
+
 @app.route("/ai/analyze", methods=["POST"])
+@limit_request_body(UPLOAD_MAX_REQUEST_BYTES)
 def ai_analyze():
     data = request.json
     image_data_list = data.get('imageData', [])
     
-    if not image_data_list or not GEMINI_API_KEY:
+    if not ai_client:
         return jsonify({"error": "AI service failed: Gemini API Key is not configured."}), 400
+    if not image_data_list:
+        return jsonify({"error": "No images provided."}), 400
+    if any('mimeType' not in item or 'data' not in item for item in image_data_list):
+        return jsonify({"error": "Each image needs mimeType and data."}), 400
 
-    user_prompt = """
-    Analyze the provided image(s) of a property. Focus on the visual details. Return ONLY a single JSON object. 
-    Keys MUST include: propertyType, locationType, ageOfProperty, interiorDescription, exteriorDescription, and locationDescription.
-    Combine analysis from all images if multiple are provided.
-    """
-    
-    parts = [{"text": user_prompt}]
-    for item in image_data_list:
-        parts.append({
-            "inlineData": {
-                "mimeType": item['mimeType'],
-                "data": item['data']
-            }
-        })
-    
-    gemini_payload = {
-        "contents": [{"role": "user", "parts": parts}],
-        "generationConfig": { 
-            "responseMimeType": "application/json",
-        }
-    }
+    try:
+        job = ai_jobs.submit(image_data_list)
+    except QueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-    gemini_api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'X-goog-api-key': GEMINI_API_KEY
-    }
+    # Already analysed images come back immediately from the cache
+    if job['status'] == 'done':
+        return jsonify({"message": "AI analysis successful", **public_job(job)}), 200
+    return jsonify({"message": "AI analysis queued", **public_job(job)}), 202
 
+@app.route("/ai/analyze/<job_id>", methods=["GET"])
+def ai_analyze_status(job_id):
     try:
-        response = requests.post(gemini_api_url, headers=headers, json=gemini_payload)
-        
-        if response.status_code not in [200, 201]:
-             error_details = response.json().get("error", {}).get("message", "API key or billing issue.")
-             return jsonify({"error": f"AI analysis failed (Status {response.status_code}): {error_details}"}), 503
-        
-        response.raise_for_status() 
-        
-        gemini_result = response.json()
-        
-        generated_json_text = gemini_result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-        
-        ai_data = json.loads(generated_json_text)
-        
-        return jsonify({"message": "AI analysis successful", "aiData": ai_data}), 200
-
-    except requests.exceptions.RequestException as e:
-        print(f"Gemini API Request Error: {e}")
-        return jsonify({"error": "AI service failed: Check network or API service status."}), 503
-    except json.JSONDecodeError:
-        print(f"AI response was not valid JSON: {generated_json_text}")
-        return jsonify({"error": "AI returned data in an invalid format. Please try again."}), 500
+        job = ai_jobs.get(job_id)
+    except PoolTimeout:
+        raise
     except Exception as e:
-        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+        return jsonify({"error": str(e)}), 500
+    if not job:
+        return jsonify({"error": "Job not found or expired"}), 404
+    # status is one of queued / running / done / failed
+    return jsonify(public_job(job)), 200
 
 
 # =======================================================
@@ -551,20 +1216,15 @@ def verify_token_route():
     # This route verifies the JWT role and expiration
     return jsonify({"message": "Token is valid", "admin": request.user_role == 'admin'}), 200
 
+# Dashboard numbers come from the rollup tables kept by analytics.py, so these
+# stay constant-time however big locations / auth_users get.
+job_scheduler.register("rebuild_analytics", analytics.rebuild_rollups)
+
 @app.route("/admin/analytics/overview", methods=["GET"])
 @jwt_required
 def analytics_overview():
     try:
-        user_count_result = execute_sql("SELECT COUNT(*) FROM user_collection", fetch_one=True)
-        total_users = user_count_result['count'] if user_count_result else 0
-        
-        location_count_result = execute_sql("SELECT COUNT(*) FROM locations", fetch_one=True)
-        total_locations = location_count_result['count'] if location_count_result else 0
-        
-        return jsonify({
-            "total_users": total_users,
-            "total_locations": total_locations
-        }), 200
+        return jsonify(run_in_transaction(analytics.overview)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -575,13 +1235,9 @@ def analytics_users():
         # Note: 'auth_users' is for login, 'user_collection' is for general profile data.
         # We need a join here for full user analytics, but for now, we use the original table.
         sql = "SELECT id, email, \"Name\" as name, created_at as registered FROM user_collection ORDER BY created_at DESC"
-        users_list = execute_sql(sql, fetch_all=True)
-        
-        for user in users_list:
-             if user.get('registered') and isinstance(user['registered'], datetime.datetime):
-                user['registered'] = user['registered'].isoformat()
-        
-        return jsonify({"data": users_list}), 200
+        return stream_json_response("data", stream_sql(sql))
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -589,36 +1245,117 @@ def analytics_users():
 @jwt_required
 def analytics_categories():
     try:
-        sql = """
-        SELECT "propertyType" as category, COUNT(*) as count 
-        FROM locations 
-        GROUP BY "propertyType"
-        """
-        chart_data = execute_sql(sql, fetch_all=True)
+        chart_data = run_in_transaction(analytics.categories)
         
         return jsonify({"data": chart_data}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/admin/analytics/daily", methods=["GET"])
+@jwt_required
+def analytics_daily():
+    try:
+        metric = request.args.get('metric', 'locations')
+        days = min(request.args.get('days', 30, type=int), 366)
+        data = run_in_transaction(lambda cur: analytics.daily(cur, metric, days))
+        return jsonify({"metric": metric, "data": data}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/analytics/statuses", methods=["GET"])
+@jwt_required
+def analytics_statuses():
+    try:
+        return jsonify({
+            "locations": run_in_transaction(lambda cur: analytics.statuses(cur, 'locations')),
+            "pending_locations": run_in_transaction(analytics.pending_statuses)
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/analytics/rebuild", methods=["POST"])
+@jwt_required
+def analytics_rebuild():
+    # Full recount from the base tables, run in the background by the job scheduler
+    try:
+        def schedule(cur):
+            return job_scheduler.schedule(cur.connection, "rebuild_analytics", {}, created_by=request.user_email)
+        job_id = run_in_transaction(schedule)
+        return jsonify({"message": "Analytics rebuild queued.", "job_id": job_id}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- REVIEW QUEUE ---
+# pending_locations paged by status (review_queue.py). Admins claim batches
+# with SKIP LOCKED, so several can work the queue without taking the same rows,
+# and approve / reject many ids in one statement. No cached response reads
+# pending_locations (search and location detail read locations), so these
+# writes have nothing to invalidate.
 @app.route("/admin/locations", methods=["GET"])
 @jwt_required
 def get_locations():
     try:
-        sql = """
-        SELECT id, "propertyType" as title, status, "adminUser" 
-        FROM pending_locations 
-        ORDER BY id DESC
-        """
-        locations_list = execute_sql(sql, fetch_all=True)
-        
-        for loc in locations_list:
-            loc['title'] = loc['title'] or "No Type"
-            loc['status'] = loc['status'] or "pending"
-            
-        return jsonify({"locations": locations_list}), 200
+        limit = max(1, min(request.args.get('limit', review_queue.DEFAULT_PAGE_SIZE, type=int), review_queue.MAX_PAGE_SIZE))
+        status = request.args.get('status') or None
+        if status and status not in review_queue.STATUSES:
+            return jsonify({"error": f"Unknown status: {status}"}), 400
+        sql, params = review_queue.build_queue_query(status, cursor=request.args.get('cursor'), limit=limit + 1)
+
+        def read_page(cur):
+            cur.execute(sql, params)
+            return review_queue.paginate(cur.fetchall(), analytics.pending_statuses(cur), limit)
+
+        return jsonify(run_in_transaction(read_page)), 200
+    except review_queue.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/locations/claim", methods=["POST"])
+@jwt_required
+def claim_locations():
+    # Body: {"count": N} - assigns the next N pending locations to the caller
+    count = (request.json or {}).get('count', 10)
+    if not isinstance(count, int) or not 1 <= count <= review_queue.MAX_CLAIM:
+        return jsonify({"error": f"count must be between 1 and {review_queue.MAX_CLAIM}"}), 400
+    try:
+        claimed = run_in_transaction(lambda cur: review_queue.claim(cur, request.user_email, count))
+        return jsonify({"locations": [review_queue.to_item(row) for row in claimed]}), 200
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def decide_locations(decision):
+    # Body: {"ids": [...]}. Ids already decided, or claimed by another admin, come back as skipped.
+    try:
+        ids = saved.parse_ids((request.json or {}).get('ids', []), limit=review_queue.MAX_BATCH)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not ids:
+        return jsonify({"error": "No ids given"}), 400
+    try:
+        changed = run_in_transaction(lambda cur: review_queue.decide(cur, ids, decision, request.user_email))
+        updated = sorted(row['id'] for row in changed)
+        done = set(updated)
+        return jsonify({"updated": updated, "skipped": [i for i in ids if i not in done]}), 200
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/admin/locations/approve", methods=["POST"])
+@jwt_required
+def approve_locations():
+    return decide_locations("approve")
+
+@app.route("/admin/locations/reject", methods=["POST"])
+@jwt_required
+def reject_locations():
+    return decide_locations("reject")
+
 @app.route("/admin/locations/assign-admin/<location_id>", methods=["POST"])
 @jwt_required
 def assign_admin(location_id):
@@ -644,46 +1381,124 @@ def approve_location(location_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# --- DUPLICATE LISTINGS ---
+# Pairs flagged by duplicates.py when listings share photos (by perceptual hash).
+@app.route("/admin/duplicates", methods=["GET"])
+@jwt_required
+def get_duplicate_clusters():
+    try:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+        return jsonify({"clusters": run_in_transaction(lambda cur: duplicates.clusters(cur, limit))}), 200
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/duplicates/dismiss", methods=["POST"])
+@jwt_required
+def dismiss_duplicates():
+    # Body: {"ids": [...]} - the listings of a cluster that are not duplicates of each other
+    try:
+        ids = saved.parse_ids((request.json or {}).get('ids', []), limit=200)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(ids) < 2:
+        return jsonify({"error": "At least two ids are required"}), 400
+    try:
+        dismissed = run_in_transaction(lambda cur: duplicates.dismiss(cur, ids))
+        return jsonify({"message": f"{dismissed} pairs dismissed", "dismissed": dismissed}), 200
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- BULK IMPORT / EXPORT ---
+# Both directions stream (see bulk_io.py): the import body is read row by row
+# and inserted in batches, the export is written from a server-side cursor.
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", 500))
+BULK_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def bulk_format(default="csv"):
+    fmt = request.args.get('format')
+    if not fmt:
+        mimetype = request.mimetype or ""
+        fmt = "ndjson" if "ndjson" in mimetype or "jsonl" in mimetype else default
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}. Use csv or ndjson.")
+    return fmt
+
+@app.route("/admin/locations/import", methods=["POST"])
+@jwt_required
+def import_locations():
+    try:
+        fmt = bulk_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        report = bulk_io.import_locations(conn, request.stream, fmt, request.user_id, batch_size=BULK_BATCH_SIZE)
+        if report["inserted"]:
+            response_cache.invalidate("search")
+        return jsonify(report), 200
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            release_db_connection(conn)
+
+@app.route("/admin/locations/export", methods=["GET"])
+@jwt_required
+def export_locations():
+    try:
+        fmt = bulk_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Taken before the response starts so pool exhaustion is still a clean 503.
+    # The connection is held for as long as the client keeps reading.
+    conn = get_db_connection()
+
+    def generate():
+        try:
+            rows = bulk_io.export_rows(conn)
+            chunks = bulk_io.export_csv(rows) if fmt == "csv" else bulk_io.export_ndjson(rows)
+            for chunk in chunks:
+                yield chunk
+        finally:
+            conn.rollback()
+            release_db_connection(conn)
+
+    filename = f"locations-{datetime.date.today().isoformat()}.{fmt}"
+    return Response(stream_with_context(generate()), mimetype=BULK_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
 @app.route("/admin/crm/contacts", methods=["GET"])
 @jwt_required
 def get_contacts():
     try:
-        search_query = request.args.get('q', '').lower()
-        contact_filter = request.args.get('filter', 'all')
-        
-        contacts_list = []
-        
-        # Get User Profiles (using original table)
-        if contact_filter in ['all', 'profiles']:
-            sql = """
-            SELECT id, email, "Name" as name, "Phone" as phone, "Company" as company 
-            FROM user_collection
-            WHERE lower("Name") LIKE %s OR lower(email) LIKE %s
-            """
-            search_param = f'%{search_query}%'
-            user_profiles = execute_sql(sql, (search_param, search_param), fetch_all=True)
-            for contact in user_profiles:
-                contact['type'] = "User Profile"
-                contacts_list.append(contact)
-
-        # Get Location Owners
-        if contact_filter in ['all', 'owners']:
-            sql = """
-            SELECT DISTINCT ON (email) id, email, "fullName" as name, "phoneNumber" as phone, NULL as company
-            FROM pending_locations
-            WHERE email IS NOT NULL 
-            AND (lower("fullName") LIKE %s OR lower(email) LIKE %s)
-            """
-            search_param = f'%{search_query}%'
-            location_owners = execute_sql(sql, (search_param, search_param), fetch_all=True)
-
-            existing_emails = {c['email'] for c in contacts_list}
-            for contact in location_owners:
-                if contact['email'] and contact['email'] not in existing_emails:
-                    contact['type'] = "Location Owner"
-                    contacts_list.append(contact)
+        # One SQL query over profiles, CRM contacts and owners, deduplicated by
+        # email and paged with a cursor (see crm.py)
+        limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+        sql, params = crm.build_contacts_query(
+            q=request.args.get('q', ''),
+            contact_filter=request.args.get('filter', 'all'),
+            sort=request.args.get('sort', 'name'),
+            order=request.args.get('order', 'asc'),
+            cursor=request.args.get('cursor'),
+            limit=limit + 1
+        )
+        rows = execute_sql(sql, params, fetch_all=True)
+        contacts_list, next_cursor = crm.paginate(rows, limit)
         
-        return jsonify({"contacts": contacts_list}), 200
+        return jsonify({"contacts": contacts_list, "nextCursor": next_cursor}), 200
+    except crm.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -712,47 +1527,72 @@ def add_contact():
 @app.route("/admin/email/send", methods=["POST"])
 @jwt_required
 def handle_email_request():
-    # ... (Scheduling logic remains the same) ...
-    recipients_type = request.form.get("recipients")
-    subject = request.form.get("subject")
-    body = request.form.get("body")
-    scheduled_date_str = request.form.get("scheduled_date")
-    scheduled_time_str = request.form.get("scheduled_time")
+    # Accept multipart form (with attachments) or a plain JSON body
+    data = request.form if request.form else (request.get_json(silent=True) or {})
+    recipients_type = data.get("recipients") or data.get("to")
+    subject = data.get("subject")
+    body = data.get("body")
+    scheduled_date_str = data.get("scheduled_date")
+    scheduled_time_str = data.get("scheduled_time")
+
+    if not recipients_type or not subject:
+        return jsonify({"error": "Recipients and subject are required."}), 400
     
-    uploaded_files = request.files.getlist('files')
-    temp_file_paths = []
-    UPLOAD_FOLDER = 'temp_uploads'
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)
-    
-    for file in uploaded_files:
+    # Attachments are stored with the campaign so any worker can send it later
+    attachments = []
+    for file in request.files.getlist('files'):
         if file and file.filename:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
-            temp_file_paths.append(file_path)
+            attachments.append((secure_filename(file.filename), file.mimetype, file.read()))
 
+    send_at = None
     if scheduled_date_str and scheduled_time_str:
         scheduled_datetime_str = f"{scheduled_date_str} {scheduled_time_str}"
         try:
-            scheduled_datetime = datetime.datetime.strptime(scheduled_datetime_str, '%Y-%m-%d %H:%M')
-            if scheduled_datetime < datetime.datetime.now():
+            send_at = datetime.datetime.strptime(scheduled_datetime_str, '%Y-%m-%d %H:%M')
+            if send_at < datetime.datetime.now():
                 return jsonify({"error": "Cannot schedule email in the past."}), 400
         except ValueError:
             return jsonify({"error": "Invalid date or time format."}), 400
 
-        scheduler.add_job(
-            func=send_scheduled_email,
-            trigger='date',
-            run_date=scheduled_datetime,
-            args=[recipients_type, subject, body, temp_file_paths]
-        )
-        message = "Email scheduled successfully."
-    else:
-        send_scheduled_email(recipients_type, subject, body, temp_file_paths)
-        message = "Email sent successfully."
+    try:
+        campaign_id, job_id, queued = queue_email(recipients_type, subject, body, attachments, send_at,
+                                                  created_by=request.user_email)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to queue email: {e}"}), 500
 
-    return jsonify({"message": message}), 200
+    if send_at:
+        return jsonify({"message": "Email scheduled successfully.", "campaign_id": campaign_id, "job_id": job_id}), 202
+    return jsonify({"message": "Email queued for sending.", "campaign_id": campaign_id, "recipients": queued}), 202
+
+@app.route("/admin/jobs", methods=["GET"])
+@jwt_required
+def list_scheduled_jobs():
+    try:
+        status = request.args.get('status') or None
+        before_id = request.args.get('before', type=int)
+        limit = min(request.args.get('limit', 50, type=int), 200)
+        jobs = job_scheduler.list_jobs(status=status, limit=limit, before_id=before_id)
+        for job in jobs:
+            for key in ('run_at', 'created_at', 'finished_at'):
+                if isinstance(job.get(key), datetime.datetime):
+                    job[key] = job[key].isoformat()
+        next_before = jobs[-1]['id'] if len(jobs) == limit else None
+        return jsonify({"jobs": jobs, "next_before": next_before}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/jobs/<int:job_id>/cancel", methods=["POST"])
+@jwt_required
+def cancel_scheduled_job(job_id):
+    try:
+        job = job_scheduler.cancel(job_id)
+        if not job:
+            return jsonify({"error": "Job is not queued (already running, finished or cancelled)."}), 409
+        return jsonify({"message": f"Job {job_id} cancelled."}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/admin/email/analytics", methods=["GET"])
 @jwt_required
@@ -771,9 +1611,10 @@ def get_email_analytics():
             delta = datetime.timedelta(days=365)
         
         where_clause = ""
+        params = None
         if delta:
-            start_date = datetime.datetime.now() - delta
-            where_clause = f"WHERE sent_date >= '{start_date.isoformat()}'" 
+            where_clause = "WHERE sent_date >= %s"
+            params = (datetime.datetime.now() - delta,)
         
         sql = f"""
         SELECT id, subject, recipients_type, sent_date, metrics 
@@ -781,15 +1622,11 @@ def get_email_analytics():
         {where_clause}
         ORDER BY sent_date DESC
         """
-        analytics_list = execute_sql(sql, fetch_all=True)
-
-        for item in analytics_list:
-            if item.get("sent_date") and isinstance(item['sent_date'], datetime.datetime):
-                item['sentDate'] = item.pop('sent_date').isoformat()
-            if item.get("recipients_type"):
-                 item['recipientsType'] = item.pop('recipients_type')
-        
-        return jsonify({"analytics": analytics_list}), 200
+        rows = stream_sql(sql, params)
+        return stream_json_response("analytics", rows, lambda item: rename_keys(
+            item, {"sent_date": "sentDate", "recipients_type": "recipientsType"}))
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -808,18 +1645,25 @@ def change_admin_password():
         sql_fetch = "SELECT password_hash FROM auth_users WHERE id = %s"
         user = execute_sql(sql_fetch, (request.user_id,), fetch_one=True)
         
-        if not user or not bcrypt.checkpw(old_password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+        if not user or not password_hasher.verify(old_password, user['password_hash']):
             return jsonify({"error": "Incorrect old password."}), 403
 
         # 2. Hash and update new password
-        new_hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        new_hashed_password = password_hasher.hash(new_password)
         sql_update = "UPDATE auth_users SET password_hash = %s WHERE id = %s"
         execute_sql(sql_update, (new_hashed_password, request.user_id), commit=True)
         
         return jsonify({"message": "Password changed successfully."}), 200
+    except HashQueueFull:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/admin/settings/password-hashing", methods=["GET"])
+@jwt_required
+def password_hashing_settings():
+    return jsonify(password_hasher.stats()), 200
+
 @app.route("/admin/settings/add_admin", methods=["POST"])
 @jwt_required
 def add_new_admin():
@@ -831,16 +1675,21 @@ def add_new_admin():
     
     try:
         # Create user with 'admin' role in auth_users table
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        hashed_password = password_hasher.hash(password)
         sql = "INSERT INTO auth_users (email, password_hash, user_role) VALUES (%s, %s, %s)"
-        execute_sql(sql, (email, hashed_password, 'admin'), commit=True)
+        def insert_admin(cur):
+            cur.execute(sql, (email, hashed_password, 'admin'))
+            analytics.record_user_registered(cur)
+        run_in_transaction(insert_admin)
 
         # Email notification logic
         subject = "Welcome to the Admin Panel"
         body = f"Hello {email},\n\nYou have been granted admin access. Your login details:\n\nEmail: {email}\nPassword: {password}\n\n"
-        send_scheduled_email(recipients_type=email, subject=subject, body=body, file_paths=[])
+        queue_email(email, subject, body)
         
         return jsonify({"message": f"User {email} created with admin privileges and login email sent."}), 200
+    except HashQueueFull:
+        raise
     except Exception as e:
         if "duplicate key value violates unique constraint" in str(e):
             return jsonify({"error": "User already exists"}), 409
@@ -854,6 +1703,7 @@ def forgot_password():
     if not email:
         return jsonify({"message": "Email is required"}), 400
 
+    conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
@@ -861,11 +1711,10 @@ def forgot_password():
         # 1. Check if user exists
         cur.execute("SELECT id FROM auth_users WHERE email = %s", (email,))
         user = cur.fetchone()
+        cur.close()
         
         if not user:
             # SECURITY: We return 200 OK even if user is not found 
-            cur.close()
-            conn.close()
             return jsonify({"message": "If that email exists, a reset link has been sent."}), 200
 
         # 2. Generate a temporary reset token (In production, save this to DB)
@@ -875,21 +1724,25 @@ def forgot_password():
         # cur.execute("UPDATE users SET reset_token = %s WHERE email = %s", (reset_token, email))
         # conn.commit()
 
-        # 3. Send Email (Stub)
-        print(f"============================================")
-        print(f" [MOCK EMAIL] To: {email}")
-        print(f" [MOCK EMAIL] Link: https://plink-rmjy.onrender.com/reset-password?token={reset_token}")
-        print(f"============================================")
-
-        cur.close()
-        conn.close()
+        # 3. Send Email (Stub) - logged at debug level until the token is stored
+        log.debug(f"[MOCK EMAIL] To: {email} Link: https://plink-rmjy.onrender.com/reset-password?token={reset_token}")
         
         return jsonify({"message": "Reset link sent"}), 200
 
-    except Exception as e:
-        print(f"Error in forgot_password: {e}")
+    except Exception:
+        log.exception("Error in forgot_password")
         return jsonify({"message": "Internal server error"}), 500
+    finally:
+        # Return the connection to the pool (never close pooled connections directly)
+        release_db_connection(conn)
+
 
+# Start background workers last, once every job handler has been registered
+if RUN_BACKGROUND_WORKERS:
+    job_scheduler.start()
+    email_worker.start()
+    atexit.register(lambda: job_scheduler.stop())
+    atexit.register(lambda: email_worker.stop())
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,68 @@
+# auth_tokens.py
+# JWT signing and verification with key ids, plus a per-process cache of
+# already-verified tokens.
+#
+# Keys: JWT_SIGNING_KEYS='{"2024-06": "secret-a", "2025-01": "secret-b"}' with
+# JWT_ACTIVE_KID="2025-01". New tokens are signed with the active key and carry
+# its id in the "kid" header; tokens signed with any other listed key keep
+# verifying until that key is removed. Without JWT_SIGNING_KEYS the single
+# JWT_SECRET_KEY is used under the id "default" (tokens issued before key ids
+# existed have no kid and are checked against it).
+
+import hashlib
+import json
+import os
+import time
+
+import jwt
+
+from cache import LRUCache
+
+ALGORITHM = "HS256"
+
+
+class KeyRing:
+    def __init__(self, keys, active_kid):
+        if active_kid not in keys:
+            raise ValueError(f"Active JWT key id {active_kid!r} is not in the key set")
+        self.keys = keys
+        self.active_kid = active_kid
+
+    @classmethod
+    def from_env(cls, fallback_secret):
+        raw = os.environ.get("JWT_SIGNING_KEYS")
+        if raw:
+            keys = json.loads(raw)
+            return cls(keys, os.environ.get("JWT_ACTIVE_KID") or sorted(keys)[-1])
+        return cls({"default": fallback_secret}, "default")
+
+    def sign(self, payload):
+        return jwt.encode(payload, self.keys[self.active_kid], algorithm=ALGORITHM,
+                          headers={"kid": self.active_kid})
+
+    def key_for(self, token):
+        kid = jwt.get_unverified_header(token).get("kid") or "default"
+        if kid not in self.keys:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        return self.keys[kid]
+
+
+class TokenVerifier:
+    # Verifying an HS256 token is cheap but not free, and every protected request
+    # does it. Verified payloads are cached by token hash until the token expires.
+    def __init__(self, keyring, max_entries=10000, max_ttl=300):
+        self.keyring = keyring
+        self.cache = LRUCache(max_entries=max_entries)
+        self.max_ttl = max_ttl
+
+    def verify(self, token):
+        key = hashlib.sha256(token.encode()).hexdigest()
+        payload = self.cache.get(key)
+        if payload is not None:
+            return payload
+
+        payload = jwt.decode(token, self.keyring.key_for(token), algorithms=[ALGORITHM])
+        ttl = min(payload.get("exp", 0) - time.time(), self.max_ttl)
+        if ttl > 0:
+            self.cache.set(key, payload, ttl)
+        return payload
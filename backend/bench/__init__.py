@@ -0,0 +1,13 @@
+# bench
+# Load-test and micro-benchmark harness for the API. Run from backend/:
+#
+#   python -m bench seed --scale 100k             # synthetic users + locations
+#   python -m bench run --start-app --scale 100k  # boot gunicorn with fakes, run workloads
+#   python -m bench run --base-url http://localhost:5000 --workloads search,me
+#   python -m bench compare bench/results/<run>.json   # vs bench/results/baseline.json
+#   python -m bench baseline bench/results/<run>.json  # promote a run to baseline
+#
+# Gemini, Cloudinary and SMTP are replaced by local fakes when the harness
+# starts the app (AI_CLIENT=fake, STORAGE_BACKEND=local, EMAIL_TRANSPORT=fake).
+# With --base-url, start the server with the same variables yourself.
+# Seeded rows use @bench.invalid addresses so "seed --reset" removes only them.
@@ -0,0 +1,166 @@
+# bench/__main__.py
+# Command line for the benchmark harness - see bench/__init__.py for usage.
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import psycopg2
+import requests
+
+from bench import report, seed
+from bench.workloads import DEFAULT_WORKLOADS, WORKLOADS, Context, run_workload
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# External services swapped for local fakes while benchmarking
+FAKE_ENV = {
+    "AI_CLIENT": "fake",
+    "STORAGE_BACKEND": "local",
+    "EMAIL_TRANSPORT": "fake",
+    "GEOCODER": "local",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def connect():
+    dsn = os.environ.get("DATABASE_URL")
+    if not dsn:
+        sys.exit("DATABASE_URL environment variable not set.")
+    return psycopg2.connect(dsn)
+
+
+def start_app(port, workers):
+    env = {**os.environ, **FAKE_ENV}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--threads", "4", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit("App exited during startup.")
+        try:
+            if requests.get(f"{base_url}/health/db-pool", timeout=2).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    sys.exit("App did not become healthy within 60s.")
+
+
+def cmd_seed(args):
+    conn = connect()
+    try:
+        if args.reset:
+            seed.reset(conn)
+        counts = seed.seed(conn, args.scale, rounds=args.bcrypt_rounds)
+    finally:
+        conn.close()
+    print(f"Seeded {counts['users']} users and {counts['locations']} locations.")
+
+
+def cmd_run(args):
+    names = args.workloads.split(",") if args.workloads else DEFAULT_WORKLOADS
+    unknown = [n for n in names if n not in WORKLOADS]
+    if unknown:
+        sys.exit(f"Unknown workloads: {', '.join(unknown)}")
+
+    process = None
+    base_url = args.base_url
+    if args.start_app:
+        process, base_url = start_app(args.port, args.app_workers)
+    try:
+        ctx = Context(base_url, args.scale)
+        ctx.login()
+        result = {
+            "scale": args.scale,
+            "revision": report.git_revision(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "workloads": {},
+        }
+        for name in names:
+            print(f"Running {name} ({args.concurrency} clients, {args.duration}s)...", flush=True)
+            result["workloads"][name] = run_workload(ctx, name, args.duration, args.concurrency, args.warmup)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+
+    path = report.save_result(result, args.out)
+    print(report.format_table(result))
+    print(f"Saved {path}")
+
+    if os.path.exists(report.BASELINE_PATH):
+        return check(result, report.load_result(report.BASELINE_PATH), args.tolerance)
+
+
+def check(result, baseline, tolerance):
+    problems = report.compare(result, baseline, tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        return 1
+    print(f"No regressions against baseline (tolerance {tolerance:.0%}).")
+    return 0
+
+
+def cmd_compare(args):
+    return check(report.load_result(args.result), report.load_result(args.baseline), args.tolerance)
+
+
+def cmd_baseline(args):
+    os.makedirs(report.RESULTS_DIR, exist_ok=True)
+    shutil.copyfile(args.result, report.BASELINE_PATH)
+    print(f"{args.result} is now the baseline.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("seed", help="load synthetic users and locations")
+    p.add_argument("--scale", choices=seed.SCALES, default="10k")
+    p.add_argument("--reset", action="store_true", help="delete earlier bench rows first")
+    p.add_argument("--bcrypt-rounds", type=int, default=int(os.environ.get("BCRYPT_ROUNDS", 12)))
+    p.set_defaults(fn=cmd_seed)
+
+    p = sub.add_parser("run", help="run workloads and store the result")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--base-url")
+    target.add_argument("--start-app", action="store_true", help="start gunicorn with local fakes")
+    p.add_argument("--port", type=int, default=5055)
+    p.add_argument("--app-workers", type=int, default=2)
+    p.add_argument("--scale", choices=seed.SCALES, default="10k", help="scale the database was seeded with")
+    p.add_argument("--workloads", help=f"comma separated, from: {', '.join(WORKLOADS)}")
+    p.add_argument("--duration", type=float, default=30)
+    p.add_argument("--warmup", type=float, default=5)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--tolerance", type=float, default=0.15)
+    p.add_argument("--out")
+    p.set_defaults(fn=cmd_run)
+
+    p = sub.add_parser("compare", help="check a stored result against the baseline")
+    p.add_argument("result")
+    p.add_argument("--baseline", default=report.BASELINE_PATH)
+    p.add_argument("--tolerance", type=float, default=0.15)
+    p.set_defaults(fn=cmd_compare)
+
+    p = sub.add_parser("baseline", help="make a stored result the new baseline")
+    p.add_argument("result")
+    p.set_defaults(fn=cmd_baseline)
+
+    args = parser.parse_args(argv)
+    return args.fn(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
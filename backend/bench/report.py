@@ -0,0 +1,87 @@
+# bench/report.py
+# Latency summaries, stored results and the baseline regression check.
+
+import json
+import os
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile; sorted_values must be sorted ascending.
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarise(latencies, statuses, duration):
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    # Anything but a 2xx is an error: a 403 or 400 is fast and would flatter the latencies
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": round(len(values) / duration, 2) if duration else 0,
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_result(result, path=None):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = path or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_result(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(result, baseline, tolerance=0.15):
+    # A workload regresses when p95/p99 latency grows, or throughput drops, by
+    # more than `tolerance` (0.15 = 15%) against the baseline, or when it
+    # starts returning errors. Runs at a different scale are not comparable.
+    problems = []
+    if result.get("scale") != baseline.get("scale"):
+        problems.append(f"scale differs: {result.get('scale')} vs baseline {baseline.get('scale')}")
+        return problems
+    for name, base in baseline.get("workloads", {}).items():
+        current = result.get("workloads", {}).get(name)
+        if current is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base.get(key) and current.get(key) and current[key] > base[key] * (1 + tolerance):
+                problems.append(f"{name}: {key} {current[key]} vs baseline {base[key]}")
+        if base.get("throughput_rps") and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{name}: throughput {current['throughput_rps']} rps vs baseline {base['throughput_rps']}")
+        if current.get("errors") and not base.get("errors"):
+            problems.append(f"{name}: {current['errors']} errors (baseline had none)")
+    return problems
+
+
+def format_table(result):
+    lines = [f"{'workload':<18}{'req':>8}{'err':>6}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"]
+    for name, w in result["workloads"].items():
+        lines.append(f"{name:<18}{w['requests']:>8}{w['errors']:>6}{w['throughput_rps']:>10}"
+                     f"{w['p50_ms'] or '-':>10}{w['p95_ms'] or '-':>10}{w['p99_ms'] or '-':>10}")
+    return "\n".join(lines)
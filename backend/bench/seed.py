@@ -0,0 +1,160 @@
+# bench/seed.py
+# Synthetic fixtures for the benchmark: users and locations at 10k / 100k / 1M.
+#
+# Rows are generated from a fixed random seed, so a given scale always
+# produces the same data, and loaded with COPY in chunks so 1M rows never sit
+# in memory at once. Afterwards the analytics rollups are rebuilt and the
+# tables ANALYZEd, so the planner sees the same statistics on every run.
+
+import csv
+import io
+import random
+
+import bcrypt
+
+import analytics
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BENCH_DOMAIN = "bench.invalid"
+BENCH_PASSWORD = "bench-password"
+CHUNK_ROWS = 50_000
+
+PROPERTY_TYPES = [
+    "Detached", "Semi-Detached", "Terraced-Row", "Flat / Apartment", "Loft Apartment", "Bungalow",
+    "Cottage", "Barn Conversion", "Farms", "Villa", "Country House", "Converted Church",
+    "House - family", "Townhouse", "Castle",
+]
+STYLES = [
+    "Victorian", "Georgian", "Edwardian", "Regency", "Tudor", "Art Deco", "Brutalist",
+    "Mid-Century Modern", "Minimalist", "Industrial", "Retro / Vintage", "Gothic", "Eco",
+]
+ROOMS = [
+    "Kitchen", "Bedroom (Master)", "Bedroom (Guest)", "Living Room", "Dining Room", "Bathroom",
+    "En-suite", "Office/Study", "Utility Room", "Garage", "Conservatory", "Basement/Cellar",
+    "Attic/Loft", "Garden",
+]
+INTERIOR = ["Fireplace", "Exposed beams", "Wooden floors", "High ceilings", "Sash windows", "Spiral staircase"]
+EXTERIOR = ["Driveway", "Courtyard", "Pool", "Orchard", "Lake view", "Period facade"]
+WORDS = ["bright", "spacious", "garden", "original", "period", "modern", "quiet", "character",
+         "light", "open-plan", "rustic", "grand", "kitchen", "views", "parking", "features"]
+
+# city, postcode area, latitude, longitude
+CITIES = [
+    ("London", "SW", 51.5072, -0.1276), ("Manchester", "M", 53.4808, -2.2426),
+    ("Birmingham", "B", 52.4862, -1.8904), ("Leeds", "LS", 53.8008, -1.5491),
+    ("Bristol", "BS", 51.4545, -2.5879), ("Edinburgh", "EH", 55.9533, -3.1883),
+    ("Glasgow", "G", 55.8642, -4.2518), ("Brighton", "BN", 50.8225, -0.1372),
+    ("York", "YO", 53.9600, -1.0873), ("Bath", "BA", 51.3811, -2.3590),
+]
+
+LOCATION_COLUMNS = [
+    "user_id", "contact_name", "contact_email", "contact_phone", "street_address", "city", "postcode",
+    "property_type", "description", "property_styles", "rooms", "interior_features",
+    "exterior_features", "image_urls", "video_url", "status", "created_at", "latitude", "longitude",
+]
+
+
+def pg_array(values):
+    # COPY (CSV) text form of a text[]: {"a","b"}
+    return "{" + ",".join('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values) + "}"
+
+
+def bench_email(kind, n):
+    return f"{kind}-{n}@{BENCH_DOMAIN}"
+
+
+def _copy(cur, table, columns, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            buf.seek(0)
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+    if buf.tell():
+        buf.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    return count
+
+
+def _created_at(rng):
+    return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+
+
+def user_rows(count, password_hash, rng):
+    for n in range(count):
+        yield (bench_email("user", n), password_hash, "user", f"07{rng.randint(100000000, 999999999)}", None)
+    # One admin for the /admin workloads; every other account would get a 403
+    yield (bench_email("admin", 0), password_hash, "admin", None, None)
+
+
+def profile_rows(count, rng):
+    for n in range(count):
+        yield (bench_email("user", n), f"Bench User {n}", _created_at(rng))
+    yield (bench_email("admin", 0), "Bench Admin", _created_at(rng))
+
+
+def location_rows(count, user_ids, rng):
+    for n in range(count):
+        city, area, lat, lng = rng.choice(CITIES)
+        yield (
+            rng.choice(user_ids),
+            f"Owner {n}",
+            bench_email("owner", n),
+            f"07{rng.randint(100000000, 999999999)}",
+            f"{rng.randint(1, 200)} Bench Street",
+            city,
+            f"{area}{rng.randint(1, 20)} {rng.randint(1, 9)}{rng.choice('ABDEFGHJLNPQRSTUWXYZ')}{rng.choice('ABDEFGHJLNPQRSTUWXYZ')}",
+            rng.choice(PROPERTY_TYPES),
+            " ".join(rng.choices(WORDS, k=rng.randint(8, 30))),
+            pg_array(rng.sample(STYLES, rng.randint(1, 3))),
+            pg_array(rng.sample(ROOMS, rng.randint(2, 8))),
+            pg_array(rng.sample(INTERIOR, rng.randint(0, 3))),
+            pg_array(rng.sample(EXTERIOR, rng.randint(0, 3))),
+            pg_array([f"https://images.{BENCH_DOMAIN}/{n}/{i}.jpg" for i in range(rng.randint(1, 6))]),
+            "",
+            rng.choices(["approved", "pending", "in-progress", "archived"], weights=[70, 20, 7, 3])[0],
+            _created_at(rng),
+            round(lat + rng.uniform(-0.25, 0.25), 6),
+            round(lng + rng.uniform(-0.4, 0.4), 6),
+        )
+
+
+def reset(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM locations WHERE contact_email LIKE %s", (f"%@{BENCH_DOMAIN}",))
+    cur.execute("DELETE FROM user_collection WHERE email LIKE %s", (f"%@{BENCH_DOMAIN}",))
+    cur.execute("DELETE FROM auth_users WHERE email LIKE %s", (f"%@{BENCH_DOMAIN}",))
+    conn.commit()
+
+
+def seed(conn, scale, rounds=12, random_seed=42):
+    count = SCALES[scale]
+    rng = random.Random(random_seed)
+    # Every bench user shares one password so the login workload can pick anyone.
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt(rounds)).decode()
+
+    cur = conn.cursor()
+    users = _copy(cur, "auth_users", ["email", "password_hash", "user_role", "phone_number", "bio"],
+                  user_rows(count, password_hash, rng))
+    _copy(cur, "user_collection", ["email", '"Name"', "created_at"], profile_rows(count, rng))
+
+    cur.execute("SELECT id FROM auth_users WHERE email LIKE %s ORDER BY id LIMIT 10000", (f"%@{BENCH_DOMAIN}",))
+    user_ids = [row[0] for row in cur.fetchall()]
+    locations = _copy(cur, "locations", LOCATION_COLUMNS, location_rows(count, user_ids, rng))
+    conn.commit()
+
+    analytics.rebuild_rollups(conn)
+    conn.commit()
+
+    old_autocommit = conn.autocommit
+    conn.autocommit = True  # VACUUM can't run inside a transaction
+    cur.execute("VACUUM ANALYZE locations")
+    cur.execute("VACUUM ANALYZE auth_users")
+    cur.execute("VACUUM ANALYZE user_collection")
+    conn.autocommit = old_autocommit
+    return {"users": users, "locations": locations}
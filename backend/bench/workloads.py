@@ -0,0 +1,166 @@
+# bench/workloads.py
+# Scripted request mixes and the closed-loop runner that drives them.
+#
+# Each workload is a function (ctx, rng) -> (method, path, kwargs) describing
+# one request. The runner keeps `concurrency` clients busy for `duration`
+# seconds (after a warm-up that is not recorded) and reports throughput and
+# latency percentiles for the workload.
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.report import summarise
+from bench.seed import BENCH_PASSWORD, CITIES, PROPERTY_TYPES, ROOMS, STYLES, SCALES, bench_email
+
+# (weight, params) - roughly what the Search page sends
+SEARCH_MIX = [
+    (25, lambda rng: {}),
+    (15, lambda rng: {"propertyType": rng.choice(PROPERTY_TYPES)}),
+    (15, lambda rng: {"rooms": rng.choice(ROOMS)}),
+    (10, lambda rng: {"age": rng.choice(STYLES), "city": rng.choice(CITIES)[0]}),
+    (10, lambda rng: {"q": rng.choice(["garden kitchen", "victorian fireplace", "industrial loft", "period features"])}),
+    (10, lambda rng: {"lat": rng.choice(CITIES)[2], "lng": rng.choice(CITIES)[3], "radius_km": rng.choice([2, 5, 10])}),
+    (10, lambda rng: {"propertyType": rng.choice(PROPERTY_TYPES), "facets": "true"}),
+    (5, lambda rng: {"postcode": rng.choice(CITIES)[1] + str(rng.randint(1, 20))}),
+]
+
+
+class Context:
+    def __init__(self, base_url, scale):
+        self.base_url = base_url.rstrip("/")
+        self.users = SCALES.get(scale, 10_000)
+        self.token = None
+        self.admin_token = None
+        self.cursors = []  # (params, nextCursor) pairs seen so far, replayed as deep-page requests
+        self._lock = threading.Lock()
+
+    def login(self):
+        self.token = self._token(bench_email("user", 0))
+        self.admin_token = self._token(bench_email("admin", 0))
+
+    def _token(self, email):
+        response = requests.post(f"{self.base_url}/auth/login",
+                                 json={"email": email, "password": BENCH_PASSWORD}, timeout=30)
+        response.raise_for_status()
+        return response.json()["token"]
+
+    def auth(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def admin_auth(self):
+        return {"Authorization": f"Bearer {self.admin_token}"}
+
+    def remember_cursor(self, params, cursor):
+        # A cursor is only valid with the filters that produced it
+        with self._lock:
+            if len(self.cursors) < 1000:
+                self.cursors.append(({k: v for k, v in params.items() if k != "cursor"}, cursor))
+
+
+def search(ctx, rng):
+    if ctx.cursors and rng.random() < 0.1:
+        params, cursor = rng.choice(ctx.cursors)
+        return "GET", "/locations/search", {"params": {**params, "cursor": cursor}}
+    weights, builders = zip(*SEARCH_MIX)
+    return "GET", "/locations/search", {"params": rng.choices(builders, weights)[0](rng)}
+
+
+def login(ctx, rng):
+    email = bench_email("user", rng.randrange(ctx.users))
+    return "POST", "/auth/login", {"json": {"email": email, "password": BENCH_PASSWORD}}
+
+
+def me(ctx, rng):
+    return "GET", "/auth/me", {"headers": ctx.auth()}
+
+
+def create_location(ctx, rng):
+    city, area, lat, lng = rng.choice(CITIES)
+    body = {
+        "fullName": "Bench Owner",
+        "email": bench_email("owner", rng.randrange(10 ** 9)),
+        "phoneNumber": "07000000000",
+        "streetAddress": "1 Bench Street",
+        "city": city,
+        "postcode": f"{area}1 1AA",
+        "propertyType": rng.choice(PROPERTY_TYPES),
+        "locationDescriptionText": "Benchmark listing",
+        "propertyStyleTags": rng.sample(STYLES, 2),
+        "rooms": rng.sample(ROOMS, 4),
+        "interiorFeatures": [],
+        "exteriorFeatures": [],
+        "imageUrls": ["https://images.bench.invalid/new.jpg"],
+    }
+    return "POST", "/locations", {"json": body, "headers": ctx.auth()}
+
+
+def admin_analytics(ctx, rng):
+    path = rng.choice([
+        "/admin/analytics/overview",
+        "/admin/analytics/categories",
+        "/admin/analytics/daily",
+        "/admin/analytics/statuses",
+    ])
+    return "GET", path, {"headers": ctx.admin_auth()}
+
+
+def admin_users(ctx, rng):
+    # Streams the whole user list - run on its own, it is much heavier than the rest
+    return "GET", "/admin/analytics/users", {"headers": ctx.admin_auth()}
+
+
+WORKLOADS = {
+    "search": search,
+    "login": login,
+    "me": me,
+    "create_location": create_location,
+    "admin_analytics": admin_analytics,
+    "admin_users": admin_users,
+}
+DEFAULT_WORKLOADS = ["search", "login", "me", "create_location", "admin_analytics"]
+
+
+def run_workload(ctx, name, duration=30, concurrency=8, warmup=5, random_seed=1):
+    workload = WORKLOADS[name]
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    start = time.monotonic()
+    record_from = start + warmup
+    deadline = record_from + duration
+
+    def client(worker):
+        rng = random.Random(random_seed * 1000 + worker)
+        session = requests.Session()
+        local_latencies, local_statuses = [], {}
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            method, path, kwargs = workload(ctx, rng)
+            t0 = time.perf_counter()
+            try:
+                response = session.request(method, ctx.base_url + path, timeout=60, **kwargs)
+                status = response.status_code
+                if name == "search" and status == 200:
+                    cursor = response.json().get("nextCursor")
+                    if cursor:
+                        ctx.remember_cursor(kwargs["params"], cursor)
+            except requests.RequestException:
+                status = "error"
+            elapsed = time.perf_counter() - t0
+            if now >= record_from:
+                local_latencies.append(elapsed)
+                local_statuses[str(status)] = local_statuses.get(str(status), 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+
+    return summarise(latencies, statuses, duration)
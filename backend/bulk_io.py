@@ -0,0 +1,229 @@
+# bulk_io.py
+# Bulk location import/export for agencies with thousands of listings.
+#
+# Import reads CSV or NDJSON straight off the request stream one row at a time,
+# validates it, and inserts valid rows with execute_values in batches of
+# BULK_BATCH_SIZE (one commit per batch). If a batch is rejected by Postgres
+# it is retried row by row under savepoints so only the bad rows are reported.
+#
+# Export walks the table with a server-side (named) cursor and yields CSV or
+# NDJSON chunks, so neither direction ever holds the full dataset in memory.
+#
+# Field names match the JSON accepted by POST /locations. In CSV, array fields
+# (propertyStyleTags, rooms, interiorFeatures, exteriorFeatures, imageUrls)
+# are "|"-separated.
+
+import csv
+import io
+import json
+import re
+from collections import Counter
+
+from psycopg2 import extras
+
+import analytics
+import geocoding
+
+ARRAY_SEPARATOR = "|"
+MAX_REPORTED_ERRORS = 1000
+
+# import field -> locations column
+SCALAR_FIELDS = {
+    "fullName": "contact_name",
+    "email": "contact_email",
+    "phoneNumber": "contact_phone",
+    "streetAddress": "street_address",
+    "city": "city",
+    "postcode": "postcode",
+    "propertyType": "property_type",
+    "locationDescriptionText": "description",
+    "videoUrl": "video_url",
+}
+ARRAY_FIELDS = {
+    "propertyStyleTags": "property_styles",
+    "rooms": "rooms",
+    "interiorFeatures": "interior_features",
+    "exteriorFeatures": "exterior_features",
+    "imageUrls": "image_urls",
+}
+REQUIRED_FIELDS = ("propertyType", "city")
+
+INSERT_COLUMNS = ["user_id"] + list(SCALAR_FIELDS.values()) + list(ARRAY_FIELDS.values())
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+URL_RE = re.compile(r"^https?://", re.IGNORECASE)
+
+
+class RowError(ValueError):
+    pass
+
+
+# --- reading ---
+
+def iter_rows(stream, fmt):
+    # Yields (row_number, dict or Exception) without reading the whole body.
+    # The stream is consumed line by line; utf-8-sig drops a leading BOM.
+    text = (line.decode("utf-8-sig") for line in stream)
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for number, row in enumerate(reader, start=1):
+            for field in ARRAY_FIELDS:
+                if field in row:
+                    value = row[field] or ""
+                    row[field] = [v.strip() for v in value.split(ARRAY_SEPARATOR) if v.strip()]
+            yield number, row
+    else:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("each line must be a JSON object")
+                yield number, row
+            except ValueError as e:
+                yield number, RowError(f"Invalid JSON: {e}")
+
+
+def validate_row(row, default_user_id):
+    for field in REQUIRED_FIELDS:
+        if not str(row.get(field) or "").strip():
+            raise RowError(f"{field} is required")
+
+    email = str(row.get("email") or "").strip()
+    if email and not EMAIL_RE.match(email):
+        raise RowError(f"Invalid email: {email}")
+
+    # NDJSON values can be any JSON type; everything below works on the
+    # checked, normalised values rather than the raw row
+    fields = {}
+    for field in SCALAR_FIELDS:
+        value = row.get(field)
+        if isinstance(value, (dict, list)):
+            raise RowError(f"{field} must be a string")
+        if value is not None and not isinstance(value, str):
+            value = str(value)
+        fields[field] = value.strip() if value else None
+    for field in ARRAY_FIELDS:
+        value = row.get(field) or []
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise RowError(f"{field} must be a list of strings")
+        fields[field] = value
+
+    for url in fields["imageUrls"] + ([fields["videoUrl"]] if fields["videoUrl"] else []):
+        if not URL_RE.match(url):
+            raise RowError(f"Invalid URL: {url}")
+    return tuple([row.get("userId") or default_user_id] + list(fields.values()))
+
+
+# --- writing ---
+
+INSERT_SQL = f"""
+    INSERT INTO locations ({", ".join(INSERT_COLUMNS)})
+    VALUES %s
+    RETURNING id, property_type, status
+"""
+
+
+def _record_inserted(cur, inserted):
+    # Coordinates come from the offline postcode table in one UPDATE per batch;
+    # a network geocoder per row would undo the point of batching.
+    geocoding.fill_from_table(cur, [r[0] for r in inserted])
+    for (property_type, status), count in Counter((r[1], r[2]) for r in inserted).items():
+        analytics.record_location_created(cur, property_type, status, count)
+
+
+def _insert_batch(conn, batch, report):
+    cur = conn.cursor()
+    try:
+        inserted = extras.execute_values(cur, INSERT_SQL, [values for _, values in batch],
+                                         page_size=len(batch), fetch=True)
+        _record_inserted(cur, inserted)
+        conn.commit()
+        report["inserted"] += len(inserted)
+        return
+    except Exception:
+        conn.rollback()
+
+    # Something in the batch was rejected: find out which rows, keep the rest.
+    inserted = []
+    for number, values in batch:
+        cur.execute("SAVEPOINT bulk_row")
+        try:
+            inserted.extend(extras.execute_values(cur, INSERT_SQL, [values], fetch=True))
+            cur.execute("RELEASE SAVEPOINT bulk_row")
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT bulk_row")
+            add_error(report, number, str(e).strip().splitlines()[0])
+    _record_inserted(cur, inserted)
+    conn.commit()
+    report["inserted"] += len(inserted)
+
+
+def add_error(report, number, message):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": number, "error": message})
+    else:
+        report["errorsTruncated"] = True
+
+
+def import_locations(conn, stream, fmt, default_user_id, batch_size=500):
+    report = {"inserted": 0, "failed": 0, "errors": [], "errorsTruncated": False}
+    batch = []
+    for number, row in iter_rows(stream, fmt):
+        if isinstance(row, Exception):
+            add_error(report, number, str(row))
+            continue
+        try:
+            batch.append((number, validate_row(row, default_user_id)))
+        except RowError as e:
+            add_error(report, number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            _insert_batch(conn, batch, report)
+            batch = []
+    if batch:
+        _insert_batch(conn, batch, report)
+    return report
+
+
+# --- export ---
+
+EXPORT_COLUMNS = ["id", "user_id", "status", "created_at"] + list(SCALAR_FIELDS.values()) + list(ARRAY_FIELDS.values())
+EXPORT_FIELDS = ["id", "userId", "status", "createdAt"] + list(SCALAR_FIELDS) + list(ARRAY_FIELDS)
+
+
+def export_rows(conn, itersize=1000):
+    # Server-side cursor: Postgres sends itersize rows at a time.
+    cur = conn.cursor(name="locations_export")
+    cur.itersize = itersize
+    cur.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM locations ORDER BY id")
+    for row in cur:
+        yield dict(zip(EXPORT_FIELDS, row))
+    cur.close()
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def export_ndjson(rows):
+    for row in rows:
+        yield json.dumps({k: _plain(v) for k, v in row.items()}) + "\n"
+
+
+def export_csv(rows, rows_per_chunk=500):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_FIELDS)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow([
+            ARRAY_SEPARATOR.join(v) if isinstance(v, list) else _plain(v)
+            for v in (row[f] for f in EXPORT_FIELDS)
+        ])
+        if i % rows_per_chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
@@ -0,0 +1,192 @@
+# cache.py
+# Response cache for read-heavy endpoints.
+#
+# Entries live in an in-process LRU with per-entry TTL. If CACHE_REDIS_URL is
+# set (and the redis package is installed) a shared backend sits behind it so
+# all gunicorn workers see the same entries and invalidations; otherwise a
+# local in-memory stand-in plays that role for a single process.
+#
+# Invalidation is by namespace: every key is prefixed with the namespace's
+# current generation number, and invalidate(namespace) bumps it, so all old
+# entries become unreachable at once and age out of the LRU.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger("plink")
+
+
+class LRUCache:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalBackend:
+    # Stand-in for the shared backend when no Redis is configured (and in tests).
+    def __init__(self):
+        self._store = LRUCache(max_entries=4096)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._store.get(key)
+
+    def set(self, key, value, ttl):
+        self._store.set(key, value, ttl)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend:
+    def __init__(self, url):
+        import redis  # optional dependency
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def get_counter(self, key):
+        raw = self._redis.get(key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self._redis.incr(key)
+
+
+class ResponseCache:
+    def __init__(self, backend=None, max_entries=1024):
+        self.local = LRUCache(max_entries=max_entries)
+        self.backend = backend or LocalBackend()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _generation(self, namespace):
+        try:
+            return self.backend.get_counter(f"cache:gen:{namespace}")
+        except Exception:
+            log.exception("Cache backend error")
+            return None
+
+    def make_key(self, namespace, params=None):
+        # params is any JSON-serialisable description of the request (e.g. the
+        # normalised search filters); sort_keys makes equal filters equal keys.
+        # None when the generation can't be read: without it a local entry
+        # could outlive an invalidation, so the request bypasses the cache.
+        generation = self._generation(namespace)
+        if generation is None:
+            return None
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"cache:{namespace}:{generation}:{digest}"
+
+    def get(self, key):
+        if key is None:
+            self._count("misses")
+            return None
+        value = self.local.get(key)
+        if value is None:
+            try:
+                value = self.backend.get(key)
+            except Exception:
+                log.exception("Cache backend error")
+                value = None
+            if value is not None:
+                # Shared backend does not tell us the remaining TTL; keep the local copy briefly.
+                self.local.set(key, value, 5)
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key, value, ttl):
+        if key is None:
+            return
+        self.local.set(key, value, ttl)
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception:
+            log.exception("Cache backend error")
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            try:
+                self.backend.incr(f"cache:gen:{namespace}")
+            except Exception:
+                log.exception("Cache backend error")
+            self._count("invalidations")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "local_entries": len(self.local),
+        }
+
+
+def make_etag(body):
+    return hashlib.sha1(body.encode() if isinstance(body, str) else body).hexdigest()
+
+
+def cache_from_env():
+    backend = None
+    redis_url = os.environ.get("CACHE_REDIS_URL")
+    if redis_url:
+        try:
+            backend = RedisBackend(redis_url)
+        except ImportError:
+            log.warning("CACHE_REDIS_URL is set but the redis package is not installed; using local cache only.")
+    return ResponseCache(backend=backend, max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 1024)))
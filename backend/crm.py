@@ -0,0 +1,148 @@
+# crm.py
+# Unified contact search for /admin/crm/contacts.
+#
+# User profiles, CRM contacts (added via /admin/crm/add_contact) and location
+# owners are searched in one query, de-duplicated by lower(email) in SQL - a
+# profile wins over a CRM contact, which wins over an owner record - and
+# returned in keyset-paginated pages sorted by name or email. Search matches
+# use the trigram indexes from migrations/006_crm_contact_indexes.sql; the
+# keyset is applied inside each source so pages never sort the whole union.
+
+import base64
+import json
+
+# filter value -> sources included
+CONTACT_FILTERS = {
+    "all": ("profiles", "crm", "owners"),
+    "profiles": ("profiles",),
+    "crm": ("crm",),
+    "owners": ("owners",),
+}
+
+# Sources in priority order: for an email found in several, the first wins.
+# {a} is the table alias the query gives each row.
+SOURCES = {
+    "profiles": {
+        "table": "user_collection",
+        "name": '{a}."Name"',
+        "columns": '{a}."Name" AS name, {a}."Phone" AS phone, {a}."Company" AS company',
+        "type": "User Profile",
+    },
+    "crm": {
+        "table": "crm_contacts",
+        "name": "{a}.name",
+        "columns": "{a}.name, {a}.phone, {a}.company",
+        "type": "CRM Contact",
+    },
+    "owners": {
+        "table": "pending_locations",
+        "name": '{a}."fullName"',
+        "columns": '{a}."fullName" AS name, {a}."phoneNumber" AS phone, NULL AS company',
+        "type": "Location Owner",
+    },
+}
+
+# sort param -> per-row expression (always tie-broken by lower(email)); both
+# are indexed on every source table by migrations/018_crm_contact_sort_indexes.sql
+SORT_KEYS = {
+    "name": "lower(COALESCE({name}, ''))",
+    "email": "lower({a}.email)",
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_value, email_key):
+    raw = json.dumps([sort_value, email_key]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode((cursor + "=" * (-len(cursor) % 4)).encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(key, list) or len(key) != 2 or not all(isinstance(v, str) for v in key):
+        raise InvalidCursor("Invalid cursor")
+    return key
+
+
+def _source_sql(source, alias):
+    spec = SOURCES[source]
+    return {
+        "table": spec["table"],
+        "name": spec["name"].format(a=alias),
+        "columns": spec["columns"].format(a=alias),
+        "type": spec["type"],
+    }
+
+
+def _matches(src, alias, q):
+    sql = f"{alias}.email IS NOT NULL"
+    if q:
+        sql += f" AND (lower({src['name']}) LIKE %(pattern)s OR lower({alias}.email) LIKE %(pattern)s)"
+    return sql
+
+
+def build_contacts_query(q="", contact_filter="all", sort="name", order="asc", cursor=None, limit=50):
+    # Each source is one arm that reads its next `limit` rows past the cursor
+    # straight off its sort index, so a page costs the same however many
+    # contacts there are. A row is only kept if it is its email's winner: no
+    # matching row for that email in a higher-priority source, nor an earlier
+    # one (by sort key, then id) in its own table - each an index probe on
+    # lower(email). The arms are then merged and cut to `limit`.
+    sources = CONTACT_FILTERS.get(contact_filter, CONTACT_FILTERS["all"])
+    sort = sort if sort in SORT_KEYS else "name"
+    direction, comparison = ("DESC", "<") if order == "desc" else ("ASC", ">")
+
+    q = (q or "").strip().lower()
+    params = {"pattern": f"%{q}%", "limit": limit}
+    if cursor:
+        params["after_sort"], params["after_email"] = decode_cursor(cursor)
+
+    arms = []
+    for index, source in enumerate(sources):
+        t, d = _source_sql(source, "t"), _source_sql(source, "d")
+        sort_t = SORT_KEYS[sort].format(name=t["name"], a="t")
+        sort_d = SORT_KEYS[sort].format(name=d["name"], a="d")
+        where = [_matches(t, "t", q)]
+        if cursor:
+            where.append(f"({sort_t}, lower(t.email)) {comparison} (%(after_sort)s, %(after_email)s)")
+        where.append(f"""NOT EXISTS (
+                SELECT 1 FROM {d['table']} d
+                WHERE lower(d.email) = lower(t.email) AND {_matches(d, "d", q)}
+                  AND ({sort_d}, d.id) < ({sort_t}, t.id))""")
+        for higher in sources[:index]:
+            h = _source_sql(higher, "h")
+            where.append(f"""NOT EXISTS (
+                SELECT 1 FROM {h['table']} h
+                WHERE lower(h.email) = lower(t.email) AND {_matches(h, "h", q)})""")
+        arms.append(f"""(
+            SELECT t.id::text AS id, t.email, {t['columns']}, '{t['type']}' AS type,
+                   lower(t.email) AS email_key, {sort_t} AS sort_key
+            FROM {t['table']} t
+            WHERE {" AND ".join(where)}
+            ORDER BY {sort_t} {direction}, lower(t.email) {direction}
+            LIMIT %(limit)s
+        )""")
+
+    sql = f"""
+        SELECT id, email, name, phone, company, type, email_key, sort_key
+        FROM ({" UNION ALL ".join(arms)}) contacts
+        ORDER BY sort_key {direction}, email_key {direction}
+        LIMIT %(limit)s
+    """
+    return sql, params
+
+
+def paginate(rows, limit):
+    # Queries fetch limit + 1 rows; the extra one only tells us there's another page.
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]["sort_key"], rows[-1]["email_key"]) if has_more and rows else None
+    for row in rows:
+        row.pop("sort_key", None)
+        row.pop("email_key", None)
+    return rows, next_cursor
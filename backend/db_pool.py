@@ -0,0 +1,222 @@
+# db_pool.py
+# Thread-safe PostgreSQL connection pool used by app.py.
+#
+# psycopg2's SimpleConnectionPool is not safe to share between threads and
+# raises "connection pool exhausted" the moment every connection is checked
+# out. This pool instead makes callers wait (up to a timeout) for a free
+# connection, checks connections are alive before handing them out and
+# recycles them after a number of uses or a maximum age.
+
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the checkout timeout."""
+
+
+class _PooledConn:
+    __slots__ = ("conn", "created_at", "last_used", "uses")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+
+class ConnectionPool:
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=10.0,
+                 max_uses=0, max_age=0, ping_after=30.0):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (minconn, maxconn))
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_uses = max_uses      # 0 = never recycle by use count
+        self.max_age = max_age        # seconds, 0 = never recycle by age
+        self.ping_after = ping_after  # idle seconds before a SELECT 1 on checkout
+
+        self._cond = threading.Condition()
+        self._idle = []     # LIFO stack of _PooledConn
+        self._in_use = {}   # id(conn) -> _PooledConn
+        self._opening = 0   # connections currently being opened
+        self._waiters = 0
+        self._closed = False
+
+        # Counters (monotonic, for metrics)
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._broken = 0
+        self._wait_seconds = 0.0
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+
+    # --- internal helpers ---
+
+    def _connect(self):
+        return _PooledConn(psycopg2.connect(self.dsn))
+
+    def _discard(self, pc):
+        try:
+            pc.conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, pc):
+        if self.max_uses and pc.uses >= self.max_uses:
+            return True
+        if self.max_age and time.monotonic() - pc.created_at >= self.max_age:
+            return True
+        return False
+
+    def _alive(self, pc):
+        if pc.conn.closed:
+            return False
+        if time.monotonic() - pc.last_used < self.ping_after:
+            return True
+        try:
+            with pc.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            pc.conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _total(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    # --- public API ---
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            pc = None
+            open_new = False
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed.")
+                self._waiters += 1
+                try:
+                    while not self._idle and self._total() >= self.maxconn:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise PoolTimeout(
+                                "Timed out after %.1fs waiting for a database connection." % timeout
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+                if self._idle:
+                    pc = self._idle.pop()
+                else:
+                    self._opening += 1
+                    open_new = True
+
+            # Network I/O (connect / ping) happens outside the lock.
+            if open_new:
+                try:
+                    pc = self._connect()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        if pc is None:
+                            self._cond.notify()
+            elif self._expired(pc) or not self._alive(pc):
+                with self._cond:
+                    self._recycled += 1
+                self._discard(pc)
+                continue
+
+            pc.uses += 1
+            with self._cond:
+                self._in_use[id(pc.conn)] = pc
+                self._checkouts += 1
+                self._wait_seconds += time.monotonic() - started
+            return pc.conn
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            pc = self._in_use.pop(id(conn), None)
+        if pc is None:
+            # Not ours (or already returned) - just make sure it is closed.
+            if not conn.closed:
+                conn.close()
+            return
+
+        if not close and not conn.closed:
+            # Never hand a connection with an open/failed transaction to the next caller.
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        if close or conn.closed or self._expired(pc):
+            broken = close or conn.closed
+            self._discard(pc)
+            with self._cond:
+                if broken:
+                    self._broken += 1
+                else:
+                    self._recycled += 1
+                self._cond.notify()
+            return
+
+        pc.last_used = time.monotonic()
+        with self._cond:
+            if self._closed:
+                self._discard(pc)
+            else:
+                self._idle.append(pc)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for pc in self._idle:
+                self._discard(pc)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "checkouts_total": self._checkouts,
+                "timeouts_total": self._timeouts,
+                "recycled_total": self._recycled,
+                "broken_total": self._broken,
+                "wait_seconds_total": round(self._wait_seconds, 6),
+            }
+
+
+def pool_from_env(dsn):
+    # Sizes are per gunicorn worker process: total connections to Postgres is
+    # roughly workers * DB_POOL_MAX.
+    return ConnectionPool(
+        dsn,
+        minconn=int(os.environ.get("DB_POOL_MIN", 1)),
+        maxconn=int(os.environ.get("DB_POOL_MAX", 10)),
+        timeout=float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        max_uses=int(os.environ.get("DB_POOL_MAX_USES", 5000)),
+        max_age=float(os.environ.get("DB_POOL_MAX_AGE", 1800)),
+        ping_after=float(os.environ.get("DB_POOL_PING_AFTER", 30)),
+    )
@@ -0,0 +1,155 @@
+# duplicates.py
+# Likely-duplicate listings, found by matching photo hashes.
+#
+# Every derived image has a 64-bit dHash (images.py) indexed in four 16-bit
+# bands (migrations/013_image_hash_index.sql). A listing's photos are looked
+# up band by band - four B-tree equality probes each - and candidates within
+# MAX_DISTANCE bits are mapped back to the listings that use them through the
+# GIN index on locations.image_urls. Listings sharing at least MIN_MATCHES
+# photos (or all of them, if they have fewer) are flagged as a pair in
+# location_duplicates; admins review the pairs grouped into clusters.
+#
+# Functions take the cursor of the caller's transaction.
+
+import os
+
+# Must stay below the number of bands (4) for the band lookup to be exact
+MAX_DISTANCE = min(int(os.environ.get("DUPLICATE_MAX_DISTANCE", 3)), 3)
+MIN_MATCHES = int(os.environ.get("DUPLICATE_MIN_MATCHES", 2))
+MAX_CLUSTER_EDGES = 5000
+
+BANDS = ("dhash_band0", "dhash_band1", "dhash_band2", "dhash_band3")
+
+# One UNION arm per band so each is an index probe (an OR across the four
+# columns would not be, inside a lateral join)
+_CANDIDATES = "\n            UNION\n".join(
+    f"            SELECT original_url, dhash FROM location_images WHERE {band} = m.{band} AND dhash IS NOT NULL"
+    for band in BANDS
+)
+
+MATCH_SQL = f"""
+    WITH mine AS (
+        SELECT li.original_url, li.dhash, {", ".join("li." + band for band in BANDS)}
+        FROM locations l
+        JOIN location_images li ON li.original_url = ANY(l.image_urls)
+        -- flat images (all bits equal) hash alike whatever they show
+        WHERE l.id = %(location_id)s AND li.dhash IS NOT NULL AND li.dhash NOT IN (0, -1)
+    ),
+    similar AS (
+        SELECT m.original_url AS url, c.original_url AS other_url,
+               length(replace((m.dhash # c.dhash)::bit(64)::text, '0', '')) AS distance
+        FROM mine m
+        CROSS JOIN LATERAL (
+{_CANDIDATES}
+        ) c
+    )
+    SELECT o.id AS other_id, COUNT(DISTINCT s.url) AS matched_images, MIN(s.distance) AS distance
+    FROM similar s
+    JOIN locations o ON o.image_urls @> ARRAY[s.other_url]
+    WHERE s.distance <= %(max_distance)s
+      AND o.id <> %(location_id)s AND o.status <> 'archived'
+    GROUP BY o.id
+    HAVING COUNT(DISTINCT s.url) >= LEAST(%(min_matches)s, (SELECT COUNT(*) FROM mine))
+"""
+
+
+def find_matches(cur, location_id, max_distance=MAX_DISTANCE, min_matches=MIN_MATCHES):
+    cur.execute(MATCH_SQL, {"location_id": location_id, "max_distance": max_distance,
+                            "min_matches": min_matches})
+    return cur.fetchall()
+
+
+def flag_location(cur, location_id):
+    # Records every likely duplicate of location_id; returns their ids.
+    # Pairs an admin already dismissed stay dismissed.
+    matches = find_matches(cur, location_id)
+    for match in matches:
+        pair = (max(location_id, match["other_id"]), min(location_id, match["other_id"]))
+        cur.execute("""
+            INSERT INTO location_duplicates (location_id, duplicate_of, matched_images, distance)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (location_id, duplicate_of) DO UPDATE
+            SET matched_images = EXCLUDED.matched_images, distance = EXCLUDED.distance
+        """, pair + (match["matched_images"], match["distance"]))
+    return sorted(match["other_id"] for match in matches)
+
+
+def flag_for_url(cur, url):
+    # A photo's hash arrived after its listing was created (derivatives run in
+    # the background): re-check the listings that use it.
+    cur.execute("SELECT id FROM locations WHERE image_urls @> ARRAY[%s] AND status <> 'archived'", (url,))
+    for row in cur.fetchall():
+        flag_location(cur, row["id"])
+
+
+def clusters(cur, limit=50):
+    # Open pairs grouped into connected components (A~B and B~C -> {A, B, C}),
+    # newest activity first, with a summary of each listing.
+    cur.execute("""
+        SELECT location_id, duplicate_of, matched_images, distance, created_at
+        FROM location_duplicates
+        WHERE status = 'open'
+        ORDER BY created_at DESC
+        LIMIT %s
+    """, (MAX_CLUSTER_EDGES,))
+    edges = cur.fetchall()
+
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for edge in edges:
+        parent[find(edge["location_id"])] = find(edge["duplicate_of"])
+
+    groups = {}
+    for edge in edges:  # newest first, so the first edge seen dates the cluster
+        group = groups.setdefault(find(edge["location_id"]), {"ids": set(), "pairs": [], "latest": edge["created_at"]})
+        group["ids"].update((edge["location_id"], edge["duplicate_of"]))
+        group["pairs"].append({
+            "locationId": edge["location_id"],
+            "duplicateOf": edge["duplicate_of"],
+            "matchedImages": edge["matched_images"],
+            "distance": edge["distance"],
+        })
+    selected = list(groups.values())[:limit]
+    if not selected:
+        return []
+
+    ids = sorted({i for group in selected for i in group["ids"]})
+    cur.execute("""
+        SELECT id, property_type, city, postcode, contact_email, COALESCE(status, 'pending') AS status,
+               created_at, image_urls[1] AS image_url
+        FROM locations WHERE id = ANY(%s)
+    """, (ids,))
+    summaries = {row["id"]: row for row in cur.fetchall()}
+    return [{
+        "locations": [to_summary(summaries[i]) for i in sorted(group["ids"]) if i in summaries],
+        "pairs": group["pairs"],
+        "latest": group["latest"],
+    } for group in selected]
+
+
+def to_summary(row):
+    return {
+        "id": row["id"],
+        "title": f"{row['property_type'] or 'Property'} in {row['city'] or 'Unknown'}",
+        "postcode": row["postcode"],
+        "contactEmail": row["contact_email"],
+        "status": row["status"],
+        "createdAt": row["created_at"],
+        "image_url": row["image_url"],
+    }
+
+
+def dismiss(cur, location_ids):
+    # Marks every open pair among location_ids as not-a-duplicate.
+    cur.execute("""
+        UPDATE location_duplicates SET status = 'dismissed'
+        WHERE status = 'open' AND location_id = ANY(%s) AND duplicate_of = ANY(%s)
+    """, (list(location_ids), list(location_ids)))
+    return cur.rowcount
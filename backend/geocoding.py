@@ -0,0 +1,169 @@
+# geocoding.py
+# Postcode -> (latitude, longitude) for radius search.
+#
+# Geocoders share one method, lookup(cur, postcode), so the lookup runs in the
+# same transaction as the location insert. GEOCODER picks the implementation:
+#   - "local" (default): the offline postcode_coordinates table
+#     (migrations/007_location_coordinates.sql), no network at request time
+#   - "postcodes_io": api.postcodes.io, the service Register.jsx already uses;
+#     answers are written back into postcode_coordinates
+#   - "chain": local table first, postcodes.io for anything missing
+#
+# Load the offline table from any CSV with postcode, latitude and longitude
+# columns (e.g. the ONS Postcode Directory):
+#   python geocoding.py load postcodes.csv
+
+import csv
+import logging
+import os
+import sys
+
+import requests
+from psycopg2 import extras
+
+from metrics import external_call
+
+log = logging.getLogger("plink")
+
+POSTCODES_IO_URL = "https://api.postcodes.io/postcodes/"
+
+
+def normalise_postcode(postcode):
+    return "".join((postcode or "").split()).upper()
+
+
+class LocalPostcodeGeocoder:
+    def lookup(self, cur, postcode):
+        key = normalise_postcode(postcode)
+        if not key:
+            return None
+        cur.execute("SELECT latitude, longitude FROM postcode_coordinates WHERE postcode = %s", (key,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return (row["latitude"], row["longitude"]) if isinstance(row, dict) else tuple(row)
+
+
+class PostcodesIoGeocoder:
+    def __init__(self, timeout=3):
+        self.timeout = timeout
+
+    def lookup(self, cur, postcode):
+        key = normalise_postcode(postcode)
+        if not key:
+            return None
+        try:
+            with external_call("postcodes_io"):
+                response = requests.get(POSTCODES_IO_URL + key, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            # A missing coordinate only keeps the listing out of radius search;
+            # it must never fail the insert.
+            log.exception(f"Geocoder error for {key}")
+            return None
+        if response.status_code != 200:
+            return None
+        result = response.json().get("result") or {}
+        if result.get("latitude") is None or result.get("longitude") is None:
+            return None
+        coords = (result["latitude"], result["longitude"])
+        store_coordinates(cur, key, coords)
+        return coords
+
+
+class ChainGeocoder:
+    def __init__(self, *geocoders):
+        self.geocoders = geocoders
+
+    def lookup(self, cur, postcode):
+        for geocoder in self.geocoders:
+            coords = geocoder.lookup(cur, postcode)
+            if coords:
+                return coords
+        return None
+
+
+def store_coordinates(cur, postcode, coords):
+    cur.execute("""
+        INSERT INTO postcode_coordinates (postcode, latitude, longitude) VALUES (%s, %s, %s)
+        ON CONFLICT (postcode) DO NOTHING
+    """, (normalise_postcode(postcode), coords[0], coords[1]))
+
+
+def fill_from_table(cur, location_ids=None):
+    # Set-based geocoding for bulk inserts: one UPDATE instead of a lookup per
+    # row. Without ids it backfills every location still missing coordinates.
+    sql = """
+        UPDATE locations l
+        SET latitude = p.latitude, longitude = p.longitude
+        FROM postcode_coordinates p
+        WHERE l.latitude IS NULL
+          AND p.postcode = upper(replace(l.postcode, ' ', ''))
+    """
+    if location_ids is None:
+        cur.execute(sql)
+    else:
+        cur.execute(sql + " AND l.id = ANY(%s)", (list(location_ids),))
+
+
+def geocoder_from_env():
+    name = os.environ.get("GEOCODER", "local")
+    timeout = float(os.environ.get("GEOCODER_TIMEOUT", 3))
+    if name == "local":
+        return LocalPostcodeGeocoder()
+    if name == "postcodes_io":
+        return PostcodesIoGeocoder(timeout=timeout)
+    if name == "chain":
+        return ChainGeocoder(LocalPostcodeGeocoder(), PostcodesIoGeocoder(timeout=timeout))
+    raise ValueError(f"Unknown GEOCODER: {name}")
+
+
+# --- offline table loader ---
+
+def load_postcodes(conn, path, batch_size=5000):
+    # Upserts in batches so a full national file loads without holding it in memory.
+    def flush(cur, batch):
+        extras.execute_values(cur, """
+            INSERT INTO postcode_coordinates (postcode, latitude, longitude) VALUES %s
+            ON CONFLICT (postcode) DO UPDATE
+            SET latitude = EXCLUDED.latitude, longitude = EXCLUDED.longitude
+        """, batch, page_size=len(batch))
+
+    loaded = 0
+    with open(path, newline="", encoding="utf-8-sig") as f, conn.cursor() as cur:
+        reader = csv.DictReader(f)
+        fields = {name.lower(): name for name in reader.fieldnames or []}
+        pc, lat, lng = (fields.get(k) for k in ("postcode", "latitude", "longitude"))
+        if not (pc and lat and lng):
+            raise ValueError("CSV needs postcode, latitude and longitude columns")
+        batch = {}
+        for row in reader:
+            try:
+                key = normalise_postcode(row[pc])
+                batch[key] = (key, float(row[lat]), float(row[lng]))
+            except (TypeError, ValueError):
+                continue  # rows without coordinates (terminated postcodes etc.)
+            if len(batch) >= batch_size:
+                flush(cur, list(batch.values()))
+                loaded += len(batch)
+                batch = {}
+        if batch:
+            flush(cur, list(batch.values()))
+            loaded += len(batch)
+        fill_from_table(cur)
+    conn.commit()
+    return loaded
+
+
+if __name__ == "__main__":
+    import psycopg2
+
+    if len(sys.argv) != 3 or sys.argv[1] != "load":
+        sys.exit("usage: python geocoding.py load <postcodes.csv>")
+    dsn = os.environ.get("DATABASE_URL")
+    if not dsn:
+        sys.exit("DATABASE_URL environment variable not set.")
+    conn = psycopg2.connect(dsn)
+    try:
+        print(f"Loaded {load_postcodes(conn, sys.argv[2])} postcodes.")
+    finally:
+        conn.close()
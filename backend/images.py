@@ -0,0 +1,191 @@
+# images.py
+# Responsive derivatives for uploaded photos.
+#
+# After /upload has stored an original image (uploads.py), ImageProcessor
+# decodes it once with Pillow and writes a thumbnail and a medium-size JPEG
+# through the same storage backend, plus a tiny inline JPEG placeholder (LQIP).
+# Sizes and URLs are recorded in location_images
+# (migrations/012_location_images.sql), keyed by the original URL, so search
+# cards can serve thumbnails instead of full-resolution photos. Each image also
+# gets a 64-bit difference hash (dHash) that duplicates.py matches on.
+#
+# Pillow is optional: without it images_from_env() returns None and uploads
+# carry on with originals only.
+#
+#   python images.py backfill [limit]   # derive images already in locations.image_urls
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import requests
+from psycopg2 import extras
+
+import duplicates
+from metrics import external_call
+
+log = logging.getLogger("plink")
+
+# name -> longest edge in pixels
+VARIANTS = {"thumb": 400, "medium": 1200}
+JPEG_QUALITY = 80
+LQIP_SIZE = 16
+
+
+class ImageProcessor:
+    def __init__(self, storage, variants=None, quality=JPEG_QUALITY):
+        from PIL import Image, ImageOps  # ImportError when Pillow isn't installed
+        self.Image = Image
+        self.ImageOps = ImageOps
+        self.storage = storage
+        self.variants = variants or VARIANTS
+        self.quality = quality
+
+    def process(self, path, key_base):
+        # Returns {"width", "height", "lqip", "<variant>_url", ...} for the image at path.
+        with self.Image.open(path) as img:
+            width, height = img.size
+            if _rotated(img):
+                width, height = height, width
+            # JPEG can decode straight to a fraction of full size; ask for no
+            # more than the largest variant needs.
+            largest = max(self.variants.values())
+            img.draft("RGB", (largest, largest))
+            img = self.ImageOps.exif_transpose(img).convert("RGB")
+
+            meta = {"width": width, "height": height, "dhash": dhash(img, self.Image.LANCZOS)}
+            for name, size in sorted(self.variants.items(), key=lambda v: -v[1]):
+                img.thumbnail((size, size), self.Image.LANCZOS)  # shrinks in place, never upscales
+                meta[f"{name}_url"] = self._store(img, f"{key_base}_{name}.jpg")
+            meta["lqip"] = self._lqip(img)
+        return meta
+
+    def _store(self, img, key):
+        fd, tmp_path = tempfile.mkstemp(suffix=".jpg")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                img.save(out, "JPEG", quality=self.quality, optimize=True, progressive=True)
+            return self.storage.save(tmp_path, key, "image/jpeg")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _lqip(self, img):
+        small = img.copy()
+        small.thumbnail((LQIP_SIZE, LQIP_SIZE), self.Image.BILINEAR)
+        buf = io.BytesIO()
+        small.save(buf, "JPEG", quality=40)
+        return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+def dhash(img, resample):
+    # 64-bit difference hash: shrink to 9x8 greyscale and set one bit per pixel
+    # brighter than its right-hand neighbour. Re-encoded, resized or lightly
+    # edited copies of a photo land within a few bits of each other. Returned
+    # as a signed 64-bit int to fit a Postgres BIGINT.
+    pixels = list(img.convert("L").resize((9, 8), resample).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _rotated(img):
+    # EXIF orientations 5-8 swap width and height
+    try:
+        return img.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+    except Exception:
+        return False
+
+
+def is_image(content_type):
+    return bool(content_type) and content_type.startswith("image/") and content_type != "image/svg+xml"
+
+
+def record_image(cur, original_url, meta):
+    cur.execute("""
+        INSERT INTO location_images (original_url, width, height, thumb_url, medium_url, lqip, dhash)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (original_url) DO UPDATE
+        SET width = EXCLUDED.width, height = EXCLUDED.height, thumb_url = EXCLUDED.thumb_url,
+            medium_url = EXCLUDED.medium_url, lqip = EXCLUDED.lqip, dhash = EXCLUDED.dhash
+    """, (original_url, meta["width"], meta["height"], meta.get("thumb_url"),
+          meta.get("medium_url"), meta.get("lqip"), meta.get("dhash")))
+
+
+def images_from_env(storage):
+    if os.environ.get("IMAGE_DERIVATIVES", "true").lower() != "true":
+        return None
+    try:
+        return ImageProcessor(storage, quality=int(os.environ.get("IMAGE_JPEG_QUALITY", JPEG_QUALITY)))
+    except ImportError:
+        log.warning("Pillow is not installed; uploads will not get thumbnails.")
+        return None
+
+
+# --- backfill for images that never went through /upload ---
+
+def missing_urls(cur, limit):
+    cur.execute("""
+        SELECT DISTINCT u.url
+        FROM locations l, unnest(l.image_urls) AS u (url)
+        WHERE l.status <> 'archived'
+          AND NOT EXISTS (SELECT 1 FROM location_images li
+                          WHERE li.original_url = u.url AND li.dhash IS NOT NULL)
+        LIMIT %s
+    """, (limit,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def backfill(conn, processor, limit=500, timeout=20):
+    done = 0
+    with conn.cursor() as cur:
+        urls = missing_urls(cur, limit)
+    conn.rollback()
+    for url in urls:
+        fd, tmp_path = tempfile.mkstemp()
+        try:
+            with external_call("images"), requests.get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                with os.fdopen(fd, "wb") as out:
+                    shutil.copyfileobj(response.raw, out)
+            key_base = "derived_" + hashlib.sha1(url.encode()).hexdigest()[:20]
+            meta = processor.process(tmp_path, key_base)
+            with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+                record_image(cur, url, meta)
+                duplicates.flag_for_url(cur, url)
+            conn.commit()
+            done += 1
+        except Exception as e:
+            conn.rollback()
+            log.warning(f"Could not derive {url}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return done
+
+
+if __name__ == "__main__":
+    import psycopg2
+
+    from storage import storage_from_env
+
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != "backfill":
+        sys.exit("usage: python images.py backfill [limit]")
+    dsn = os.environ.get("DATABASE_URL")
+    if not dsn:
+        sys.exit("DATABASE_URL environment variable not set.")
+    processor = images_from_env(storage_from_env("static/uploads"))
+    if not processor:
+        sys.exit("Image derivatives are disabled (IMAGE_DERIVATIVES=false or Pillow missing).")
+    conn = psycopg2.connect(dsn)
+    try:
+        print(f"Derived {backfill(conn, processor, int(sys.argv[2]) if len(sys.argv) == 3 else 500)} images.")
+    finally:
+        conn.close()
@@ -0,0 +1,191 @@
+# jobs.py
+# Durable job scheduler backed by the scheduled_jobs table (replaces the
+# per-process, in-memory APScheduler).
+#
+# Jobs are rows, so they survive restarts and their arguments are persisted as
+# JSON. Any number of worker processes can run JobScheduler: each due job is
+# claimed with SELECT ... FOR UPDATE SKIP LOCKED and its handler runs inside
+# that same transaction. If the handler succeeds the job is marked done in the
+# same commit; if the process dies mid-run the transaction rolls back, the lock
+# is released and another worker picks the job up. Handlers that only touch the
+# database therefore run exactly once.
+#
+# Register a handler with scheduler.register("type", fn) where fn(conn, args)
+# uses the given connection and must not commit.
+
+import json
+import logging
+import os
+import socket
+import threading
+
+from psycopg2 import extras
+
+log = logging.getLogger("plink")
+
+
+class JobScheduler:
+    def __init__(self, get_conn, release_conn, poll_interval=5, backoff_base=60):
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers = {}
+        self._cancel_hooks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, job_type, handler, on_cancel=None):
+        self._handlers[job_type] = handler
+        if on_cancel:
+            self._cancel_hooks[job_type] = on_cancel
+
+    # --- producing jobs ---
+
+    def schedule(self, conn, job_type, args, run_at=None, created_by=None, max_attempts=5):
+        # Runs in the caller's transaction so the job and the data it refers to commit together.
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO scheduled_jobs (job_type, args, run_at, created_by, max_attempts)
+            VALUES (%s, %s, COALESCE(%s, NOW()), %s, %s)
+            RETURNING id
+        """, (job_type, json.dumps(args), run_at, created_by, max_attempts))
+        job_id = cur.fetchone()[0]
+        cur.close()
+        return job_id
+
+    def list_jobs(self, status=None, limit=50, before_id=None):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+            cur.execute("""
+                SELECT id, job_type, args, run_at, status, attempts, max_attempts,
+                       last_error, created_by, created_at, finished_at
+                FROM scheduled_jobs
+                WHERE (%s::text IS NULL OR status = %s)
+                  AND (%s::bigint IS NULL OR id < %s)
+                ORDER BY id DESC
+                LIMIT %s
+            """, (status, status, before_id, before_id, limit))
+            rows = cur.fetchall()
+            conn.rollback()
+            return rows
+        finally:
+            self.release_conn(conn)
+
+    def cancel(self, job_id):
+        # Returns the cancelled job, or None if it is not queued (finished, or
+        # running right now and therefore locked by another worker).
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+            cur.execute("""
+                UPDATE scheduled_jobs SET status = 'cancelled', finished_at = NOW()
+                WHERE id = (
+                    SELECT id FROM scheduled_jobs
+                    WHERE id = %s AND status = 'queued'
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, job_type, args
+            """, (job_id,))
+            job = cur.fetchone()
+            if job and job['job_type'] in self._cancel_hooks:
+                self._cancel_hooks[job['job_type']](conn, job['args'])
+            conn.commit()
+            return job
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+    def queue_depth(self):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM scheduled_jobs WHERE status = 'queued'")
+            depth = cur.fetchone()[0]
+            conn.rollback()
+            return depth
+        finally:
+            self.release_conn(conn)
+
+    # --- running jobs ---
+
+    def run_next(self):
+        # Claims and runs one due job. Returns True if a job was processed.
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+            cur.execute("""
+                SELECT id, job_type, args, attempts, max_attempts
+                FROM scheduled_jobs
+                WHERE status = 'queued' AND run_at <= NOW()
+                ORDER BY run_at, id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            """)
+            job = cur.fetchone()
+            if not job:
+                conn.rollback()
+                return False
+
+            # The savepoint lets a failed handler be undone while we keep the row lock.
+            cur.execute("SAVEPOINT job_run")
+            try:
+                handler = self._handlers.get(job['job_type'])
+                if handler is None:
+                    raise ValueError(f"No handler registered for job type {job['job_type']}")
+                handler(conn, job['args'])
+                cur.execute("""
+                    UPDATE scheduled_jobs
+                    SET status = 'done', attempts = attempts + 1, finished_at = NOW(), last_error = NULL
+                    WHERE id = %s
+                """, (job['id'],))
+                conn.commit()
+            except Exception as e:
+                # Undo the handler's work, then record the failure (and maybe retry)
+                cur.execute("ROLLBACK TO SAVEPOINT job_run")
+                log.exception(f"Job {job['id']} ({job['job_type']}) failed on {self.worker_id}")
+                self._record_failure(conn, job, e)
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+    def _record_failure(self, conn, job, error):
+        attempts = job['attempts'] + 1
+        final = attempts >= job['max_attempts']
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE scheduled_jobs
+            SET attempts = %s, last_error = %s,
+                status = CASE WHEN %s THEN 'failed' ELSE status END,
+                finished_at = CASE WHEN %s THEN NOW() ELSE NULL END,
+                run_at = NOW() + make_interval(secs => %s)
+            WHERE id = %s
+        """, (attempts, str(error)[:1000], final, final,
+              self.backoff_base * (2 ** (attempts - 1)), job['id']))
+        conn.commit()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_next():
+                    continue
+            except Exception:
+                log.exception("Job scheduler error")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name="job-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,98 @@
+# listings.py
+# Owner-scoped listings for GET /users/<id>/listings.
+#
+# One statement returns both the requested page and the owner's per-status
+# counts: two CTEs over the same (user_id, created_at, id) index from
+# migrations/009_owner_listings_index.sql, so an owner with hundreds of
+# listings costs one index range scan, never a table scan. Pages are keyset
+# paginated on (created_at, id) like search.
+
+import base64
+import json
+
+STATUSES = ("pending", "approved", "in-progress", "archived")
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+LISTING_COLUMNS = """
+    id, property_type, city, postcode, street_address, COALESCE(status, 'pending') AS status,
+    created_at, image_urls[1] AS image_url
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    key = [row["created_at"], row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(key, list) or len(key) != 2:
+        raise InvalidCursor("Invalid cursor")
+    return key
+
+
+def build_listings_query(user_id, status=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    page_where = ["user_id = %(user_id)s"]
+    params = {"user_id": str(user_id), "limit": limit}
+    if status:
+        page_where.append("COALESCE(status, 'pending') = %(status)s")
+        params["status"] = status
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        page_where.append("(created_at, id) < (%(created_at)s, %(last_id)s)")
+        params.update(created_at=created_at, last_id=last_id)
+
+    sql = f"""
+        WITH counts AS (
+            SELECT COALESCE(status, 'pending') AS status, COUNT(*) AS n
+            FROM locations WHERE user_id = %(user_id)s
+            GROUP BY 1
+        ),
+        page AS (
+            SELECT {LISTING_COLUMNS}
+            FROM locations
+            WHERE {' AND '.join(page_where)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %(limit)s
+        )
+        SELECT
+            (SELECT COALESCE(json_object_agg(status, n), '{{}}'::json) FROM counts) AS counts,
+            (SELECT COALESCE(json_agg(page ORDER BY created_at DESC, id DESC), '[]'::json) FROM page) AS rows
+    """
+    return sql, params
+
+
+def to_listing(row):
+    return {
+        "id": row["id"],
+        "title": f"{row['property_type'] or 'Property'} in {row['city'] or 'Unknown'}",
+        "type": row["property_type"],
+        "status": row["status"],
+        "address": ", ".join(part for part in (row["street_address"], row["city"], row["postcode"]) if part),
+        "image_url": row["image_url"],
+        "createdAt": row["created_at"],
+    }
+
+
+def paginate(result, limit):
+    # The page CTE fetched limit + 1 rows; the extra one only signals more.
+    rows = result["rows"] or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    counts = {status: 0 for status in STATUSES}
+    counts.update(result["counts"] or {})
+    return {
+        "listings": [to_listing(row) for row in rows],
+        "counts": counts,
+        "total": sum(counts.values()),
+        "nextCursor": encode_cursor(rows[-1]) if has_more and rows else None,
+    }
@@ -0,0 +1,148 @@
+# location_detail.py
+# Single-location reads and edits for GET / PATCH /locations/<id>.
+#
+# GET is one primary-key lookup. app.py caches the full detail per id in the
+# "location:<id>" cache namespace, and PATCH - the only write to an existing
+# locations row - invalidates just that location. (Admin approvals change
+# pending_locations, which the detail never reads.) ?fields= is applied after
+# the cache: every projection of a location shares one cached entry and gets
+# its own ETag.
+#
+# PATCH takes the field names POST /locations accepts (bulk_io.SCALAR_FIELDS /
+# ARRAY_FIELDS), compares them with the locked row and writes only the
+# columns whose value actually changed.
+
+import analytics
+import bulk_io
+
+DETAIL_SQL = """
+    SELECT id, user_id, property_type, city, postcode, property_styles, rooms,
+           interior_features, exterior_features, description, image_urls, video_url,
+           latitude, longitude, status, COALESCE(updated_at, created_at) AS modified_at
+    FROM locations
+    WHERE id = %s AND status <> 'archived'
+"""
+
+# Keys of the detail response, in order; ?fields= must pick from these
+DETAIL_FIELDS = (
+    "id", "title", "type", "location", "age", "rooms", "internalFeatures", "externalFeatures",
+    "description", "parking", "images", "videoUrl", "postcode", "coords", "status", "updatedAt",
+)
+
+# request field -> locations column; contact details are edited like the rest
+EDITABLE_FIELDS = {**bulk_io.SCALAR_FIELDS, **bulk_io.ARRAY_FIELDS}
+
+
+class InvalidField(ValueError):
+    pass
+
+
+class LocationNotFound(LookupError):
+    pass
+
+
+# --- reads ---
+
+def to_detail(row):
+    return {
+        "id": row["id"],
+        "title": f"{row['property_type']} in {row['city']}",
+        "type": row["property_type"],
+        "location": row["city"],
+        "age": row["property_styles"][0] if row["property_styles"] else "Unknown",
+        "rooms": row["rooms"] or [],
+        "internalFeatures": row["interior_features"] or [],
+        "externalFeatures": row["exterior_features"] or [],
+        "description": row["description"],
+        "parking": "Details on request",
+        "images": row["image_urls"] or [],
+        "videoUrl": row["video_url"],
+        "postcode": row["postcode"],
+        "coords": [row["latitude"], row["longitude"]] if row["latitude"] is not None else None,
+        "status": row["status"] or "pending",
+        "updatedAt": row["modified_at"].isoformat() if row["modified_at"] else None,
+    }
+
+
+def parse_fields(value):
+    # "title,images" -> ["id", "title", "images"]; None means everything
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in DETAIL_FIELDS]
+    if unknown:
+        raise InvalidField(f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in fields if f != "id"]
+
+
+def project(detail, fields):
+    if fields is None:
+        return detail
+    return {field: detail[field] for field in fields}
+
+
+# --- edits ---
+
+def changed_columns(current, data):
+    # Validated {column: new value} for the fields in data that differ from
+    # the current row. Raises InvalidField for unknown or bad values.
+    if not isinstance(data, dict) or not data:
+        raise InvalidField("Nothing to update")
+    unknown = [field for field in data if field not in EDITABLE_FIELDS]
+    if unknown:
+        raise InvalidField(f"Fields can't be edited: {', '.join(unknown)}")
+
+    changes = {}
+    for field, value in data.items():
+        column = EDITABLE_FIELDS[field]
+        stored = current[column]
+        if field in bulk_io.ARRAY_FIELDS:
+            stored = stored or []
+            value = value or []
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise InvalidField(f"{field} must be a list of strings")
+            value = [v.strip() for v in value if v.strip()]
+        else:
+            value = str(value).strip() if value is not None else ""
+            value = value or None
+        if field in bulk_io.REQUIRED_FIELDS and not value:
+            raise InvalidField(f"{field} is required")
+        if value != stored:
+            changes[column] = value
+
+    if changes.get("contact_email") and not bulk_io.EMAIL_RE.match(changes["contact_email"]):
+        raise InvalidField(f"Invalid email: {changes['contact_email']}")
+    for url in (changes.get("image_urls") or []) + ([changes["video_url"]] if changes.get("video_url") else []):
+        if not bulk_io.URL_RE.match(url):
+            raise InvalidField(f"Invalid URL: {url}")
+    return changes
+
+
+def update_location(cur, location_id, data, user_id, is_admin, geocoder):
+    # Locks the row, applies the changed columns and returns their names
+    # (empty when the request matched what was stored). Only the owner or an
+    # admin may edit; PermissionError otherwise.
+    cur.execute(f"""
+        SELECT id, user_id, {", ".join(EDITABLE_FIELDS.values())}
+        FROM locations WHERE id = %s AND status <> 'archived'
+        FOR UPDATE
+    """, (location_id,))
+    current = cur.fetchone()
+    if not current:
+        raise LocationNotFound("Location not found")
+    if not is_admin and str(current["user_id"]) != str(user_id):
+        raise PermissionError("You can only edit your own locations")
+
+    changes = changed_columns(current, data)
+    if not changes:
+        return []
+    if "postcode" in changes:
+        coords = geocoder.lookup(cur, changes["postcode"]) if changes["postcode"] else None
+        changes["latitude"], changes["longitude"] = coords or (None, None)
+
+    assignments = ", ".join(f"{column} = %s" for column in changes)
+    cur.execute(f"UPDATE locations SET {assignments}, updated_at = NOW() WHERE id = %s",
+                list(changes.values()) + [location_id])
+    if "property_type" in changes:
+        analytics.record_property_type_change(cur, current["property_type"], changes["property_type"])
+    return [column for column in changes if column not in ("latitude", "longitude")]
@@ -0,0 +1,487 @@
+# mailer.py
+# Outbound email: a Postgres-backed queue drained by a background worker.
+#
+#   create_campaign()   stores the campaign in email_analytics and its attachments
+#                       in email_attachments.
+#   expand_recipients() resolves recipients_type into one email_outbox row per
+#                       address with a single INSERT ... SELECT. Immediate sends
+#                       call it straight away; scheduled sends run it from a
+#                       "send_campaign" job (jobs.py) at the scheduled time.
+#   EmailWorker         claims due outbox rows in batches (FOR UPDATE SKIP LOCKED,
+#                       so several workers never send the same row), sends each
+#                       batch over one SMTP connection, rate-limits per provider
+#                       and retries temporary failures with backoff.
+#
+# The rate limit is shared by every worker process: before sending, a batch
+# reserves the next len(batch) / EMAIL_RATE_PER_SEC seconds of its host's
+# schedule in email_rate_limits (migrations/016_email_rate_limits.sql), waits
+# for that window and paces its messages through it.
+#
+# SMTP settings come from SMTP_HOST / SMTP_PORT / SMTP_USER / SMTP_PASSWORD /
+# SMTP_USE_TLS / EMAIL_FROM. For local testing point it at an SMTP sink, e.g.
+#   python -m aiosmtpd -n -l localhost:1025   and   SMTP_HOST=localhost SMTP_PORT=1025
+# or set EMAIL_TRANSPORT=fake to accept and drop every message in-process
+# (benchmarks, load tests).
+
+import json
+import logging
+import mimetypes
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+from psycopg2 import extras
+
+log = logging.getLogger("plink")
+
+# recipients_type -> query returning one "email" column. Anything else is taken
+# as a comma-separated list of addresses (e.g. the new admin's own address).
+RECIPIENT_QUERIES = {
+    "all": "SELECT email FROM auth_users WHERE email IS NOT NULL",
+    "users": "SELECT email FROM auth_users WHERE email IS NOT NULL AND user_role = 'user'",
+    "admins": "SELECT email FROM auth_users WHERE email IS NOT NULL AND user_role = 'admin'",
+    "profiles": "SELECT email FROM user_collection WHERE email IS NOT NULL",
+    "owners": "SELECT contact_email AS email FROM locations WHERE contact_email IS NOT NULL",
+}
+
+EMPTY_METRICS = {
+    "queued": 0, "sent": 0, "bounces": 0, "failed": 0,
+    "opens_rate": 0, "clicks_rate": 0, "unsubscribes": 0
+}
+
+
+def recipient_source(recipients_type):
+    recipients_type = (recipients_type or "").strip()
+    if recipients_type in RECIPIENT_QUERIES:
+        return RECIPIENT_QUERIES[recipients_type], ()
+    addresses = [a.strip() for a in recipients_type.split(",") if "@" in a]
+    if not addresses:
+        raise ValueError(f"Unknown recipients: {recipients_type!r}")
+    return "SELECT unnest(%s::text[]) AS email", (addresses,)
+
+
+def create_campaign(conn, recipients_type, subject, body, attachments=(), send_at=None):
+    # attachments: iterable of (filename, content_type, bytes). Runs in the
+    # caller's transaction; the caller commits.
+    recipient_source(recipients_type)  # validate now rather than at send time
+    cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+
+    cur.execute("""
+        INSERT INTO email_analytics (subject, recipients_type, sent_date, metrics, body, status, send_at)
+        VALUES (%s, %s, COALESCE(%s, NOW()), %s, %s, %s, %s)
+        RETURNING id
+    """, (subject, recipients_type, send_at, json.dumps(EMPTY_METRICS), body,
+          'scheduled' if send_at else 'queued', send_at))
+    campaign_id = cur.fetchone()['id']
+
+    for filename, content_type, data in attachments:
+        cur.execute("""
+            INSERT INTO email_attachments (campaign_id, filename, content_type, data)
+            VALUES (%s, %s, %s, %s)
+        """, (campaign_id, filename, content_type, extras.Binary(data)))
+    cur.close()
+    return campaign_id
+
+
+def expand_recipients(conn, campaign_id):
+    # Resolves the campaign's recipients_type into outbox rows in one statement.
+    # Idempotent thanks to the (campaign_id, recipient) unique key.
+    cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+    cur.execute("SELECT recipients_type, status FROM email_analytics WHERE id = %s", (campaign_id,))
+    campaign = cur.fetchone()
+    if not campaign or campaign['status'] == 'cancelled':
+        cur.close()
+        return 0
+
+    source_sql, source_params = recipient_source(campaign['recipients_type'])
+    cur.execute(f"""
+        INSERT INTO email_outbox (campaign_id, recipient)
+        SELECT DISTINCT %s, lower(r.email)
+        FROM ({source_sql}) r
+        ON CONFLICT (campaign_id, recipient) DO NOTHING
+    """, (campaign_id,) + tuple(source_params))
+
+    cur.execute("SELECT COUNT(*) AS queued FROM email_outbox WHERE campaign_id = %s", (campaign_id,))
+    queued = cur.fetchone()['queued']
+    metrics = dict(EMPTY_METRICS, queued=queued)
+    cur.execute("""
+        UPDATE email_analytics SET metrics = %s, status = 'queued', sent_date = NOW() WHERE id = %s
+    """, (json.dumps(metrics), campaign_id))
+    cur.close()
+    return queued
+
+
+def cancel_campaign(conn, campaign_id):
+    cur = conn.cursor()
+    cur.execute("UPDATE email_analytics SET status = 'cancelled' WHERE id = %s", (campaign_id,))
+    cur.close()
+
+
+class RateLimiter:
+    # Token bucket; one per SMTP provider so a burst to one host can't exceed its limit.
+    # Paces messages inside a window reserved from SharedSendSchedule.
+    def __init__(self, rate_per_sec, burst=None):
+        self.rate = rate_per_sec
+        self.capacity = burst or max(1, int(rate_per_sec))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def rate_limiter_for(host, rate_per_sec):
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            # No burst: the reserved window only has room for an even spread
+            _rate_limiters[host] = RateLimiter(rate_per_sec, burst=1)
+        return _rate_limiters[host]
+
+
+class SharedSendSchedule:
+    # Per-host sending schedule in Postgres. reserve(count) books the next
+    # count / rate seconds for the caller and returns how long to wait before
+    # the booked window starts; windows never overlap, across processes too.
+    def __init__(self, get_conn, release_conn, host, rate_per_sec):
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.host = host
+        self.rate = rate_per_sec
+
+    def reserve(self, count):
+        if not self.rate or not count:
+            return 0
+        duration = count / self.rate
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO email_rate_limits (host) VALUES (%s)
+                ON CONFLICT (host) DO NOTHING
+            """, (self.host,))
+            cur.execute("""
+                UPDATE email_rate_limits
+                SET next_send_at = GREATEST(next_send_at, NOW()) + make_interval(secs => %s)
+                WHERE host = %s
+                RETURNING EXTRACT(EPOCH FROM next_send_at - NOW())
+            """, (duration, self.host))
+            window_end = float(cur.fetchone()[0])
+            conn.commit()
+            return max(0.0, window_end - duration)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+
+class SMTPSender:
+    def __init__(self, host, port=25, user=None, password=None, use_tls=False, from_addr=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.from_addr = from_addr
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            host=os.environ.get("SMTP_HOST", "localhost"),
+            port=int(os.environ.get("SMTP_PORT", 25)),
+            user=os.environ.get("SMTP_USER"),
+            password=os.environ.get("SMTP_PASSWORD"),
+            use_tls=os.environ.get("SMTP_USE_TLS", "false").lower() == "true",
+            from_addr=os.environ.get("EMAIL_FROM", "no-reply@plink.co.uk"),
+        )
+
+    def connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.user:
+            smtp.login(self.user, self.password)
+        return smtp
+
+
+class FakeSMTPSender:
+    # Same interface as SMTPSender; messages are counted and dropped.
+    host = "fake"
+
+    def __init__(self, from_addr="no-reply@plink.co.uk", delay=0):
+        self.from_addr = from_addr
+        self.delay = delay
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return _FakeSMTPConnection(self)
+
+
+class _FakeSMTPConnection:
+    def __init__(self, sender):
+        self.sender = sender
+
+    def send_message(self, msg):
+        if self.sender.delay:
+            time.sleep(self.sender.delay)
+        with self.sender._lock:
+            self.sender.sent += 1
+
+    def quit(self):
+        pass
+
+
+def sender_from_env():
+    if os.environ.get("EMAIL_TRANSPORT", "smtp") == "fake":
+        return FakeSMTPSender(from_addr=os.environ.get("EMAIL_FROM", "no-reply@plink.co.uk"),
+                              delay=float(os.environ.get("EMAIL_FAKE_DELAY", 0)))
+    return SMTPSender.from_env()
+
+
+def build_message(from_addr, recipient, subject, body, attachments):
+    msg = EmailMessage()
+    msg["From"] = from_addr
+    msg["To"] = recipient
+    msg["Subject"] = subject or ""
+    msg.set_content(body or "")
+    for att in attachments:
+        content_type = att["content_type"] or mimetypes.guess_type(att["filename"])[0] or "application/octet-stream"
+        maintype, _, subtype = content_type.partition("/")
+        msg.add_attachment(bytes(att["data"]), maintype=maintype, subtype=subtype or "octet-stream",
+                           filename=att["filename"])
+    return msg
+
+
+class EmailWorker:
+    def __init__(self, get_conn, release_conn, sender=None, batch_size=100, rate_per_sec=10,
+                 max_attempts=5, backoff_base=60, lease_seconds=600, poll_interval=5):
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.sender = sender or sender_from_env()
+        self.batch_size = batch_size
+        self.rate_limiter = rate_limiter_for(self.sender.host, rate_per_sec)
+        self.schedule = SharedSendSchedule(get_conn, release_conn, self.sender.host, rate_per_sec)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, get_conn, release_conn):
+        return cls(
+            get_conn, release_conn,
+            batch_size=int(os.environ.get("EMAIL_BATCH_SIZE", 100)),
+            rate_per_sec=float(os.environ.get("EMAIL_RATE_PER_SEC", 10)),
+            max_attempts=int(os.environ.get("EMAIL_MAX_ATTEMPTS", 5)),
+            poll_interval=float(os.environ.get("EMAIL_POLL_INTERVAL", 5)),
+        )
+
+    # --- queue access ---
+
+    def claim_batch(self):
+        # Leasing: claimed rows get next_attempt_at = now + lease, so if this
+        # process dies mid-batch another worker picks them up after the lease.
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+            cur.execute("""
+                UPDATE email_outbox o
+                SET status = 'sending', attempts = o.attempts + 1,
+                    next_attempt_at = NOW() + make_interval(secs => %s)
+                FROM (
+                    SELECT id FROM email_outbox
+                    WHERE status IN ('queued', 'sending') AND next_attempt_at <= NOW()
+                    ORDER BY next_attempt_at, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) due
+                WHERE o.id = due.id
+                RETURNING o.id, o.campaign_id, o.recipient, o.attempts
+            """, (self.lease_seconds, self.batch_size))
+            rows = cur.fetchall()
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+    def load_campaigns(self, campaign_ids):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+            cur.execute("SELECT id, subject, body FROM email_analytics WHERE id = ANY(%s)", (list(campaign_ids),))
+            campaigns = {row['id']: dict(row, attachments=[]) for row in cur.fetchall()}
+            cur.execute("""
+                SELECT campaign_id, filename, content_type, data FROM email_attachments
+                WHERE campaign_id = ANY(%s) ORDER BY id
+            """, (list(campaign_ids),))
+            for att in cur.fetchall():
+                campaigns[att['campaign_id']]['attachments'].append(att)
+            conn.rollback()
+            return campaigns
+        finally:
+            self.release_conn(conn)
+
+    def record_results(self, results, campaign_ids, released=(), release_error=None):
+        # results: list of (outbox_id, status, error, retry_in_seconds).
+        # released: outbox ids handed back unsent; the claim's attempt is given back.
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            if results:
+                extras.execute_values(cur, """
+                    UPDATE email_outbox o SET
+                        status = v.status,
+                        last_error = v.error,
+                        sent_at = CASE WHEN v.status = 'sent' THEN NOW() ELSE o.sent_at END,
+                        next_attempt_at = NOW() + make_interval(secs => v.retry_in)
+                    FROM (VALUES %s) AS v(id, status, error, retry_in)
+                    WHERE o.id = v.id
+                """, results, template="(%s::bigint, %s, %s, %s::double precision)")
+            if released:
+                cur.execute("""
+                    UPDATE email_outbox
+                    SET status = 'queued', attempts = GREATEST(attempts - 1, 0), last_error = %s,
+                        next_attempt_at = NOW() + make_interval(secs => %s)
+                    WHERE id = ANY(%s)
+                """, (str(release_error)[:500], self.backoff_base, list(released)))
+
+            # Real per-campaign counts, recomputed from the outbox
+            cur.execute("""
+                SELECT campaign_id,
+                       COUNT(*) AS queued,
+                       COUNT(*) FILTER (WHERE status = 'sent') AS sent,
+                       COUNT(*) FILTER (WHERE status = 'bounced') AS bounces,
+                       COUNT(*) FILTER (WHERE status = 'failed') AS failed,
+                       COUNT(*) FILTER (WHERE status IN ('queued', 'sending')) AS pending
+                FROM email_outbox WHERE campaign_id = ANY(%s)
+                GROUP BY campaign_id
+            """, (list(campaign_ids),))
+            for campaign_id, queued, sent, bounces, failed, pending in cur.fetchall():
+                metrics = dict(EMPTY_METRICS, queued=queued, sent=sent, bounces=bounces, failed=failed)
+                cur.execute("""
+                    UPDATE email_analytics
+                    SET metrics = %s, status = %s,
+                        sent_date = CASE WHEN %s THEN NOW() ELSE sent_date END
+                    WHERE id = %s
+                """, (json.dumps(metrics), 'sending' if pending else 'sent', not pending, campaign_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+    # --- sending ---
+
+    def retry_delay(self, attempts):
+        return self.backoff_base * (2 ** (attempts - 1))
+
+    def failure(self, row, error, permanent):
+        if permanent or row['attempts'] >= self.max_attempts:
+            return (row['id'], 'bounced' if permanent else 'failed', str(error)[:500], 0)
+        return (row['id'], 'queued', str(error)[:500], self.retry_delay(row['attempts']))
+
+    def send_batch(self, rows):
+        campaigns = self.load_campaigns({row['campaign_id'] for row in rows})
+        results = []
+        released, connect_error = [], None
+        smtp = None
+        try:
+            for index, row in enumerate(rows):
+                campaign = campaigns.get(row['campaign_id'])
+                if not campaign:
+                    results.append((row['id'], 'failed', 'Campaign not found', 0))
+                    continue
+                if smtp is None:
+                    try:
+                        smtp = self.sender.connect()  # one connection for the whole batch
+                    except (smtplib.SMTPException, OSError) as e:
+                        # Connect / TLS / login trouble is the server's, not the
+                        # recipients': hand the rest of the batch back for a later retry
+                        log.exception(f"SMTP connection to {self.sender.host} failed")
+                        released, connect_error = [r['id'] for r in rows[index:]], e
+                        break
+                msg = build_message(self.sender.from_addr, row['recipient'], campaign['subject'],
+                                    campaign['body'], campaign['attachments'])
+                self.rate_limiter.acquire()
+                try:
+                    smtp.send_message(msg)
+                    results.append((row['id'], 'sent', None, 0))
+                except smtplib.SMTPRecipientsRefused as e:
+                    codes = [code for code, _ in e.recipients.values()]
+                    results.append(self.failure(row, e, permanent=all(c >= 500 for c in codes)))
+                except smtplib.SMTPResponseException as e:
+                    results.append(self.failure(row, e, permanent=e.smtp_code >= 500))
+                    if e.smtp_code in (421,):
+                        smtp = self._close(smtp)
+                except (smtplib.SMTPException, OSError) as e:
+                    # Connection trouble: retry later on a fresh connection
+                    results.append(self.failure(row, e, permanent=False))
+                    smtp = self._close(smtp)
+        finally:
+            self._close(smtp)
+            if results or released:
+                self.record_results(results, campaigns.keys() or {row['campaign_id'] for row in rows},
+                                    released, connect_error)
+        return results
+
+    def _close(self, smtp):
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                pass
+        return None
+
+    def run_once(self):
+        rows = self.claim_batch()
+        if rows:
+            # Waits behind other workers' windows; at the default batch size
+            # and rate that is far inside the claim's lease
+            self._stop.wait(self.schedule.reserve(len(rows)))
+            self.send_batch(rows)
+        return len(rows)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                # Keep draining while there is work; sleep only when the queue is empty.
+                if self.run_once():
+                    continue
+            except Exception:
+                log.exception("Email worker error")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name="email-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
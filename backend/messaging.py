@@ -0,0 +1,405 @@
+# messaging.py
+# Conversations between a location's owner and an enquirer, paged message
+# history and the pub/sub that pushes new messages to open streams
+# (tables from migrations/010_messaging.sql).
+#
+# History is keyset paginated on (created_at, id), newest first, over the
+# (conversation_id, created_at DESC, id DESC) index, so opening a conversation
+# reads one page however long it is. Query functions take the cursor of the
+# caller's transaction (run_in_transaction in app.py).
+#
+# New messages are published on one channel per participant ("user:<id>");
+# each GET /messages/stream holds a Subscription to its user's channel.
+# LocalBroker fans out inside one process. PostgresBroker sends the event with
+# NOTIFY and every process LISTENs, so it reaches streams held by any worker.
+# Pick one with MESSAGE_BROKER=local|postgres.
+
+import base64
+import datetime
+import json
+import logging
+import os
+import queue
+import select
+import threading
+from urllib.parse import unquote, urlsplit
+
+import psycopg2
+
+log = logging.getLogger("plink")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BODY_LENGTH = 5000
+REPLAY_LIMIT = 200
+
+MESSAGE_COLUMNS = "id, conversation_id, sender_id, body, file_url, file_name, created_at"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class ConversationNotFound(LookupError):
+    pass
+
+
+# --- conversations ---
+
+def get_or_create_conversation(cur, location_id, enquirer_id):
+    # The owner is whoever created the location. Returns (conversation, created).
+    cur.execute("SELECT user_id FROM locations WHERE id = %s AND status <> 'archived'", (location_id,))
+    location = cur.fetchone()
+    if not location:
+        raise ConversationNotFound("Location not found")
+    if not location["user_id"]:
+        raise ConversationNotFound("This location has no owner to message")
+    owner_id = str(location["user_id"])
+    if owner_id == str(enquirer_id):
+        raise ValueError("You can't start a conversation about your own location")
+
+    cur.execute("""
+        INSERT INTO conversations (location_id, owner_id, enquirer_id)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (location_id, enquirer_id) DO NOTHING
+        RETURNING *
+    """, (location_id, owner_id, str(enquirer_id)))
+    conversation = cur.fetchone()
+    if conversation:
+        return conversation, True
+    cur.execute("SELECT * FROM conversations WHERE location_id = %s AND enquirer_id = %s",
+                (location_id, str(enquirer_id)))
+    return cur.fetchone(), False
+
+
+def get_conversation(cur, conversation_id, user_id):
+    # Only the two participants can see a conversation.
+    cur.execute("""
+        SELECT * FROM conversations
+        WHERE id = %s AND (owner_id = %s OR enquirer_id = %s)
+    """, (conversation_id, str(user_id), str(user_id)))
+    conversation = cur.fetchone()
+    if not conversation:
+        raise ConversationNotFound("Conversation not found")
+    return conversation
+
+
+def list_conversations(cur, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    # Inbox, most recently active first. Each side of the OR is read from its
+    # own index in order and the two are merged; the latest message per
+    # conversation is one index probe.
+    params = {"user_id": str(user_id), "limit": limit}
+    after = ""
+    if cursor:
+        last_message_at, last_id = decode_cursor(cursor)
+        after = "AND (last_message_at, id) < (%(last_at)s, %(last_id)s)"
+        params.update(last_at=last_message_at, last_id=last_id)
+    cur.execute(f"""
+        WITH inbox AS (
+            (SELECT * FROM conversations WHERE owner_id = %(user_id)s {after}
+             ORDER BY last_message_at DESC, id DESC LIMIT %(limit)s)
+            UNION ALL
+            (SELECT * FROM conversations WHERE enquirer_id = %(user_id)s {after}
+             ORDER BY last_message_at DESC, id DESC LIMIT %(limit)s)
+        )
+        SELECT c.*, l.property_type, l.city, l.image_urls[1] AS image_url,
+               m.body AS last_body, m.sender_id AS last_sender_id
+        FROM inbox c
+        JOIN locations l ON l.id = c.location_id
+        LEFT JOIN LATERAL (
+            SELECT body, sender_id FROM messages
+            WHERE conversation_id = c.id
+            ORDER BY created_at DESC, id DESC LIMIT 1
+        ) m ON TRUE
+        ORDER BY c.last_message_at DESC, c.id DESC
+        LIMIT %(limit)s
+    """, params)
+    return cur.fetchall()
+
+
+def to_conversation(row, user_id):
+    other = row["enquirer_id"] if row["owner_id"] == str(user_id) else row["owner_id"]
+    result = {
+        "id": row["id"],
+        "locationId": row["location_id"],
+        "ownerId": row["owner_id"],
+        "enquirerId": row["enquirer_id"],
+        "otherUserId": other,
+        "createdAt": _iso(row["created_at"]),
+        "lastMessageAt": _iso(row["last_message_at"]),
+    }
+    if "property_type" in row:
+        result.update(
+            title=f"{row['property_type'] or 'Property'} in {row['city'] or 'Unknown'}",
+            image_url=row["image_url"],
+            lastMessage=row["last_body"],
+            lastSenderId=row["last_sender_id"],
+        )
+    return result
+
+
+# --- messages ---
+
+def history(cur, conversation_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    # One page, newest first; pass the returned cursor to go further back.
+    sql = f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE conversation_id = %s"
+    params = [conversation_id]
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        sql += " AND (created_at, id) < (%s, %s)"
+        params += [created_at, last_id]
+    sql += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    cur.execute(sql, params + [limit])
+    return cur.fetchall()
+
+
+def post_message(cur, conversation_id, sender_id, body, file_url=None, file_name=None):
+    cur.execute(f"""
+        INSERT INTO messages (conversation_id, sender_id, body, file_url, file_name)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING {MESSAGE_COLUMNS}
+    """, (conversation_id, str(sender_id), body, file_url, file_name))
+    message = cur.fetchone()
+    cur.execute("UPDATE conversations SET last_message_at = %s WHERE id = %s",
+                (message["created_at"], conversation_id))
+    return message
+
+
+def messages_since(cur, user_id, last_id, limit=REPLAY_LIMIT):
+    # What a reconnecting stream missed: the user's messages after the last
+    # event id it saw (EventSource sends it back as Last-Event-ID).
+    cur.execute("""
+        SELECT m.id, m.conversation_id, m.sender_id, m.body, m.file_url, m.file_name, m.created_at
+        FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE m.id > %s AND (c.owner_id = %s OR c.enquirer_id = %s)
+        ORDER BY m.id
+        LIMIT %s
+    """, (last_id, str(user_id), str(user_id), limit))
+    return cur.fetchall()
+
+
+def validate_message(data, file_url_prefix):
+    # Body of POST /conversations/<id>/messages -> (text, file_url, file_name).
+    # Attachments must be files we stored (file_url_prefix is the storage
+    # backend's url_prefix), so a message can't carry a javascript: or
+    # third-party link that the other side would open as a download.
+    text = str(data.get("text") or "").strip()
+    file_url = data.get("fileUrl") or None
+    file_name = data.get("fileName") or None
+    if not text and not file_url:
+        raise ValueError("A message needs text or an attachment")
+    if len(text) > MAX_BODY_LENGTH:
+        raise ValueError(f"Messages are limited to {MAX_BODY_LENGTH} characters")
+    if file_url is not None and not is_uploaded_file_url(file_url, file_url_prefix):
+        raise ValueError("Attachments must be uploaded through /upload first")
+    if file_name is not None and not isinstance(file_name, str):
+        raise ValueError("fileName must be a string")
+    return text, file_url, file_name
+
+
+def is_uploaded_file_url(url, prefix):
+    if not isinstance(url, str) or not url.startswith(prefix):
+        return False
+    parts = urlsplit(url)
+    if parts.scheme:
+        return parts.scheme in ("http", "https")
+    # Local storage without PUBLIC_BASE_URL hands out site-relative paths
+    return not parts.netloc and ".." not in unquote(parts.path)
+
+
+def to_message(row):
+    return {
+        "id": row["id"],
+        "conversationId": row["conversation_id"],
+        "senderId": row["sender_id"],
+        "text": row["body"],
+        "file": row["file_url"],
+        "fileName": row["file_name"],
+        "createdAt": _iso(row["created_at"]),
+    }
+
+
+def paginate(rows, limit):
+    # rows were fetched with limit + 1; the page goes out oldest first so the
+    # client can prepend it as-is.
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "messages": [to_message(row) for row in reversed(rows)],
+        "nextCursor": encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if has_more and rows else None,
+    }
+
+
+def encode_cursor(created_at, row_id):
+    key = [_iso(created_at), row_id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(key, list) or len(key) != 2:
+        raise InvalidCursor("Invalid cursor")
+    return key
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+# --- pub/sub ---
+
+class Subscription:
+    # One open stream. A client that stops reading fills its queue and is cut
+    # off (overflowed); it reconnects and catches up from the database.
+    def __init__(self, channels, max_queue):
+        self.channels = tuple(channels)
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=max_queue)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        # Next event, or None if nothing arrived within timeout seconds.
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LocalBroker:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len({id(sub) for subs in self._subscribers.values() for sub in subs})
+
+    def subscribe(self, *channels):
+        sub = Subscription(channels, self.max_queue)
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._subscribers.get(channel)
+                if subs:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[channel]
+
+    def publish(self, channels, event):
+        # Call after the write has committed.
+        self._deliver(channels, event)
+
+    def _deliver(self, channels, event):
+        with self._lock:
+            targets = {sub for channel in channels for sub in self._subscribers.get(channel, ())}
+        for sub in targets:
+            sub.put(event)
+
+    def stop(self):
+        pass
+
+
+class PostgresBroker(LocalBroker):
+    # NOTIFY payloads are capped at 8000 bytes. A message too big to fit is
+    # sent without its text and marked truncated; the client reloads it.
+    PAYLOAD_LIMIT = 7900
+
+    def __init__(self, dsn, get_conn, release_conn, channel="plink_messages", max_queue=100):
+        super().__init__(max_queue)
+        self.dsn = dsn
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def subscribe(self, *channels):
+        # The listener connection is only opened once this process serves a stream.
+        self._ensure_listener()
+        return super().subscribe(*channels)
+
+    def publish(self, channels, event):
+        payload = json.dumps({"channels": list(channels), "event": event}, default=str)
+        if len(payload.encode()) > self.PAYLOAD_LIMIT:
+            event = {**event, "message": {**event["message"], "text": None, "truncated": True}}
+            payload = json.dumps({"channels": list(channels), "event": event}, default=str)
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            conn.commit()
+        finally:
+            self.release_conn(conn)
+
+    def _ensure_listener(self):
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen_forever, name="message-listener", daemon=True)
+            self._thread.start()
+
+    def _listen_forever(self):
+        delay = 1
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f'LISTEN "{self.channel}"')
+                delay = 1
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception:
+                log.exception("Message listener failed; reconnecting")
+                self._stop.wait(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                if conn:
+                    conn.close()
+
+    def _dispatch(self, payload):
+        try:
+            data = json.loads(payload)
+            self._deliver(data["channels"], data["event"])
+        except (ValueError, KeyError):
+            log.warning("Ignoring malformed message notification")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+
+def broker_from_env(dsn=None, get_conn=None, release_conn=None):
+    kind = os.environ.get("MESSAGE_BROKER", "local").lower()
+    max_queue = int(os.environ.get("MESSAGE_STREAM_QUEUE", 100))
+    if kind == "postgres":
+        return PostgresBroker(dsn, get_conn, release_conn, max_queue=max_queue)
+    return LocalBroker(max_queue=max_queue)
@@ -0,0 +1,244 @@
+# metrics.py
+# Prometheus-style metrics and structured JSON logs.
+#
+# Counters and histograms live in a process-wide registry and are rendered in
+# the Prometheus text format by GET /metrics. Gauges that already exist
+# elsewhere (pool stats, cache stats, scheduler queue depth) are registered as
+# callbacks and read at scrape time. Each gunicorn worker keeps its own
+# numbers, so scrape every worker or aggregate with the usual sum by(...).
+#
+# Logs are one JSON object per line on stderr; request_log() and the slow
+# query log add the current request id when there is one.
+
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+log = logging.getLogger("plink")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, count in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, values)} {count}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, values, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {round(series[-2], 6)}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, values)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._gauges = []  # (name, help, type, fn() -> number or {label value: number}, label name)
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name, help_text, fn, label=None, metric_type="gauge"):
+        self._gauges.append((name, help_text, metric_type, fn, label))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, metric_type, fn, label in self._gauges:
+            try:
+                value = fn()
+            except Exception as e:
+                # One broken source (e.g. the database being down) must not hide the rest.
+                log.warning("metrics callback %s failed: %s", name, e)
+                continue
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if isinstance(value, dict):
+                for key, v in sorted(value.items()):
+                    lines.append(f'{name}{{{label}="{_escape(key)}"}} {v}')
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "plink_http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status"))
+http_latency = registry.histogram(
+    "plink_http_request_duration_seconds", "HTTP request latency by route.", ("route", "method"))
+request_db_time = registry.histogram(
+    "plink_request_db_seconds", "Database time spent per HTTP request.", ("route",))
+db_queries = registry.counter(
+    "plink_db_queries_total", "Database queries (or transactions) by kind.", ("kind",))
+db_query_time = registry.histogram(
+    "plink_db_query_duration_seconds", "Database query / transaction latency by kind.", ("kind",))
+db_slow_queries = registry.counter(
+    "plink_db_slow_queries_total", "Queries slower than SLOW_QUERY_MS.", ("kind",))
+pool_wait_time = registry.histogram(
+    "plink_db_pool_wait_seconds", "Time spent waiting for a pooled connection.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10))
+external_calls = registry.histogram(
+    "plink_external_call_duration_seconds", "Latency of calls to external services.", ("service", "outcome"))
+
+
+# --- per-request accounting ---
+
+def start_request(request_id):
+    g.request_id = request_id
+    g.request_start = time.perf_counter()
+    g.db_seconds = 0.0
+    g.db_queries = 0
+
+
+def current_request_id():
+    return getattr(g, "request_id", None) if has_request_context() else None
+
+
+class QueryTimer:
+    # Times one query or transaction; the caller supplies the SQL for the slow log.
+    def __init__(self, kind, sql=None, slow_seconds=None):
+        self.kind = kind
+        self.sql = sql
+        self.slow_seconds = slow_seconds
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        db_queries.inc(self.kind)
+        db_query_time.observe(elapsed, self.kind)
+        if has_request_context() and hasattr(g, "db_seconds"):
+            g.db_seconds += elapsed
+            g.db_queries += 1
+        if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+            db_slow_queries.inc(self.kind)
+            log.warning("slow query", extra={"fields": {
+                "kind": self.kind,
+                "duration_ms": round(elapsed * 1000, 1),
+                "sql": " ".join((self.sql or "").split())[:1000],
+            }})
+        return False
+
+
+@contextmanager
+def external_call(service):
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        external_calls.observe(time.perf_counter() - start, service, outcome)
+
+
+def finish_request(route, method, status):
+    elapsed = time.perf_counter() - g.request_start
+    http_requests.inc(route, method, str(status))
+    http_latency.observe(elapsed, route, method)
+    request_db_time.observe(g.db_seconds, route)
+    return elapsed
+
+
+# --- structured logs ---
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "msg": record.getMessage(),
+        }
+        request_id = current_request_id()
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level="INFO"):
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter())
+    log.handlers[:] = [handler]
+    log.setLevel(level)
+    log.propagate = False
+    return log
@@ -0,0 +1,72 @@
+# migrate.py
+# Applies the SQL files in migrations/ in filename order, once each.
+#
+#   python migrate.py                 # apply pending migrations
+#   python migrate.py --status        # list applied / pending files
+
+import os
+import sys
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def migration_files():
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+
+
+def applied_migrations(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                filename TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+        cur.execute("SELECT filename FROM schema_migrations")
+        done = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return done
+
+
+def run_migrations(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        done = applied_migrations(conn)
+        for filename in migration_files():
+            if filename in done:
+                continue
+            with open(os.path.join(MIGRATIONS_DIR, filename)) as f:
+                sql = f.read()
+            print(f"Applying {filename}...")
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    cur.execute("INSERT INTO schema_migrations (filename) VALUES (%s)", (filename,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        conn.close()
+
+
+def print_status(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        done = applied_migrations(conn)
+    finally:
+        conn.close()
+    for filename in migration_files():
+        print(f"{'applied' if filename in done else 'pending'}  {filename}")
+
+
+if __name__ == "__main__":
+    dsn = os.environ.get("DATABASE_URL")
+    if not dsn:
+        sys.exit("DATABASE_URL environment variable not set.")
+    if "--status" in sys.argv:
+        print_status(dsn)
+    else:
+        run_migrations(dsn)
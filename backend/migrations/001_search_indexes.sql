@@ -0,0 +1,50 @@
+-- 001_search_indexes.sql
+-- Indexes backing /locations/search so filters stop forcing sequential scans.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- array_to_string() is only STABLE, which generated columns don't accept.
+-- For text[] input it is safe to treat as IMMUTABLE.
+CREATE OR REPLACE FUNCTION plink_immutable_array_to_string(text[], text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT array_to_string($1, $2) $$;
+
+-- Full-text document: type, city and tags weigh more than free description.
+ALTER TABLE locations
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(property_type, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(city, '')), 'A') ||
+        setweight(to_tsvector('english',
+            coalesce(plink_immutable_array_to_string(property_styles, ' '), '') || ' ' ||
+            coalesce(plink_immutable_array_to_string(rooms, ' '), '') || ' ' ||
+            coalesce(plink_immutable_array_to_string(interior_features, ' '), '') || ' ' ||
+            coalesce(plink_immutable_array_to_string(exterior_features, ' '), '')
+        ), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED;
+
+-- Search always excludes archived rows, so every index is partial on that predicate.
+CREATE INDEX IF NOT EXISTS idx_locations_search_vector
+    ON locations USING GIN (search_vector) WHERE status <> 'archived';
+
+CREATE INDEX IF NOT EXISTS idx_locations_postcode_trgm
+    ON locations USING GIN (postcode gin_trgm_ops) WHERE status <> 'archived';
+CREATE INDEX IF NOT EXISTS idx_locations_city_trgm
+    ON locations USING GIN (city gin_trgm_ops) WHERE status <> 'archived';
+
+-- Array filters are queried with @> (containment), which GIN supports; "x = ANY(col)" cannot use these.
+CREATE INDEX IF NOT EXISTS idx_locations_property_styles
+    ON locations USING GIN (property_styles) WHERE status <> 'archived';
+CREATE INDEX IF NOT EXISTS idx_locations_rooms
+    ON locations USING GIN (rooms) WHERE status <> 'archived';
+CREATE INDEX IF NOT EXISTS idx_locations_interior_features
+    ON locations USING GIN (interior_features) WHERE status <> 'archived';
+CREATE INDEX IF NOT EXISTS idx_locations_exterior_features
+    ON locations USING GIN (exterior_features) WHERE status <> 'archived';
+
+CREATE INDEX IF NOT EXISTS idx_locations_property_type
+    ON locations (property_type, created_at DESC) WHERE status <> 'archived';
+CREATE INDEX IF NOT EXISTS idx_locations_created_at
+    ON locations (created_at DESC) WHERE status <> 'archived';
@@ -0,0 +1,11 @@
+-- 002_search_keyset_indexes.sql
+-- Search pages are keyset-paginated on (created_at, id); include id in the
+-- ordering indexes so "(created_at, id) < (...)" is an index range scan.
+
+DROP INDEX IF EXISTS idx_locations_created_at;
+CREATE INDEX IF NOT EXISTS idx_locations_created_at_id
+    ON locations (created_at DESC, id DESC) WHERE status <> 'archived';
+
+DROP INDEX IF EXISTS idx_locations_property_type;
+CREATE INDEX IF NOT EXISTS idx_locations_property_type_created_id
+    ON locations (property_type, created_at DESC, id DESC) WHERE status <> 'archived';
@@ -0,0 +1,36 @@
+-- 003_email_queue.sql
+-- Persistent outbound email queue. Each email_analytics row is one campaign;
+-- email_outbox holds one row per recipient and is drained by mailer.py.
+
+ALTER TABLE email_analytics ADD COLUMN IF NOT EXISTS body TEXT;
+ALTER TABLE email_analytics ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'sent';
+ALTER TABLE email_analytics ADD COLUMN IF NOT EXISTS send_at TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS email_attachments (
+    id SERIAL PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES email_analytics(id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    content_type TEXT,
+    data BYTEA NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_email_attachments_campaign ON email_attachments (campaign_id);
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES email_analytics(id) ON DELETE CASCADE,
+    recipient TEXT NOT NULL,
+    -- queued / sending / sent / bounced / failed. A "sending" row whose
+    -- next_attempt_at has passed was orphaned by a crashed worker and is retried.
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    sent_at TIMESTAMP,
+    UNIQUE (campaign_id, recipient)
+);
+
+-- The worker only ever looks at due, unfinished rows.
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+    ON email_outbox (next_attempt_at, id) WHERE status IN ('queued', 'sending');
+CREATE INDEX IF NOT EXISTS idx_email_outbox_campaign_status
+    ON email_outbox (campaign_id, status);
@@ -0,0 +1,21 @@
+-- 004_scheduled_jobs.sql
+-- Durable job store for jobs.py, shared by every worker process.
+
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    args JSONB NOT NULL DEFAULT '{}',
+    run_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    status TEXT NOT NULL DEFAULT 'queued',   -- queued / done / failed / cancelled
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    last_error TEXT,
+    created_by TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due
+    ON scheduled_jobs (run_at, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_status
+    ON scheduled_jobs (status, id);
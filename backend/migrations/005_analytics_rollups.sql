@@ -0,0 +1,48 @@
+-- 005_analytics_rollups.sql
+-- Summary tables read by the admin analytics endpoints instead of scanning
+-- locations / auth_users / pending_locations. Kept current by analytics.py.
+
+CREATE TABLE IF NOT EXISTS analytics_totals (
+    metric TEXT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS analytics_daily_counts (
+    day DATE NOT NULL,
+    metric TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, day)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_property_type_counts (
+    property_type TEXT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS analytics_status_counts (
+    source TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (source, status)
+);
+
+-- One-off backfill (the same statements as analytics.rebuild_rollups)
+INSERT INTO analytics_totals (metric, count)
+SELECT 'users', COUNT(*) FROM auth_users
+UNION ALL SELECT 'locations', COUNT(*) FROM locations
+ON CONFLICT (metric) DO UPDATE SET count = EXCLUDED.count;
+
+INSERT INTO analytics_daily_counts (day, metric, count)
+SELECT created_at::date, 'locations', COUNT(*) FROM locations
+WHERE created_at IS NOT NULL GROUP BY 1
+ON CONFLICT (metric, day) DO UPDATE SET count = EXCLUDED.count;
+
+INSERT INTO analytics_property_type_counts (property_type, count)
+SELECT COALESCE(property_type, 'Unknown'), COUNT(*) FROM locations GROUP BY 1
+ON CONFLICT (property_type) DO UPDATE SET count = EXCLUDED.count;
+
+INSERT INTO analytics_status_counts (source, status, count)
+SELECT 'locations', COALESCE(status, 'pending'), COUNT(*) FROM locations GROUP BY 2
+UNION ALL
+SELECT 'pending_locations', COALESCE(status, 'pending'), COUNT(*) FROM pending_locations GROUP BY 2
+ON CONFLICT (source, status) DO UPDATE SET count = EXCLUDED.count;
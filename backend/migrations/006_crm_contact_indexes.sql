@@ -0,0 +1,25 @@
+-- 006_crm_contact_indexes.sql
+-- Trigram indexes so contact search (lower(col) LIKE '%q%') can use an index
+-- on every table the unified contacts query reads.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_user_collection_name_trgm
+    ON user_collection USING GIN (lower("Name") gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_user_collection_email_trgm
+    ON user_collection USING GIN (lower(email) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_pending_locations_fullname_trgm
+    ON pending_locations USING GIN (lower("fullName") gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_pending_locations_email_trgm
+    ON pending_locations USING GIN (lower(email) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_crm_contacts_name_trgm
+    ON crm_contacts USING GIN (lower(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_crm_contacts_email_trgm
+    ON crm_contacts USING GIN (lower(email) gin_trgm_ops);
+
+-- B-tree on lower(email) for the DISTINCT ON dedup and the email sort
+CREATE INDEX IF NOT EXISTS idx_user_collection_email_lower ON user_collection (lower(email));
+CREATE INDEX IF NOT EXISTS idx_pending_locations_email_lower ON pending_locations (lower(email));
+CREATE INDEX IF NOT EXISTS idx_crm_contacts_email_lower ON crm_contacts (lower(email));
@@ -0,0 +1,27 @@
+-- 007_location_coordinates.sql
+-- Coordinates per location for radius ("near me") search, plus the offline
+-- postcode table the default geocoder reads (see geocoding.py). Load it with
+--   python geocoding.py load <postcodes.csv>
+
+ALTER TABLE locations
+    ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+
+-- Keyed on the normalised postcode: upper case, no spaces ("SW1A1AA").
+CREATE TABLE IF NOT EXISTS postcode_coordinates (
+    postcode TEXT PRIMARY KEY,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL
+);
+
+-- Bounding-box index: a radius search becomes a range scan on latitude with
+-- longitude checked from the index, then an exact distance on the few rows left.
+CREATE INDEX IF NOT EXISTS idx_locations_lat_lng
+    ON locations (latitude, longitude) WHERE status <> 'archived';
+
+-- Backfill whatever the postcode table already covers.
+UPDATE locations l
+SET latitude = p.latitude, longitude = p.longitude
+FROM postcode_coordinates p
+WHERE l.latitude IS NULL
+  AND p.postcode = upper(replace(l.postcode, ' ', ''));
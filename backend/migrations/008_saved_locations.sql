@@ -0,0 +1,16 @@
+-- 008_saved_locations.sql
+-- Server-side saved lists (see saved.py). user_id holds the JWT user_id claim,
+-- the same value create_location writes into locations.user_id.
+
+CREATE TABLE IF NOT EXISTS saved_locations (
+    user_id TEXT NOT NULL,
+    location_id INTEGER NOT NULL REFERENCES locations (id) ON DELETE CASCADE,
+    saved_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, location_id)
+);
+
+-- A user's list newest first
+CREATE INDEX IF NOT EXISTS idx_saved_locations_user_saved_at
+    ON saved_locations (user_id, saved_at DESC);
+-- ON DELETE CASCADE from locations
+CREATE INDEX IF NOT EXISTS idx_saved_locations_location ON saved_locations (location_id);
@@ -0,0 +1,7 @@
+-- 009_owner_listings_index.sql
+-- GET /users/<id>/listings pages an owner's rows newest first and counts them
+-- by status in the same query (listings.py). status is carried in the index
+-- so the counts can come from an index-only scan.
+
+CREATE INDEX IF NOT EXISTS idx_locations_user_created_id
+    ON locations (user_id, created_at DESC, id DESC) INCLUDE (status);
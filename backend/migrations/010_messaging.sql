@@ -0,0 +1,34 @@
+-- 010_messaging.sql
+-- Conversations between a location's owner and one enquirer, and their
+-- messages (see messaging.py). User ids are the JWT user_id claim, as in
+-- saved_locations.
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id BIGSERIAL PRIMARY KEY,
+    location_id INTEGER NOT NULL REFERENCES locations (id) ON DELETE CASCADE,
+    owner_id TEXT NOT NULL,
+    enquirer_id TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_message_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (location_id, enquirer_id)
+);
+
+-- Each participant's inbox, most recently active first
+CREATE INDEX IF NOT EXISTS idx_conversations_owner_active
+    ON conversations (owner_id, last_message_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_enquirer_active
+    ON conversations (enquirer_id, last_message_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id BIGSERIAL PRIMARY KEY,
+    conversation_id BIGINT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+    sender_id TEXT NOT NULL,
+    body TEXT NOT NULL DEFAULT '',
+    file_url TEXT,
+    file_name TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- History pages walk this index backwards from a (created_at, id) cursor
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+    ON messages (conversation_id, created_at DESC, id DESC);
@@ -0,0 +1,6 @@
+-- 011_location_updated_at.sql
+-- Set by PATCH /locations/<id> (location_detail.py) and used as the detail
+-- page's Last-Modified. Rows never edited fall back to created_at, so there
+-- is nothing to backfill.
+
+ALTER TABLE locations ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
@@ -0,0 +1,15 @@
+-- 012_location_images.sql
+-- Derivatives and metadata for uploaded location photos (images.py), keyed by
+-- the original URL as stored in locations.image_urls so search cards can swap
+-- each URL for its thumbnail with one index probe.
+
+CREATE TABLE IF NOT EXISTS location_images (
+    original_url TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    thumb_url TEXT,
+    medium_url TEXT,
+    -- tiny inline JPEG (data: URI) shown blurred while the thumbnail loads
+    lqip TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,42 @@
+-- 013_image_hash_index.sql
+-- Duplicate listing detection (duplicates.py).
+--
+-- Multi-index hashing: the 64-bit dHash is split into four 16-bit bands, each
+-- with its own B-tree. Two hashes within 3 bits of each other must agree
+-- exactly on at least one band (pigeonhole), so a lookup is four equality
+-- probes plus a Hamming check on the few rows they return, however many
+-- images there are.
+
+ALTER TABLE location_images ADD COLUMN IF NOT EXISTS dhash BIGINT;
+ALTER TABLE location_images ADD COLUMN IF NOT EXISTS dhash_band0 INTEGER
+    GENERATED ALWAYS AS (((dhash >> 48) & 65535)::integer) STORED;
+ALTER TABLE location_images ADD COLUMN IF NOT EXISTS dhash_band1 INTEGER
+    GENERATED ALWAYS AS (((dhash >> 32) & 65535)::integer) STORED;
+ALTER TABLE location_images ADD COLUMN IF NOT EXISTS dhash_band2 INTEGER
+    GENERATED ALWAYS AS (((dhash >> 16) & 65535)::integer) STORED;
+ALTER TABLE location_images ADD COLUMN IF NOT EXISTS dhash_band3 INTEGER
+    GENERATED ALWAYS AS ((dhash & 65535)::integer) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_location_images_band0 ON location_images (dhash_band0) WHERE dhash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_location_images_band1 ON location_images (dhash_band1) WHERE dhash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_location_images_band2 ON location_images (dhash_band2) WHERE dhash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_location_images_band3 ON location_images (dhash_band3) WHERE dhash IS NOT NULL;
+
+-- Which listings use a given photo URL
+CREATE INDEX IF NOT EXISTS idx_locations_image_urls ON locations USING GIN (image_urls);
+
+-- One row per suspected pair, newer listing first
+CREATE TABLE IF NOT EXISTS location_duplicates (
+    location_id INTEGER NOT NULL REFERENCES locations (id) ON DELETE CASCADE,
+    duplicate_of INTEGER NOT NULL REFERENCES locations (id) ON DELETE CASCADE,
+    matched_images INTEGER NOT NULL,
+    distance INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (location_id, duplicate_of),
+    CHECK (location_id > duplicate_of)
+);
+
+CREATE INDEX IF NOT EXISTS idx_location_duplicates_status_created
+    ON location_duplicates (status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_location_duplicates_duplicate_of ON location_duplicates (duplicate_of);
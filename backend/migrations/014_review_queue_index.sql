@@ -0,0 +1,8 @@
+-- 014_review_queue_index.sql
+-- The admin review queue (review_queue.py) pages pending_locations newest
+-- first within a status, and claims the oldest pending rows. Rows created
+-- before statuses were set have status NULL and count as 'pending', so the
+-- index is on the same COALESCE expression the queries filter on.
+
+CREATE INDEX IF NOT EXISTS idx_pending_locations_status_id
+    ON pending_locations ((COALESCE(status, 'pending')), id);
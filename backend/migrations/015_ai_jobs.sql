@@ -0,0 +1,21 @@
+-- 015_ai_jobs.sql
+-- Analysis jobs for ai_jobs.py. Job state lives here rather than in the
+-- accepting process, so GET /ai/analyze/<job_id> can be answered by any
+-- worker. The images themselves stay in memory on the worker running the job.
+
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',   -- queued / running / done / failed
+    ai_data JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- At most one unfinished job per image set; duplicate submits join it
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_jobs_inflight_hash
+    ON ai_jobs (content_hash) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_ai_jobs_created ON ai_jobs (created_at);
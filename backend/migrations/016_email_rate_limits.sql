@@ -0,0 +1,9 @@
+-- 016_email_rate_limits.sql
+-- Shared send schedule per SMTP host for mailer.py. Every email worker, in any
+-- process, reserves its batch's sending window here, so EMAIL_RATE_PER_SEC is
+-- the rate the provider sees however many workers are running.
+
+CREATE TABLE IF NOT EXISTS email_rate_limits (
+    host TEXT PRIMARY KEY,
+    next_send_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
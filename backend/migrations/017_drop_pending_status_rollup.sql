@@ -0,0 +1,7 @@
+-- 017_drop_pending_status_rollup.sql
+-- pending_locations rows are created outside the app, so the status rollup
+-- 005 kept for them was never incremented and drifted with every claim or
+-- decision. Its counts are now read from pending_locations directly
+-- (analytics.pending_statuses); drop the stale rows.
+
+DELETE FROM analytics_status_counts WHERE source = 'pending_locations';
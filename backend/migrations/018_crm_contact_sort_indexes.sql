@@ -0,0 +1,11 @@
+-- 018_crm_contact_sort_indexes.sql
+-- Sort-order indexes for the contact search arms in crm.py, so each source's
+-- next page past the cursor is a range scan rather than a sort of every row.
+-- (lower(email) alone, from 006, serves the email sort and the dedup probes.)
+
+CREATE INDEX IF NOT EXISTS idx_user_collection_contact_name
+    ON user_collection ((lower(COALESCE("Name", ''))), (lower(email))) WHERE email IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_crm_contacts_contact_name
+    ON crm_contacts ((lower(COALESCE(name, ''))), (lower(email))) WHERE email IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_pending_locations_contact_name
+    ON pending_locations ((lower(COALESCE("fullName", ''))), (lower(email))) WHERE email IS NOT NULL;
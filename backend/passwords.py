@@ -0,0 +1,123 @@
+# passwords.py
+# bcrypt hashing on a small dedicated pool, so a burst of logins can't eat the
+# CPU that every other request in the worker needs.
+#
+# At most PASSWORD_HASH_WORKERS hashes run at once and at most
+# PASSWORD_HASH_QUEUE calls may wait for a slot; past that, hash()/verify()
+# raise HashQueueFull immediately (app.py turns it into a 429). A call that
+# waits longer than PASSWORD_HASH_TIMEOUT raises HashTimeout (a 503); its slot
+# is only freed when the hash itself finishes, so the bound holds. The pool uses
+# threads by default - bcrypt releases the GIL while hashing - or separate
+# processes with PASSWORD_HASH_MODE=process.
+#
+# BCRYPT_ROUNDS sets the cost factor for new hashes. needs_rehash() spots
+# stored hashes made with a different cost so login can upgrade them.
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import bcrypt
+
+
+class HashQueueFull(Exception):
+    pass
+
+
+class HashTimeout(HashQueueFull):
+    pass
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_cost(hashed):
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, max_queue=16, use_processes=False, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.mode = "process" if use_processes else "thread"
+        pool_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._executor = pool_class(max_workers=workers)
+        # Slots = running + waiting; acquiring one never blocks.
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            rounds=int(os.environ.get("BCRYPT_ROUNDS", 12)),
+            workers=int(os.environ.get("PASSWORD_HASH_WORKERS", 2)),
+            max_queue=int(os.environ.get("PASSWORD_HASH_QUEUE", 16)),
+            use_processes=os.environ.get("PASSWORD_HASH_MODE", "thread") == "process",
+            timeout=float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10)),
+        )
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashQueueFull("Too many authentication requests, please retry shortly.")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        # The slot belongs to the hash, not the caller: a caller that gives up
+        # leaves the hash running, and it keeps its slot until it finishes
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashTimeout("Authentication is taking too long, please retry shortly.")
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hashpw, password, self.rounds)
+
+    def verify(self, password, hashed):
+        return self._run(_checkpw, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) != self.rounds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "algorithm": "bcrypt",
+                "rounds": self.rounds,
+                "mode": self.mode,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed_total": self.completed,
+                "rejected_total": self.rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,131 @@
+# review_queue.py
+# The admin review queue over pending_locations.
+#
+# Listing is keyset paginated on id over the (status, id) index from
+# migrations/014_review_queue_index.sql, so a page costs the same however long
+# the queue gets. Admins take work with claim(): the next N pending rows are
+# locked with FOR UPDATE SKIP LOCKED, so concurrent claims never wait on each
+# other and never hand out the same row twice. decide() approves or rejects a
+# batch of ids in one UPDATE.
+#
+# The per-status counts shown with each page are a live GROUP BY
+# (analytics.pending_statuses) rather than a rollup: pending rows are created
+# outside the app, so no write hook could keep a rollup right, and the
+# (status, id) index answers the count without touching the table. Functions
+# take the cursor of the caller's transaction.
+
+import base64
+import json
+
+STATUSES = ("pending", "in-progress", "approved", "rejected")
+DECISIONS = {"approve": "approved", "reject": "rejected"}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_CLAIM = 50
+MAX_BATCH = 500
+
+QUEUE_COLUMNS = """
+    id, "propertyType" AS title, COALESCE(status, 'pending') AS status, "adminUser"
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([row["id"]]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(key, list) or len(key) != 1 or not isinstance(key[0], int):
+        raise InvalidCursor("Invalid cursor")
+    return key[0]
+
+
+def build_queue_query(status=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    # Newest first. The status filter is written as the indexed expression so
+    # the page is one range scan of the index.
+    where, params = [], {"limit": limit}
+    if status:
+        where.append("COALESCE(status, 'pending') = %(status)s")
+        params["status"] = status
+    if cursor:
+        where.append("id < %(last_id)s")
+        params["last_id"] = decode_cursor(cursor)
+    sql = f"""
+        SELECT {QUEUE_COLUMNS}
+        FROM pending_locations
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY id DESC
+        LIMIT %(limit)s
+    """
+    return sql, params
+
+
+def to_item(row):
+    return {
+        "id": row["id"],
+        "title": row["title"] or "No Type",
+        "status": row["status"],
+        "adminUser": row["adminUser"],
+    }
+
+
+def paginate(rows, counts, limit):
+    # rows holds up to limit + 1; the extra one only signals another page
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "locations": [to_item(row) for row in rows],
+        "counts": {status: counts.get(status, 0) for status in STATUSES},
+        "nextCursor": encode_cursor(rows[-1]) if has_more and rows else None,
+    }
+
+
+# --- writes ---
+
+def claim(cur, admin_email, count):
+    # Assigns up to count of the oldest pending rows to admin_email. Rows
+    # another admin is claiming right now are skipped, not waited for.
+    cur.execute("""
+        UPDATE pending_locations p
+        SET status = 'in-progress', "adminUser" = %s
+        FROM (
+            SELECT id, status FROM pending_locations
+            WHERE COALESCE(status, 'pending') = 'pending'
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ) old
+        WHERE p.id = old.id
+        RETURNING p.id, p."propertyType" AS title, p.status, p."adminUser"
+    """, (admin_email, count))
+    return sorted(cur.fetchall(), key=lambda row: row["id"])
+
+
+def decide(cur, ids, decision, admin_email):
+    # Sets every row in ids to the decision's status in one statement. Rows
+    # already in that status, or claimed by a different admin, are left alone.
+    # Locks are taken in id order so overlapping batches can't deadlock.
+    cur.execute("""
+        UPDATE pending_locations p
+        SET status = %(status)s, "adminUser" = COALESCE(p."adminUser", %(admin)s)
+        FROM (
+            SELECT id, status FROM pending_locations
+            WHERE id = ANY(%(ids)s)
+            ORDER BY id
+            FOR UPDATE
+        ) old
+        WHERE p.id = old.id
+          AND COALESCE(old.status, 'pending') <> %(status)s
+          AND (COALESCE(old.status, 'pending') <> 'in-progress'
+               OR COALESCE(p."adminUser", %(admin)s) = %(admin)s)
+        RETURNING p.id
+    """, {"status": DECISIONS[decision], "admin": admin_email, "ids": list(ids)})
+    return cur.fetchall()
@@ -0,0 +1,70 @@
+# saved.py
+# Saved locations per user (table from migrations/008_saved_locations.sql).
+#
+# The client keeps ids only. It pushes whatever it saved while offline with
+# merge() - one INSERT ... SELECT unnest() for the whole list - and fetches
+# fresh cards for the ids with GET /locations/batch. Every function takes the
+# cursor of the caller's transaction (run_in_transaction in app.py).
+
+MAX_SAVED = 1000
+
+
+def list_ids(cur, user_id):
+    cur.execute("""
+        SELECT location_id FROM saved_locations
+        WHERE user_id = %s ORDER BY saved_at DESC, location_id DESC
+        LIMIT %s
+    """, (str(user_id), MAX_SAVED))
+    return [row['location_id'] for row in cur.fetchall()]
+
+
+def add(cur, user_id, location_id):
+    # Returns False when the location doesn't exist (or is archived).
+    cur.execute("""
+        INSERT INTO saved_locations (user_id, location_id)
+        SELECT %s, id FROM locations WHERE id = %s AND status <> 'archived'
+        ON CONFLICT (user_id, location_id) DO NOTHING
+    """, (str(user_id), location_id))
+    if cur.rowcount:
+        return True
+    cur.execute("SELECT 1 FROM saved_locations WHERE user_id = %s AND location_id = %s",
+                (str(user_id), location_id))
+    return cur.fetchone() is not None
+
+
+def remove(cur, user_id, location_id):
+    cur.execute("DELETE FROM saved_locations WHERE user_id = %s AND location_id = %s",
+                (str(user_id), location_id))
+    return cur.rowcount > 0
+
+
+def merge(cur, user_id, location_ids):
+    # Union of the client's list and the stored one. Ids that no longer exist
+    # are skipped; array order becomes saved_at order so the client's newest
+    # stays first.
+    cur.execute("""
+        INSERT INTO saved_locations (user_id, location_id, saved_at)
+        SELECT %s, l.id, NOW() - (ids.ord * interval '1 millisecond')
+        FROM unnest(%s::int[]) WITH ORDINALITY AS ids (id, ord)
+        JOIN locations l ON l.id = ids.id AND l.status <> 'archived'
+        ON CONFLICT (user_id, location_id) DO NOTHING
+    """, (str(user_id), list(location_ids)))
+    return list_ids(cur, user_id)
+
+
+def parse_ids(values, limit=MAX_SAVED):
+    # "1,2,3" / ["1", 2] -> [1, 2, 3], de-duplicated, order kept
+    if isinstance(values, str):
+        values = values.split(",")
+    ids, seen = [], set()
+    for value in values or []:
+        try:
+            location_id = int(str(value).strip())
+        except ValueError:
+            raise ValueError(f"Invalid location id: {value!r}")
+        if location_id not in seen:
+            seen.add(location_id)
+            ids.append(location_id)
+    if len(ids) > limit:
+        raise ValueError(f"At most {limit} ids per request")
+    return ids
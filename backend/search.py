@@ -0,0 +1,351 @@
+# search.py
+# SQL builder for /locations/search, shaped to use the indexes created in
+# migrations/001_search_indexes.sql:
+#   - array filters use "col @> ARRAY[x]" (GIN) instead of "x = ANY(col)"
+#   - postcode / city substring matches use the pg_trgm GIN indexes
+#   - free text "q" matches the search_vector tsvector and is ranked with ts_rank
+#   - lat / lng / radius_km narrow to a bounding box on the (latitude, longitude)
+#     B-tree (migrations/007_location_coordinates.sql), then filter and sort on
+#     the exact great-circle distance
+#   - pages are keyset-paginated on (created_at, id) - (rank, created_at, id)
+#     when "q" is given, (distance, id) for radius search - so deep pages cost
+#     the same as the first one
+#   - facet counts (?facets=true) come from one GROUP BY query over the same
+#     filtered set, not one query per option
+#
+# Run "python search.py" against a database to EXPLAIN every supported filter
+# combination and confirm none of them falls back to a sequential scan.
+
+import base64
+import datetime
+import itertools
+import json
+import math
+import os
+import sys
+
+# request arg -> (SQL condition, how to turn the raw value into the parameter)
+SEARCH_FILTERS = {
+    "propertyType": ("property_type = %s", lambda v: v),
+    "age": ("property_styles @> ARRAY[%s]::text[]", lambda v: v),
+    "rooms": ("rooms @> ARRAY[%s]::text[]", lambda v: v),
+    "postcode": ("postcode ILIKE %s", lambda v: f"%{v}%"),
+    "city": ("city ILIKE %s", lambda v: f"%{v}%"),
+}
+
+TSQUERY = "websearch_to_tsquery('english', %s)"
+RANK = f"ts_rank(search_vector, {TSQUERY})"
+
+# Haversine distance in km from (%s lat, %s lat, %s lng) to the row.
+EARTH_RADIUS_KM = 6371.0
+DISTANCE = (
+    f"({2 * EARTH_RADIUS_KM} * asin(sqrt(least(1.0, "
+    "power(sin(radians(latitude - %s) / 2), 2) + "
+    "cos(radians(%s)) * cos(radians(latitude)) * power(sin(radians(longitude - %s) / 2), 2)))))"
+)
+KM_PER_DEGREE_LAT = 111.045
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 200.0
+
+# Compact projection for result cards. Long text and the full image list are
+# only sent by GET /locations/<id>.
+# Card images are the first three photos, each swapped for its derivatives in
+# location_images (migrations/012_location_images.sql) by primary-key lookup.
+CARD_IMAGES = """
+    (SELECT json_agg(json_build_object(
+                'url', u.url, 'thumb', li.thumb_url, 'medium', li.medium_url,
+                'width', li.width, 'height', li.height, 'lqip', li.lqip) ORDER BY u.ord)
+     FROM unnest(image_urls[1:3]) WITH ORDINALITY AS u (url, ord)
+     LEFT JOIN location_images li ON li.original_url = u.url) AS images
+"""
+CARD_COLUMNS = (
+    "id, property_type, city, postcode, created_at, latitude, longitude, "
+    "property_styles[1] AS age, rooms[1:3] AS rooms, " + CARD_IMAGES
+)
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def sort_mode(filters):
+    # "distance" for radius search, "rank" for free text, otherwise newest first
+    if "lat" in filters:
+        return "distance"
+    if filters.get("q"):
+        return "rank"
+    return "recent"
+
+
+# Cursor key after the leading mode tag. The tag keeps a cursor from one sort
+# mode out of another: recent and distance keys are both two values long.
+CURSOR_TYPES = {
+    "recent": ("timestamp", "id"),
+    "rank": ("number", "timestamp", "id"),
+    "distance": ("number", "id"),
+}
+
+
+def encode_cursor(row, mode="recent"):
+    if mode == "distance":
+        key = [row["distance_km"], row["id"]]
+    else:
+        key = [row["created_at"].isoformat(), row["id"]]
+        if mode == "rank":
+            key.insert(0, row["rank"])
+    return base64.urlsafe_b64encode(json.dumps([mode] + key).encode()).decode().rstrip("=")
+
+
+def _cursor_value_ok(kind, value):
+    if kind == "id":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    try:
+        datetime.datetime.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def decode_cursor(cursor, mode="recent"):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    types = CURSOR_TYPES[mode]
+    if (not isinstance(key, list) or len(key) != len(types) + 1 or key[0] != mode
+            or not all(_cursor_value_ok(kind, value) for kind, value in zip(types, key[1:]))):
+        raise InvalidCursor("Cursor does not match this query")
+    return key[1:]
+
+
+def page_size(value):
+    try:
+        size = int(value) if value else DEFAULT_PAGE_SIZE
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _coordinate(args, key, low, high):
+    try:
+        value = float(args.get(key))
+    except (TypeError, ValueError):
+        raise InvalidFilter(f"{key} must be a number")
+    if not low <= value <= high:
+        raise InvalidFilter(f"{key} must be between {low} and {high}")
+    return value
+
+
+def normalise_filters(args):
+    # Strip blanks so "?rooms=" behaves like no filter at all.
+    filters = {}
+    for key in list(SEARCH_FILTERS) + ["q"]:
+        value = (args.get(key) or "").strip()
+        if value:
+            filters[key] = value
+
+    if (args.get("lat") or "").strip() or (args.get("lng") or "").strip():
+        filters["lat"] = _coordinate(args, "lat", -90, 90)
+        filters["lng"] = _coordinate(args, "lng", -180, 180)
+        filters["radius_km"] = (
+            _coordinate(args, "radius_km", 0.1, MAX_RADIUS_KM)
+            if (args.get("radius_km") or "").strip() else DEFAULT_RADIUS_KM
+        )
+    return filters
+
+
+def bounding_box(lat, lng, radius_km):
+    # Degrees of longitude shrink towards the poles; clamp so the box stays finite.
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def filter_conditions(filters):
+    # WHERE clauses (and their params) for the filters alone, shared by the
+    # result query and the facet query so both see exactly the same set.
+    where = ["status != 'archived'"]
+    params = []
+
+    for key, (condition, to_param) in SEARCH_FILTERS.items():
+        if key in filters:
+            where.append(condition)
+            params.append(to_param(filters[key]))
+
+    if filters.get("q"):
+        where.append(f"search_vector @@ {TSQUERY}")
+        params.append(filters["q"])
+
+    if "lat" in filters:
+        origin = (filters["lat"], filters["lat"], filters["lng"])
+        where.append("latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s")
+        params.extend(bounding_box(filters["lat"], filters["lng"], filters["radius_km"]))
+        where.append(f"{DISTANCE} <= %s")
+        params.extend(origin + (filters["radius_km"],))
+    return where, params
+
+
+def build_search_query(filters, columns=CARD_COLUMNS, cursor=None, limit=None):
+    # Params are collected per clause and joined in SQL text order.
+    select_params = []
+    where, where_params = filter_conditions(filters)
+
+    mode = sort_mode(filters)
+    select = columns
+    if mode == "distance":
+        origin = (filters["lat"], filters["lat"], filters["lng"])
+        select = f"{columns}, {DISTANCE} AS distance_km"
+        select_params.extend(origin)
+        order_by = "distance_km, id"
+    elif mode == "rank":
+        select = f"{columns}, {RANK} AS rank"
+        select_params.append(filters["q"])
+        order_by = "rank DESC, created_at DESC, id DESC"
+    else:
+        order_by = "created_at DESC, id DESC"
+
+    if cursor:
+        key = decode_cursor(cursor, mode)
+        if mode == "distance":
+            where.append(f"({DISTANCE}, id) > (%s, %s)")
+            where_params.extend(origin)
+        elif mode == "rank":
+            where.append(f"({RANK}, created_at, id) < (%s, %s, %s)")
+            where_params.append(filters["q"])
+        else:
+            where.append("(created_at, id) < (%s, %s)")
+        where_params.extend(key)
+
+    sql = f"SELECT {select} FROM locations WHERE {' AND '.join(where)} ORDER BY {order_by}"
+    params = select_params + where_params
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def paginate(rows, limit, mode="recent"):
+    # Queries fetch limit + 1 rows; the extra row only signals there is a next page.
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1], mode) if has_more and rows else None
+    return rows, next_cursor
+
+
+# --- cards by id ---
+
+def build_batch_query(ids, columns=CARD_COLUMNS):
+    # One query for any number of ids (saved lists); the caller restores the
+    # requested order, which "= ANY" does not keep.
+    sql = f"SELECT {columns} FROM locations WHERE id = ANY(%s) AND status != 'archived'"
+    return sql, [list(ids)]
+
+
+# --- facets ---
+
+# response key -> SQL producing one value per row of the filtered set
+FACETS = {
+    "propertyType": "property_type",
+    "age": "unnest(property_styles)",
+    "rooms": "unnest(rooms)",
+    "interiorFeatures": "unnest(interior_features)",
+    "exteriorFeatures": "unnest(exterior_features)",
+}
+
+
+def build_facet_query(filters):
+    # One statement: the filtered set is scanned once (a CTE referenced several
+    # times is materialised) and every facet is a GROUP BY over it.
+    where, params = filter_conditions(filters)
+    columns = "property_type, property_styles, rooms, interior_features, exterior_features"
+    parts = [
+        f"SELECT '{name}' AS facet, value, COUNT(*) AS count "
+        f"FROM (SELECT {expr} AS value FROM filtered) v WHERE value IS NOT NULL GROUP BY value"
+        for name, expr in FACETS.items()
+    ]
+    sql = (
+        f"WITH filtered AS (SELECT {columns} FROM locations WHERE {' AND '.join(where)}) "
+        + " UNION ALL ".join(parts)
+        + " ORDER BY facet, count DESC, value"
+    )
+    return sql, params
+
+
+def group_facets(rows):
+    # [{facet, value, count}, ...] -> {"rooms": [{"value": "Kitchen", "count": 12}, ...], ...}
+    facets = {name: [] for name in FACETS}
+    for row in rows:
+        facets[row["facet"]].append({"value": row["value"], "count": row["count"]})
+    return facets
+
+
+# --- EXPLAIN check ---
+
+SAMPLE_ROW = {"created_at": datetime.datetime(2024, 1, 1), "id": 1, "rank": 0.5, "distance_km": 1.5}
+
+SAMPLE_VALUES = {
+    "propertyType": {"propertyType": "House"},
+    "age": {"age": "Victorian"},
+    "rooms": {"rooms": "Kitchen"},
+    "postcode": {"postcode": "SW1A"},
+    "city": {"city": "London"},
+    "q": {"q": "garden kitchen"},
+    "near": {"lat": 51.5014, "lng": -0.1419, "radius_km": 5.0},
+}
+
+
+def filter_combinations():
+    keys = list(SAMPLE_VALUES)
+    for n in range(1, len(keys) + 1):
+        for combo in itertools.combinations(keys, n):
+            filters = {}
+            for k in combo:
+                filters.update(SAMPLE_VALUES[k])
+            yield filters
+
+
+def explain_search_plans(conn):
+    # With seqscan disabled the planner only picks a Seq Scan when no index can
+    # serve the query, so any Seq Scan in the plan means a missing index.
+    failures = []
+    with conn.cursor() as cur:
+        cur.execute("SET enable_seqscan = off")
+        for filters in [{}] + list(filter_combinations()):
+            cursor = encode_cursor(SAMPLE_ROW, sort_mode(filters))
+            for page_cursor in (None, cursor):
+                sql, params = build_search_query(filters, cursor=page_cursor, limit=DEFAULT_PAGE_SIZE + 1)
+                cur.execute("EXPLAIN " + sql, params)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+                if "Seq Scan" in plan:
+                    failures.append((filters, plan))
+        cur.execute("RESET enable_seqscan")
+    conn.rollback()
+    return failures
+
+
+if __name__ == "__main__":
+    import psycopg2
+
+    dsn = os.environ.get("DATABASE_URL")
+    if not dsn:
+        sys.exit("DATABASE_URL environment variable not set.")
+    conn = psycopg2.connect(dsn)
+    try:
+        failures = explain_search_plans(conn)
+    finally:
+        conn.close()
+    for filters, plan in failures:
+        print(f"SEQ SCAN for filters {sorted(filters)}:\n{plan}\n")
+    if failures:
+        sys.exit(1)
+    print("All search filter combinations use an index.")
@@ -0,0 +1,105 @@
+# storage.py
+# Where uploaded media ends up. Chosen with STORAGE_BACKEND:
+#   local       - files under static/uploads, served by /static/uploads/<name>
+#   s3          - S3_BUCKET (boto3 does multipart uploads for large files)
+#   cloudinary  - the original behaviour (default)
+#
+# Every backend takes a file that is already on local disk and returns the
+# public URL, so the upload pipeline never holds a whole file in memory.
+# url_prefix is what every URL a backend hands out starts with; it is how
+# other code tells our own uploads from arbitrary links.
+
+import os
+import shutil
+
+from metrics import external_call
+
+CLOUDINARY_LARGE_FILE = 20 * 1024 * 1024
+
+
+class LocalDiskStorage:
+    name = "local"
+
+    def __init__(self, root, base_url=""):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.url_prefix = f"{self.base_url}/static/uploads/"
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, path, key, content_type=None):
+        shutil.move(path, os.path.join(self.root, key))
+        return f"{self.base_url}/static/uploads/{key}"
+
+    def delete(self, key):
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    name = "s3"
+
+    def __init__(self, bucket, region=None, prefix="plink_locations/", public_url=None):
+        import boto3
+        self.client = boto3.client("s3", region_name=region)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = (public_url or
+                           f"https://{bucket}.s3.{region or 'us-east-1'}.amazonaws.com").rstrip("/")
+        self.url_prefix = f"{self.public_url}/{prefix}"
+
+    def save(self, path, key, content_type=None):
+        extra = {"ContentType": content_type} if content_type else None
+        with external_call("s3"):
+            self.client.upload_file(path, self.bucket, self.prefix + key, ExtraArgs=extra)
+        os.remove(path)
+        return f"{self.public_url}/{self.prefix}{key}"
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+class CloudinaryStorage:
+    name = "cloudinary"
+    url_prefix = "https://res.cloudinary.com/"
+
+    def __init__(self, folder="plink_locations"):
+        self.folder = folder
+
+    def save(self, path, key, content_type=None):
+        import cloudinary.uploader
+        public_id = os.path.splitext(key)[0]
+        with external_call("cloudinary"):
+            if os.path.getsize(path) > CLOUDINARY_LARGE_FILE:
+                # Chunked upload for big videos
+                result = cloudinary.uploader.upload_large(
+                    path, folder=self.folder, public_id=public_id,
+                    resource_type="auto", chunk_size=CLOUDINARY_LARGE_FILE
+                )
+            else:
+                result = cloudinary.uploader.upload(
+                    path, folder=self.folder, public_id=public_id, resource_type="auto"
+                )
+        os.remove(path)
+        return result.get("secure_url")
+
+    def delete(self, key):
+        import cloudinary.uploader
+        cloudinary.uploader.destroy(f"{self.folder}/{os.path.splitext(key)[0]}")
+
+
+def storage_from_env(upload_folder):
+    backend = os.environ.get("STORAGE_BACKEND", "cloudinary")
+    if backend == "local":
+        return LocalDiskStorage(upload_folder, base_url=os.environ.get("PUBLIC_BASE_URL", ""))
+    if backend == "s3":
+        return S3Storage(
+            os.environ["S3_BUCKET"],
+            region=os.environ.get("AWS_REGION"),
+            prefix=os.environ.get("S3_PREFIX", "plink_locations/"),
+            public_url=os.environ.get("S3_PUBLIC_URL")
+        )
+    if backend == "cloudinary":
+        return CloudinaryStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
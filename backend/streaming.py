@@ -0,0 +1,89 @@
+# streaming.py
+# Streamed JSON responses for admin lists that grow with the tables behind them.
+#
+# ServerCursorStream runs a query on a named (server-side) cursor, so Postgres
+# hands rows over itersize at a time instead of the whole result at once.
+# iter_json_object() turns those rows into the same {"key": [...]} body that
+# jsonify would build, but yields it in chunks and applies the per-row
+# transform (key renames, date formatting) as each row goes past. Worker memory
+# stays at roughly one chunk however many rows there are.
+
+import datetime
+import decimal
+import itertools
+import json
+import threading
+
+DEFAULT_ITERSIZE = 500
+ROWS_PER_CHUNK = 200
+
+_cursor_ids = itertools.count(1)
+
+
+def json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+
+def rename_keys(row, mapping):
+    # {"sent_date": "sentDate"} -> same row with camelCase keys, in place
+    for old, new in mapping.items():
+        if old in row:
+            row[new] = row.pop(old)
+    return row
+
+
+class ServerCursorStream:
+    # Owns one pooled connection from construction until close(). Query errors
+    # are raised here, before any response bytes go out; close() is idempotent
+    # so it can be called both when iteration ends and when the response closes.
+    def __init__(self, conn, release, sql, params=None, itersize=DEFAULT_ITERSIZE, cursor_factory=None):
+        self._conn = conn
+        self._release = release
+        self._lock = threading.Lock()
+        try:
+            self._cur = conn.cursor(name=f"stream_{next(_cursor_ids)}", cursor_factory=cursor_factory)
+            self._cur.itersize = itersize
+            self._cur.execute(sql, params)
+        except Exception:
+            self.close()
+            raise
+
+    def __iter__(self):
+        try:
+            for row in self._cur:
+                yield row
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        broken = False
+        try:
+            # Read-only, but the named cursor lives in a transaction; end it.
+            conn.rollback()
+        except Exception:
+            broken = True
+        self._release(conn, close=broken)
+
+
+def iter_json_object(key, rows, transform=None, rows_per_chunk=ROWS_PER_CHUNK):
+    yield "{" + json.dumps(key) + ": ["
+    parts = []
+    first = True
+    for row in rows:
+        if transform:
+            row = transform(row)
+        parts.append(("" if first else ",") + json.dumps(row, default=json_default))
+        first = False
+        if len(parts) >= rows_per_chunk:
+            yield "".join(parts)
+            parts = []
+    parts.append("]}")
+    yield "".join(parts)
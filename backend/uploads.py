@@ -0,0 +1,314 @@
+# uploads.py
+# Media upload pipeline behind /upload.
+#
+# The request thread only streams the incoming bytes to a temp file (enforcing
+# the size limit as it goes) and returns an upload id. Pushing the file to the
+# storage backend happens on a background executor; clients poll
+# GET /upload/<id> for the final URL.
+#
+# Large files (videos) can be sent in chunks: start a session, PUT each chunk
+# at its byte offset, then complete. Session state lives next to the data in
+# UPLOAD_TMP_DIR, so an interrupted upload can resume from "received" - even
+# on a different worker process on the same host. Chunk appends and completion
+# hold an exclusive flock on the session's .lock file, which serialises them
+# across threads and processes alike.
+#
+# Images get a second background step once the original is stored: the
+# ImageProcessor (images.py) writes thumbnail / medium derivatives and an LQIP
+# placeholder, and on_image(url, meta) records them. The upload is reported
+# "done" before that step, so derivatives never delay the client.
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from werkzeug.formparser import FormDataParser
+from werkzeug.utils import secure_filename
+
+from images import is_image
+
+log = logging.getLogger("plink")
+
+COPY_BUFFER = 1024 * 1024
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class OffsetMismatch(UploadError):
+    status_code = 409
+
+    def __init__(self, received):
+        super().__init__(f"Expected chunk at offset {received}")
+        self.received = received
+
+
+class UploadManager:
+    def __init__(self, storage, tmp_dir, max_bytes, max_workers=4, session_ttl=24 * 3600,
+                 image_processor=None, on_image=None):
+        self.storage = storage
+        self.image_processor = image_processor
+        self.on_image = on_image
+        self.tmp_dir = tmp_dir
+        self.max_bytes = max_bytes
+        self.session_ttl = session_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+    # --- record bookkeeping (one small JSON file per upload) ---
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.tmp_dir, f"{upload_id}.part")
+
+    def _record_path(self, upload_id):
+        return os.path.join(self.tmp_dir, f"{upload_id}.json")
+
+    def _lock_path(self, upload_id):
+        return os.path.join(self.tmp_dir, f"{upload_id}.lock")
+
+    @contextmanager
+    def _session_lock(self, upload_id):
+        # Records are replaced atomically (new inode), so the lock lives in a
+        # separate file that is never replaced
+        if not upload_id.isalnum() or not os.path.exists(self._record_path(upload_id)):
+            raise UploadNotFound("Upload not found")
+        with open(self._lock_path(upload_id), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_record(self, record):
+        path = self._record_path(record["id"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(record, f)
+        os.replace(path + ".tmp", path)
+
+    def _read_record(self, upload_id):
+        # ids are uuid hex; anything else could escape tmp_dir
+        if not upload_id.isalnum():
+            raise UploadNotFound("Upload not found")
+        try:
+            with open(self._record_path(upload_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFound("Upload not found")
+
+    def _new_record(self, user_id, filename, content_type, size=None, chunked=False):
+        upload_id = uuid.uuid4().hex
+        record = {
+            "id": upload_id,
+            "user_id": user_id,
+            "filename": secure_filename(filename or "") or "upload",
+            "content_type": content_type,
+            "size": size,
+            "received": 0,
+            "chunked": chunked,
+            "status": "receiving",
+            "url": None,
+            "error": None,
+            "created": time.time(),
+        }
+        return record
+
+    def get(self, upload_id, user_id=None):
+        record = self._read_record(upload_id)
+        if user_id is not None and record["user_id"] != user_id:
+            raise UploadNotFound("Upload not found")
+        return record
+
+    def prune(self):
+        # Drop abandoned sessions and old finished records.
+        cutoff = time.time() - self.session_ttl
+        for name in os.listdir(self.tmp_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    upload_id = name[:-5]
+                    os.remove(path)
+                    for leftover in (self._data_path(upload_id), self._lock_path(upload_id)):
+                        if os.path.exists(leftover):
+                            os.remove(leftover)
+            except OSError:
+                pass
+
+    # --- streaming ---
+
+    def _copy_stream(self, stream, path, already=0, limit=None):
+        written = 0
+        limit = self.max_bytes if limit is None else limit
+        with open(path, "ab") as out:
+            while True:
+                buf = stream.read(COPY_BUFFER)
+                if not buf:
+                    break
+                written += len(buf)
+                if already + written > limit:
+                    raise UploadTooLarge(f"File exceeds the {limit // (1024 * 1024)} MB limit")
+                out.write(buf)
+        return written
+
+    def receive_multipart(self, stream, mimetype, content_length, options, user_id, field="file"):
+        # Single-request upload (multipart/form-data). The form parser writes
+        # the file part straight into the .part file, so the body only touches
+        # disk once; then the file is pushed in the background.
+        if content_length is not None and content_length > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the {self.max_bytes // (1024 * 1024)} MB limit")
+        record = self._new_record(user_id, None, None)
+        path = self._data_path(record["id"])
+        opened = []
+
+        def stream_factory(total_content_length, content_type, filename, content_length=None):
+            if opened:
+                raise UploadError("Send one file per request")
+            opened.append(open(path, "wb"))
+            return opened[0]
+
+        parser = FormDataParser(stream_factory, silent=False)
+        try:
+            try:
+                _, _, files = parser.parse(stream, mimetype, content_length, options)
+            except ValueError:
+                raise UploadError("Malformed multipart body")
+            finally:
+                for f in opened:
+                    f.close()
+            file = files.get(field)
+            if file is None or not file.filename:
+                raise UploadError("No selected file" if file is not None else "No file part")
+            record["filename"] = secure_filename(file.filename) or "upload"
+            record["content_type"] = file.mimetype
+            record["received"] = record["size"] = os.path.getsize(path)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return self._enqueue(record)
+
+    def start_chunked(self, user_id, filename, content_type, size):
+        if size is not None and size > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the {self.max_bytes // (1024 * 1024)} MB limit")
+        self.prune()
+        record = self._new_record(user_id, filename, content_type, size=size, chunked=True)
+        open(self._data_path(record["id"]), "wb").close()
+        self._write_record(record)
+        return record
+
+    def append_chunk(self, upload_id, user_id, offset, stream):
+        with self._session_lock(upload_id):
+            record = self.get(upload_id, user_id)
+            if record["status"] != "receiving":
+                raise UploadError("Upload is already complete")
+
+            path = self._data_path(upload_id)
+            received = os.path.getsize(path)
+            if offset != received:
+                raise OffsetMismatch(received)
+
+            limit = min(self.max_bytes, record["size"]) if record["size"] else self.max_bytes
+            try:
+                self._copy_stream(stream, path, already=received, limit=limit)
+            except UploadTooLarge:
+                # Throw away the partial chunk so the client can retry it.
+                with open(path, "ab") as f:
+                    f.truncate(received)
+                raise
+            record["received"] = os.path.getsize(path)
+            self._write_record(record)
+            return record
+
+    def complete_chunked(self, upload_id, user_id):
+        with self._session_lock(upload_id):
+            record = self.get(upload_id, user_id)
+            if record["status"] != "receiving":
+                return record
+            received = os.path.getsize(self._data_path(upload_id))
+            if record["size"] is not None and received != record["size"]:
+                raise OffsetMismatch(received)
+            record["received"] = received
+            record["size"] = received
+            return self._enqueue(record)
+
+    # --- background push ---
+
+    def _enqueue(self, record):
+        record["status"] = "pending"
+        self._write_record(record)
+        self._executor.submit(self._push, record["id"])
+        return record
+
+    def _push(self, upload_id):
+        record = self._read_record(upload_id)
+        record["status"] = "uploading"
+        self._write_record(record)
+        path = self._data_path(upload_id)
+        source = None
+        try:
+            if self.image_processor and is_image(record["content_type"]):
+                # Backends move or delete the file they store; keep a copy to derive from
+                source = path + ".src"
+                shutil.copyfile(path, source)
+            key = f"{upload_id}_{record['filename']}"
+            record["url"] = self.storage.save(path, key, record["content_type"])
+            record["status"] = "done"
+        except Exception:
+            log.exception(f"Upload {upload_id} to {self.storage.name} failed")
+            record["status"] = "failed"
+            record["error"] = "Upload to storage failed"
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        self._write_record(record)
+        if source:
+            self._derive(record, source)
+
+    def _derive(self, record, source):
+        try:
+            if record["status"] == "done":
+                meta = self.image_processor.process(source, record["id"])
+                if self.on_image:
+                    self.on_image(record["url"], meta)
+                record["variants"] = {k: v for k, v in meta.items() if k.endswith("_url")}
+                self._write_record(record)
+        except Exception:
+            # The original is stored either way; search falls back to it
+            log.exception(f"Image derivatives for upload {record['id']} failed")
+        finally:
+            os.remove(source)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def public_upload(record):
+    data = {
+        "uploadId": record["id"],
+        "status": record["status"],
+        "received": record["received"],
+        "size": record["size"],
+    }
+    if record["url"]:
+        data["url"] = record["url"]
+    if record["error"]:
+        data["error"] = record["error"]
+    if record.get("variants"):
+        data["variants"] = record["variants"]
+    return data
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Routes, Route, Link, useNavigate, useLocation, Navigate } from 'react-router-dom';
-import { Home, Search, PlusSquare, User, LogIn, LogOut, Heart } from 'lucide-react';
+import { Home, Search, PlusSquare, User, LogIn, LogOut, Heart, MessageSquare } from 'lucide-react';
 
 // Import Page Components
 import UserProfile from './pages/Profile';
@@ -12,6 +12,8 @@ import SearchPage from './pages/Search';
 import HomePage from './pages/Home';
 
 import Saved from './pages/Saved';
+import MessagingPage, { StartConversation } from './pages/MessagingPage';
+import InboxPage from './pages/InboxPage';
 import Footer from './components/Footer';
 
 // Admin Page Imports
@@ -23,6 +25,7 @@ export const AppContext = React.createContext({
     currentUser: null,
     apiFetch: () => Promise.resolve(),
     uploadFile: () => Promise.resolve(),
+    apiBaseUrl: '',
 });
 
 // ** UPDATED: Redirects to /registeruser (The Auth Page) if not logged in **
@@ -64,6 +67,12 @@ const Header = ({ isLoggedIn, handleLogout }) => {
                         <Heart className="h-5 w-5" /> Saved
                     </Link>
 
+                    {isLoggedIn && (
+                        <Link to="/messages" className="flex items-center gap-1 text-gray-600 hover:text-black transition">
+                            <MessageSquare className="h-5 w-5" /> Messages
+                        </Link>
+                    )}
+
                     {isLoggedIn ? (
                         <Link to="/profile" className="flex items-center gap-1 text-gray-600 hover:text-black transition">
                             <User className="h-5 w-5" /> Profile
@@ -229,19 +238,74 @@ const App = () => {
         }
     };
 
+    // Uploads are processed in the background on the server: we get an upload id
+    // back and poll until the file has reached storage and has a URL.
+    const CHUNK_SIZE = 8 * 1024 * 1024; // Files above this are sent in resumable chunks
+
+    const waitForUpload = async (uploadId, headers) => {
+        for (let attempt = 0; attempt < 600; attempt++) {
+            const response = await fetch(`${BASE_API_URL}/upload/${uploadId}`, { headers });
+            if (!response.ok) throw new Error('File upload failed');
+            const data = await response.json();
+            if (data.status === 'done') return data.url;
+            if (data.status === 'failed') throw new Error(data.error || 'File upload failed');
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+        throw new Error('File upload timed out');
+    };
+
+    const uploadInChunks = async (file, headers) => {
+        const startRes = await fetch(`${BASE_API_URL}/upload/chunked`, {
+            method: 'POST',
+            headers: { ...headers, 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, contentType: file.type, size: file.size })
+        });
+        if (!startRes.ok) throw new Error('File upload failed');
+        const { uploadId } = await startRes.json();
+
+        let offset = 0;
+        let retries = 0;
+        while (offset < file.size) {
+            try {
+                const chunkRes = await fetch(`${BASE_API_URL}/upload/chunked/${uploadId}?offset=${offset}`, {
+                    method: 'PUT',
+                    headers,
+                    body: file.slice(offset, offset + CHUNK_SIZE)
+                });
+                const data = await chunkRes.json();
+                // 409 tells us where the server actually is - resume from there
+                if (!chunkRes.ok && chunkRes.status !== 409) throw new Error(data.error || 'File upload failed');
+                offset = data.received;
+                retries = 0;
+            } catch (error) {
+                if (++retries > 3) throw error;
+            }
+        }
+
+        const completeRes = await fetch(`${BASE_API_URL}/upload/chunked/${uploadId}/complete`, { method: 'POST', headers });
+        if (!completeRes.ok) throw new Error('File upload failed');
+        return uploadId;
+    };
+
     const uploadFile = async (file) => {
-        const formData = new FormData();
-        formData.append('file', file);
         try {
             const token = localStorage.getItem('authToken');
-            const response = await fetch(`${BASE_API_URL}/upload`, {
-                method: 'POST',
-                headers: { "Authorization": token ? `Bearer ${token}` : "" },
-                body: formData
-            });
-            if (!response.ok) throw new Error('File upload failed');
-            const data = await response.json();
-            return data.url;
+            const headers = { "Authorization": token ? `Bearer ${token}` : "" };
+            let uploadId;
+            if (file.size > CHUNK_SIZE) {
+                uploadId = await uploadInChunks(file, headers);
+            } else {
+                const formData = new FormData();
+                formData.append('file', file);
+                const response = await fetch(`${BASE_API_URL}/upload`, {
+                    method: 'POST',
+                    headers,
+                    body: formData
+                });
+                if (!response.ok) throw new Error('File upload failed');
+                uploadId = (await response.json()).uploadId;
+            }
+            return await waitForUpload(uploadId, headers);
         } catch (error) {
             console.error("Upload error:", error);
             displayModal("Failed to upload image");
@@ -295,7 +359,7 @@ const App = () => {
     }
 
     return (
-        <AppContext.Provider value={{ currentUser, apiFetch, uploadFile }}>
+        <AppContext.Provider value={{ currentUser, apiFetch, uploadFile, apiBaseUrl: BASE_API_URL }}>
             <Header isLoggedIn={isLoggedIn} handleLogout={handleLogout} />
             <main className={isAdminRoute ? "w-full h-full" : "container mx-auto mt-8 p-4"}>
                 <Routes>
@@ -374,6 +438,26 @@ const App = () => {
                         </ProtectedRoute>
                     } />
 
+                    {/* Conversations are addressed by id so both sides can open them;
+                      /message/:locationId starts (or finds) one from a listing */}
+                    <Route path="/messages" element={
+                        <ProtectedRoute isLoggedIn={isLoggedIn} redirectPath="/registeruser">
+                            <InboxPage />
+                        </ProtectedRoute>
+                    } />
+
+                    <Route path="/messages/:conversationId" element={
+                        <ProtectedRoute isLoggedIn={isLoggedIn} redirectPath="/registeruser">
+                            <MessagingPage />
+                        </ProtectedRoute>
+                    } />
+
+                    <Route path="/message/:locationId" element={
+                        <ProtectedRoute isLoggedIn={isLoggedIn} redirectPath="/registeruser">
+                            <StartConversation />
+                        </ProtectedRoute>
+                    } />
+
                     {/* Admin Routes */}
                     <Route path="/admin/login" element={<AdminLogin displayModal={displayModal} />} />
                     <Route path="/admin/*" element={<AdminDashboard />} />
@@ -0,0 +1,95 @@
+// src/pages/InboxPage.jsx
+import React, { useState, useEffect, useContext, useCallback, useRef } from 'react';
+import { Link } from 'react-router-dom';
+import { MessageSquare } from 'lucide-react';
+import { AppContext } from '../App';
+
+// Every conversation the user is in, as owner or enquirer, most recently active first
+const InboxPage = () => {
+    const { currentUser, apiFetch } = useContext(AppContext);
+
+    const [conversations, setConversations] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loading, setLoading] = useState(true);
+    const [error, setError] = useState(null);
+    const apiRef = useRef(apiFetch);
+    apiRef.current = apiFetch;
+
+    // One page of the inbox; with a cursor the page is appended
+    const fetchConversations = useCallback(async (cursor = null) => {
+        setLoading(true);
+        setError(null);
+        try {
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const response = await apiRef.current(`/conversations${query}`);
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Failed to load conversations');
+            setConversations(prev => (cursor ? [...prev, ...data.conversations] : data.conversations));
+            setNextCursor(data.nextCursor);
+        } catch (err) {
+            console.error("Error loading conversations: ", err);
+            setError(err.message);
+        } finally {
+            setLoading(false);
+        }
+    }, []);
+
+    useEffect(() => {
+        fetchConversations();
+    }, [fetchConversations]);
+
+    const isOwner = (conversation) => String(conversation.ownerId) === String(currentUser?.id);
+
+    if (loading && conversations.length === 0) return <p className="text-center mt-10 text-gray-500">Loading messages...</p>;
+    if (error) return <p className="text-center mt-10 text-red-500">{error}</p>;
+
+    return (
+        <div className="container mx-auto p-4">
+            <h1 className="text-2xl font-bold text-gray-800 mb-4">Messages</h1>
+            {conversations.length === 0 ? (
+                <p className="text-gray-500">No conversations yet. Use "Message Owner" on a location to start one.</p>
+            ) : (
+                <div className="bg-white rounded-lg shadow divide-y divide-gray-200">
+                    {conversations.map(conversation => (
+                        <Link
+                            key={conversation.id}
+                            to={`/messages/${conversation.id}`}
+                            className="flex items-center gap-4 p-4 hover:bg-gray-50 transition"
+                        >
+                            {conversation.image_url ? (
+                                <img src={conversation.image_url} alt={conversation.title} className="w-16 h-16 object-cover rounded" />
+                            ) : (
+                                <div className="w-16 h-16 flex items-center justify-center bg-gray-200 rounded">
+                                    <MessageSquare className="h-6 w-6 text-gray-500" />
+                                </div>
+                            )}
+                            <div className="flex-1 min-w-0">
+                                <div className="flex justify-between items-baseline">
+                                    <p className="font-semibold text-gray-800 truncate">{conversation.title}</p>
+                                    <span className="text-xs text-gray-500 ml-2">
+                                        {new Date(conversation.lastMessageAt).toLocaleDateString()}
+                                    </span>
+                                </div>
+                                <p className="text-xs text-gray-500">{isOwner(conversation) ? 'Enquiry about your location' : 'You enquired'}</p>
+                                <p className="text-sm text-gray-600 truncate">
+                                    {conversation.lastSenderId
+                                        ? `${String(conversation.lastSenderId) === String(currentUser?.id) ? 'You: ' : ''}${conversation.lastMessage || 'Attachment'}`
+                                        : 'No messages yet'}
+                                </p>
+                            </div>
+                        </Link>
+                    ))}
+                </div>
+            )}
+            {nextCursor && (
+                <div className="text-center mt-4">
+                    <button onClick={() => fetchConversations(nextCursor)} disabled={loading} className="px-4 py-2 text-blue-600 hover:underline">
+                        {loading ? 'Loading...' : 'Load more'}
+                    </button>
+                </div>
+            )}
+        </div>
+    );
+};
+
+export default InboxPage;
@@ -1,73 +1,178 @@
 // src/pages/MessagingPage.jsx
-import React, { useState, useRef, useEffect, useContext } from 'react';
+import React, { useState, useRef, useEffect, useContext, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { ChevronLeft, Paperclip, FileText } from 'lucide-react';
 import { AppContext } from '../App';
-import { collection, addDoc, serverTimestamp, query, orderBy, where, onSnapshot } from "firebase/firestore";
-import { ref, uploadBytes, getDownloadURL } from "firebase/storage";
 
-const MessagingPage = () => {
+// Adds messages to the list once each, keeping it oldest -> newest
+const mergeMessages = (current, incoming) => {
+    const byId = new Map(current.map(msg => [msg.id, msg]));
+    incoming.forEach(msg => byId.set(msg.id, { ...byId.get(msg.id), ...msg }));
+    return [...byId.values()].sort((a, b) => a.id - b.id);
+};
+
+// POST /conversations: the caller's conversation about a location, created the
+// first time. Rejects with err.status 400 when the caller owns the location.
+export const startConversation = async (apiFetch, locationId) => {
+    const response = await apiFetch('/conversations', {
+        method: 'POST',
+        body: JSON.stringify({ locationId: Number(locationId) })
+    });
+    const data = await response.json();
+    if (!response.ok) {
+        const err = new Error(data.error || 'Could not open the conversation');
+        err.status = response.status;
+        throw err;
+    }
+    return data.conversation;
+};
+
+// /message/:locationId - "Message Owner" lands here and is sent on to the
+// conversation. Owners can't enquire about their own location, so they go to
+// the inbox, where enquiries about it show up.
+export const StartConversation = () => {
     const { locationId } = useParams();
     const navigate = useNavigate();
-    const { auth, db, storage } = useContext(AppContext);
+    const { apiFetch } = useContext(AppContext);
+    const [error, setError] = useState(null);
+    const apiRef = useRef(apiFetch);
+    apiRef.current = apiFetch;
+
+    useEffect(() => {
+        let cancelled = false;
+        startConversation(apiRef.current, locationId)
+            .then(conversation => {
+                if (!cancelled) navigate(`/messages/${conversation.id}`, { replace: true });
+            })
+            .catch(err => {
+                if (cancelled) return;
+                if (err.status === 400) navigate('/messages', { replace: true });
+                else setError(err.message);
+            });
+        return () => { cancelled = true; };
+    }, [locationId, navigate]);
+
+    return (
+        <p className={`text-center mt-10 ${error ? 'text-red-500' : 'text-gray-500'}`}>
+            {error || 'Opening conversation...'}
+        </p>
+    );
+};
+
+const MessagingPage = () => {
+    const { conversationId } = useParams();
+    const navigate = useNavigate();
+    const { currentUser, apiFetch, uploadFile, apiBaseUrl } = useContext(AppContext);
 
     const [loading, setLoading] = useState(true);
+    const [conversation, setConversation] = useState(null);
+    const [error, setError] = useState(null);
     const [messageText, setMessageText] = useState('');
     const [messages, setMessages] = useState([]);
+    const [olderCursor, setOlderCursor] = useState(null);
+    const [loadingOlder, setLoadingOlder] = useState(false);
     const [selectedFile, setSelectedFile] = useState(null);
     const [isSending, setIsSending] = useState(false);
     const messagesEndRef = useRef(null);
+    const fileInputRef = useRef(null);
+    const stickToBottom = useRef(true);
+    // apiFetch is recreated on every App render; read it through a ref so the
+    // effects below only re-run when the conversation changes
+    const apiRef = useRef(apiFetch);
+    apiRef.current = apiFetch;
 
-    // Placeholder data (should be fetched from DB)
-    const locationData = {
-        title: "Victorian House 1",
-        ownerId: "owner_123" // Placeholder owner ID
-    };
+    const loadLatest = useCallback(async (id) => {
+        const response = await apiRef.current(`/conversations/${id}/messages`);
+        if (!response.ok) throw new Error((await response.json()).error || 'Failed to load messages');
+        const data = await response.json();
+        setMessages(prev => mergeMessages(prev, data.messages));
+        return data;
+    }, []);
+
+    // Open the conversation and load the newest page; either participant can
+    useEffect(() => {
+        let cancelled = false;
+        const open = async () => {
+            setLoading(true);
+            setError(null);
+            setMessages([]);
+            setConversation(null);
+            try {
+                const page = await loadLatest(conversationId);
+                if (cancelled) return;
+                setConversation(page.conversation);
+                setOlderCursor(page.nextCursor);
+            } catch (err) {
+                console.error("Error opening conversation: ", err);
+                if (!cancelled) setError(err.message);
+            } finally {
+                if (!cancelled) setLoading(false);
+            }
+        };
+        open();
+        return () => { cancelled = true; };
+    }, [loadLatest, conversationId]);
 
-    // Fetch messages from Firestore in real-time
+    // New messages are pushed over Server-Sent Events; EventSource reconnects by
+    // itself and the server replays anything missed since the last event id.
     useEffect(() => {
-        const q = query(collection(db, 'messages'), orderBy('createdAt'));
-        const unsubscribe = onSnapshot(q, (snapshot) => {
-            const fetchedMessages = snapshot.docs.map(doc => ({
-                id: doc.id,
-                ...doc.data()
-            }));
-            setMessages(fetchedMessages);
-            setLoading(false);
+        const token = localStorage.getItem('authToken');
+        if (!conversation || !token) return undefined;
+        const source = new EventSource(`${apiBaseUrl}/messages/stream?token=${encodeURIComponent(token)}`);
+        source.addEventListener('message', (event) => {
+            const { message } = JSON.parse(event.data);
+            if (message.conversationId !== conversation.id) return;
+            if (message.truncated) {
+                // Too large to push; fetch it with the latest page
+                loadLatest(conversation.id).catch(err => console.error(err));
+                return;
+            }
+            setMessages(prev => mergeMessages(prev, [message]));
         });
-        return () => unsubscribe();
-    }, [db, locationId]);
+        return () => source.close();
+    }, [apiBaseUrl, conversation, loadLatest]);
 
-    const handleSendMessage = async () => {
-        if (!auth.currentUser) {
-            alert('You must be logged in to send a message.');
-            return;
+    const loadOlder = async () => {
+        if (!olderCursor || loadingOlder) return;
+        setLoadingOlder(true);
+        stickToBottom.current = false;
+        try {
+            const response = await apiFetch(`/conversations/${conversation.id}/messages?cursor=${encodeURIComponent(olderCursor)}`);
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error);
+            setMessages(prev => mergeMessages(prev, data.messages));
+            setOlderCursor(data.nextCursor);
+        } catch (err) {
+            console.error("Error loading older messages: ", err);
+        } finally {
+            setLoadingOlder(false);
         }
+    };
 
+    const handleSendMessage = async () => {
+        if (!conversation) return;
         if (messageText.trim() === '' && !selectedFile) return;
 
         setIsSending(true);
 
         try {
-            let fileURL = null;
+            let fileUrl = null;
             let fileName = null;
 
             if (selectedFile) {
-                const fileRef = ref(storage, `attachments/${auth.currentUser.uid}/${selectedFile.name}`);
-                await uploadBytes(fileRef, selectedFile);
-                fileURL = await getDownloadURL(fileRef);
+                fileUrl = await uploadFile(selectedFile);
                 fileName = selectedFile.name;
             }
 
-            await addDoc(collection(db, 'messages'), {
-                locationId: locationId,
-                senderId: auth.currentUser.uid,
-                text: messageText,
-                file: fileURL,
-                fileName: fileName,
-                createdAt: serverTimestamp(),
+            const response = await apiFetch(`/conversations/${conversation.id}/messages`, {
+                method: 'POST',
+                body: JSON.stringify({ text: messageText, fileUrl, fileName })
             });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error);
 
+            stickToBottom.current = true;
+            setMessages(prev => mergeMessages(prev, [data.message]));
             setMessageText('');
             setSelectedFile(null);
         } catch (error) {
@@ -85,40 +190,51 @@ const MessagingPage = () => {
         }
     };
 
-    const scrollToBottom = () => {
-        messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
-    };
-
     useEffect(() => {
-        scrollToBottom();
+        if (stickToBottom.current) {
+            messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
+        }
+        stickToBottom.current = true;
     }, [messages]);
 
-    const fileInputRef = useRef(null);
+    const isMine = (msg) => String(msg.senderId) === String(currentUser?.id);
+    const isOwner = conversation && String(conversation.ownerId) === String(currentUser?.id);
 
     return (
         <div className="flex flex-col min-h-screen bg-gray-100">
             <div className="container mx-auto p-4 flex flex-col flex-1">
-                <button onClick={() => navigate(-1)} className="flex items-center text-gray-600 hover:text-black transition mb-2">
-                    <ChevronLeft className="h-5 w-5" /> Back to Search
+                <button onClick={() => navigate('/messages')} className="flex items-center text-gray-600 hover:text-black transition mb-2">
+                    <ChevronLeft className="h-5 w-5" /> Back to Messages
                 </button>
                 <div className="bg-white rounded-lg shadow-lg flex flex-col flex-1 overflow-hidden">
                     <h1 className="text-xl font-bold text-gray-800 p-4 border-b border-gray-200">
-                        Chat with Location Owner
+                        {isOwner ? 'Enquiry about your location' : 'Chat with Location Owner'}
                     </h1>
                     <div className="p-4 flex-1 overflow-y-auto space-y-4">
+                        {olderCursor && (
+                            <div className="text-center">
+                                <button onClick={loadOlder} disabled={loadingOlder} className="text-sm text-blue-600 hover:underline">
+                                    {loadingOlder ? 'Loading...' : 'Load earlier messages'}
+                                </button>
+                            </div>
+                        )}
                         {loading ? (
                             <p className="text-center text-gray-500">Loading messages...</p>
+                        ) : error ? (
+                            <p className="text-center text-red-500">{error}</p>
                         ) : messages.length === 0 ? (
                             <p className="text-center text-gray-500">Start the conversation!</p>
                         ) : (
                             messages.map(msg => (
-                                <div key={msg.id} className={`flex ${msg.senderId === auth.currentUser?.uid ? 'justify-end' : 'justify-start'}`}>
-                                    <div className={`p-3 rounded-lg max-w-sm ${msg.senderId === auth.currentUser?.uid ? 'bg-blue-600 text-white' : 'bg-gray-200 text-gray-800'}`}>
+                                <div key={msg.id} className={`flex ${isMine(msg) ? 'justify-end' : 'justify-start'}`}>
+                                    <div className={`p-3 rounded-lg max-w-sm ${isMine(msg) ? 'bg-blue-600 text-white' : 'bg-gray-200 text-gray-800'}`}>
                                         <p>{msg.text}</p>
                                         {msg.file && (
                                             <div className="mt-2 flex items-center space-x-2">
                                                 <FileText className="h-4 w-4" />
-                                                <a href={msg.file} target="_blank" rel="noopener noreferrer" className="text-sm underline">View Attachment</a>
+                                                <a href={msg.file} target="_blank" rel="noopener noreferrer" className="text-sm underline">
+                                                    {msg.fileName || 'View Attachment'}
+                                                </a>
                                             </div>
                                         )}
                                     </div>
@@ -151,12 +267,12 @@ const MessagingPage = () => {
                                     handleSendMessage();
                                 }
                             }}
-                            disabled={isSending}
+                            disabled={isSending || !conversation}
                         />
-                        <button 
-                            onClick={handleSendMessage} 
+                        <button
+                            onClick={handleSendMessage}
                             className="px-6 py-3 bg-blue-600 text-white rounded-lg font-semibold hover:bg-blue-700 transition"
-                            disabled={isSending}
+                            disabled={isSending || !conversation}
                         >
                             {isSending ? 'Sending...' : 'Send'}
                         </button>
@@ -167,4 +283,4 @@ const MessagingPage = () => {
     );
 };
 
-export default MessagingPage;
\ No newline at end of file
+export default MessagingPage;
@@ -28,6 +28,8 @@ const UserProfile = ({
 
     // Listings State
     const [myListings, setMyListings] = useState([]);
+    const [listingCounts, setListingCounts] = useState(null); // { pending, approved, ... }
+    const [listingsCursor, setListingsCursor] = useState(null);
     const [loadingListings, setLoadingListings] = useState(false);
     const [isSubmitting, setIsSubmitting] = useState(false);
 
@@ -44,16 +46,18 @@ const UserProfile = ({
         }
     }, [currentUser]);
 
-    const fetchMyListings = async () => {
+    // Paged, newest first; the first page also brings the per-status counts.
+    const fetchMyListings = async (cursor = null) => {
         if (!currentUser) return;
         setLoadingListings(true);
         try {
-            // Assuming your backend has an endpoint to get listings for the current user
-            // If not, you might need to fetch all and filter, but that's inefficient.
-            const response = await apiFetch(`/users/${currentUser.id}/listings`);
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const response = await apiFetch(`/users/${currentUser.id}/listings${query}`);
             if (response.ok) {
                 const data = await response.json();
-                setMyListings(data.listings || data); // Adjust based on your API structure
+                setMyListings(prev => cursor ? [...prev, ...data.listings] : data.listings);
+                setListingCounts(data.counts);
+                setListingsCursor(data.nextCursor);
             }
         } catch (error) {
             console.error("Failed to load listings", error);
@@ -220,8 +224,13 @@ const UserProfile = ({
                     <h2 className="text-2xl font-bold mb-6 text-gray-800 flex items-center">
                         <Building className="mr-2" /> My Listed Properties
                     </h2>
+                    {listingCounts && (
+                        <p className="text-sm text-gray-500 mb-4 -mt-4">
+                            {Object.entries(listingCounts).filter(([, n]) => n > 0).map(([status, n]) => `${n} ${status}`).join(' · ') || 'No listings yet'}
+                        </p>
+                    )}
 
-                    {loadingListings ? (
+                    {loadingListings && myListings.length === 0 ? (
                         <div className="flex justify-center p-8">
                             <Loader className="animate-spin text-gray-500" />
                         </div>
@@ -256,6 +265,15 @@ const UserProfile = ({
                                     </div>
                                 </div>
                             ))}
+                            {listingsCursor && (
+                                <button
+                                    onClick={() => fetchMyListings(listingsCursor)}
+                                    disabled={loadingListings}
+                                    className="md:col-span-2 lg:col-span-3 py-2 border border-gray-300 rounded text-sm font-medium hover:bg-gray-50 transition"
+                                >
+                                    {loadingListings ? 'Loading...' : 'Load more'}
+                                </button>
+                            )}
                         </div>
                     ) : (
                         <div className="text-center p-8 bg-gray-50 rounded-lg border border-gray-200">
@@ -321,25 +321,82 @@ const ShareDownloadModal = ({ savedLocations, onClose }) => {
 };
 
 
-export default function SavedLocations() {
-    const { auth, db } = useContext(AppContext);
-    const [savedLocations, setSavedLocations] = useState(() => {
-        try {
-            const storedLocations = localStorage.getItem('savedLocations');
-            return storedLocations ? JSON.parse(storedLocations) : [];
-        } catch (error) {
-            console.error("Failed to parse saved locations from localStorage:", error);
-            return [];
+// Only ids are kept locally; cards are fetched fresh from the API.
+const SAVED_IDS_KEY = 'savedLocationIds';
+const BATCH_SIZE = 200;
+
+const readSavedIds = () => {
+    try {
+        const storedIds = localStorage.getItem(SAVED_IDS_KEY);
+        if (storedIds) return JSON.parse(storedIds);
+        // One-off migration from the old format that stored whole location objects
+        const legacy = localStorage.getItem('savedLocations');
+        if (legacy) {
+            localStorage.removeItem('savedLocations');
+            return JSON.parse(legacy).map(loc => loc.id).filter(Boolean);
         }
-    });
+    } catch (error) {
+        console.error("Failed to parse saved locations from localStorage:", error);
+    }
+    return [];
+};
+
+// API card -> the shape the cards, modal and share/download helpers expect
+const cardToLocation = (card) => ({
+    id: card.id,
+    propertyType: card.type,
+    locationType: card.location,
+    age: card.age,
+    rooms: (card.rooms || []).join(', '),
+    interior: '',
+    exterior: '',
+    parking: '',
+    images: card.images || [],
+});
+
+export default function SavedLocations() {
+    const { currentUser, apiFetch } = useContext(AppContext);
+    const [savedIds, setSavedIds] = useState(readSavedIds);
+    const [savedLocations, setSavedLocations] = useState([]);
 
     useEffect(() => {
         try {
-            localStorage.setItem('savedLocations', JSON.stringify(savedLocations));
+            localStorage.setItem(SAVED_IDS_KEY, JSON.stringify(savedIds));
         } catch (error) {
             console.error("Failed to save locations to localStorage:", error);
         }
-    }, [savedLocations]);
+    }, [savedIds]);
+
+    // Merge the local list into the account (one request), then load cards in batches.
+    useEffect(() => {
+        let cancelled = false;
+        const load = async () => {
+            let ids = readSavedIds();
+            try {
+                if (currentUser) {
+                    const response = await apiFetch('/saved/sync', { method: 'POST', body: JSON.stringify({ ids }) });
+                    if (response.ok) ids = (await response.json()).ids;
+                }
+                const cards = [];
+                const missing = [];
+                for (let i = 0; i < ids.length; i += BATCH_SIZE) {
+                    const chunk = ids.slice(i, i + BATCH_SIZE);
+                    const response = await apiFetch(`/locations/batch?ids=${chunk.join(',')}`);
+                    if (!response.ok) continue;
+                    const data = await response.json();
+                    cards.push(...data.results);
+                    missing.push(...data.missing);
+                }
+                if (cancelled) return;
+                setSavedIds(ids.filter(id => !missing.includes(id)));
+                setSavedLocations(cards.map(cardToLocation));
+            } catch (error) {
+                console.error("Failed to load saved locations:", error);
+            }
+        };
+        load();
+        return () => { cancelled = true; };
+    }, [currentUser]);
 
     const [isDetailsModalOpen, setIsDetailsModalOpen] = useState(false);
     const [selectedLocation, setSelectedLocation] = useState(null);
@@ -357,14 +414,38 @@ export default function SavedLocations() {
         setChatRecipientName('');
     };
 
-    const handleRemoveSaved = (id) => {
+    const handleRemoveSaved = async (id) => {
         setSavedLocations(savedLocations.filter(location => location.id !== id));
-        console.log(`Location with ID ${id} removed from saved list.`);
+        setSavedIds(savedIds.filter(savedId => savedId !== id));
+        if (currentUser) {
+            try {
+                await apiFetch(`/saved/${id}`, { method: 'DELETE' });
+            } catch (error) {
+                console.error("Failed to remove saved location:", error);
+            }
+        }
     };
 
-    const openLocationDetails = (location) => {
+    // Cards carry a summary only; the description and features load on open.
+    const openLocationDetails = async (location) => {
         setSelectedLocation(location);
         setIsDetailsModalOpen(true);
+        try {
+            const response = await apiFetch(`/locations/${location.id}?fields=description,internalFeatures,externalFeatures,parking,images`);
+            if (!response.ok) return;
+            const detail = await response.json();
+            const full = {
+                ...location,
+                interior: detail.description || (detail.internalFeatures || []).join(', '),
+                exterior: (detail.externalFeatures || []).join(', '),
+                parking: detail.parking,
+                images: detail.images || location.images,
+            };
+            setSavedLocations(current => current.map(loc => (loc.id === location.id ? full : loc)));
+            setSelectedLocation(current => (current && current.id === location.id ? full : current));
+        } catch (error) {
+            console.error("Error loading location details:", error);
+        }
     };
 
     const closeLocationDetails = () => {
@@ -407,7 +488,7 @@ export default function SavedLocations() {
                                 <h4 className="text-xl font-semibold mb-2">{location.propertyType} in {location.locationType}</h4>
                                 <p className="text-gray-700 mb-1"><span className="font-medium">Age:</span> {location.age}</p>
                                 <p className="text-gray-700 mb-1"><span className="font-medium">Rooms:</span> {location.rooms}</p>
-                                <p className="text-gray-700 text-sm mt-2">{location.interior.substring(0, 100)}...</p>
+                                {location.interior && <p className="text-gray-700 text-sm mt-2">{location.interior.substring(0, 100)}...</p>}
                                 <div className="flex justify-between items-center mt-4">
                                     <button onClick={() => openLocationDetails(location)} className="bg-black text-white px-4 py-2 rounded hover:bg-gray-800 flex items-center justify-center gap-1">
                                         <Eye className="h-4 w-4" /> View Details
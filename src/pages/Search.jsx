@@ -84,33 +84,46 @@ const SearchPage = () => {
     const [isSearching, setIsSearching] = useState(false);
     const [isImageScrollerOpen, setIsImageScrollerOpen] = useState(false);
     const [currentScrollerImageIndex, setCurrentScrollerImageIndex] = useState(0);
+    const [nextCursor, setNextCursor] = useState(null); // Keyset cursor for the next page
+    const [activeFilters, setActiveFilters] = useState({});
+    const [loadingMore, setLoadingMore] = useState(false);
     
     const [filters, setFilters] = useState({
         propertyType: '',
         age: '',
         rooms: '',
         postcode: '',
+        lat: '',
+        lng: '',
+        radius_km: '10',
     });
+    const [locating, setLocating] = useState(false);
+    const [facets, setFacets] = useState({}); // { rooms: [{ value, count }], ... } for the current filters
 
     // --- FETCH DATA FROM DB ---
-    const fetchLocations = async (filterParams = {}) => {
-        setLoading(true);
+    // Results are paged: each call returns compact cards plus a cursor for the next page.
+    const fetchLocations = async (filterParams = {}, cursor = null) => {
+        if (cursor) setLoadingMore(true); else setLoading(true);
         try {
             // Convert filters object to query string
-            const query = new URLSearchParams(filterParams).toString();
-            const response = await apiFetch(`/locations/search?${query}`);
+            const params = new URLSearchParams(filterParams);
+            if (cursor) params.set('cursor', cursor); else params.set('facets', 'true');
+            const response = await apiFetch(`/locations/search?${params.toString()}`);
             
             if (response.ok) {
                 const data = await response.json();
                 
-                // MOCK COORDINATES (Since DB doesn't have them yet)
-                // This spreads dots randomly around London so Map View doesn't crash
-                const mappedData = data.map((loc, index) => ({
+                // Listings without a geocoded postcode get a placeholder spot
+                // around London so Map View doesn't crash
+                const mappedData = data.results.map((loc, index) => ({
                     ...loc,
-                    coords: [51.505 + (Math.random() * 0.1 - 0.05), -0.09 + (Math.random() * 0.1 - 0.05)] 
+                    coords: loc.coords || [51.505 + (Math.random() * 0.1 - 0.05), -0.09 + (Math.random() * 0.1 - 0.05)] 
                 }));
                 
-                setLocations(mappedData);
+                setLocations(prev => cursor ? [...prev, ...mappedData] : mappedData);
+                setNextCursor(data.nextCursor);
+                if (data.facets) setFacets(data.facets);
+                setActiveFilters(filterParams);
             } else {
                 console.error("Failed to fetch locations");
             }
@@ -118,6 +131,25 @@ const SearchPage = () => {
             console.error("Error loading locations:", error);
         } finally {
             setLoading(false);
+            setLoadingMore(false);
+        }
+    };
+
+    const loadMore = () => {
+        if (nextCursor) fetchLocations(activeFilters, nextCursor);
+    };
+
+    // Cards only carry a summary; fetch the full record when one is opened.
+    const openLocation = async (loc) => {
+        setSelectedLocation(loc);
+        try {
+            const response = await apiFetch(`/locations/${loc.id}`);
+            if (response.ok) {
+                const detail = await response.json();
+                setSelectedLocation(current => (current && current.id === loc.id ? { ...loc, ...detail } : current));
+            }
+        } catch (error) {
+            console.error("Error loading location details:", error);
         }
     };
 
@@ -139,8 +171,34 @@ const SearchPage = () => {
         setIsFilterMenuOpen(false);
     };
 
+    // "Kitchen (12)" - count of matches for the current filters, when known
+    const facetLabel = (facet, value) => {
+        const entry = (facets[facet] || []).find(f => f.value === value);
+        return entry ? `${value} (${entry.count})` : value;
+    };
+
+    // Radius search around the browser's position; results come back nearest first.
+    const useMyLocation = () => {
+        if (!navigator.geolocation) return;
+        setLocating(true);
+        navigator.geolocation.getCurrentPosition(
+            (position) => {
+                setFilters(prev => ({
+                    ...prev,
+                    lat: position.coords.latitude.toFixed(5),
+                    lng: position.coords.longitude.toFixed(5),
+                }));
+                setLocating(false);
+            },
+            (error) => {
+                console.error("Could not get your location:", error);
+                setLocating(false);
+            }
+        );
+    };
+
     const clearFilters = () => {
-        const emptyFilters = { propertyType: '', age: '', rooms: '', postcode: '' };
+        const emptyFilters = { propertyType: '', age: '', rooms: '', postcode: '', lat: '', lng: '', radius_km: '10' };
         setFilters(emptyFilters);
         fetchLocations(emptyFilters);
         setIsFilterMenuOpen(false);
@@ -205,17 +263,25 @@ const SearchPage = () => {
                     <div className="space-y-4">
                         <select name="propertyType" value={filters.propertyType} onChange={handleFilterChange} className="w-full p-2 border rounded">
                             <option value="">Any Property Type</option>
-                            {PROPERTY_STRUCTURAL_TYPES.map(t => <option key={t} value={t}>{t}</option>)}
+                            {PROPERTY_STRUCTURAL_TYPES.map(t => <option key={t} value={t}>{facetLabel('propertyType', t)}</option>)}
                         </select>
                         <select name="age" value={filters.age} onChange={handleFilterChange} className="w-full p-2 border rounded">
                             <option value="">Any Style / Era</option>
-                            {PROPERTY_STYLE_ERAS.map(t => <option key={t} value={t}>{t}</option>)}
+                            {PROPERTY_STYLE_ERAS.map(t => <option key={t} value={t}>{facetLabel('age', t)}</option>)}
                         </select>
                         <select name="rooms" value={filters.rooms} onChange={handleFilterChange} className="w-full p-2 border rounded">
                             <option value="">Any Room</option>
-                            {ROOM_TYPES.map(t => <option key={t} value={t}>{t}</option>)}
+                            {ROOM_TYPES.map(t => <option key={t} value={t}>{facetLabel('rooms', t)}</option>)}
                         </select>
                         <input type="text" name="postcode" value={filters.postcode} onChange={handleFilterChange} placeholder="Postcode" className="w-full p-2 border rounded" />
+                        <div className="flex gap-2">
+                            <button onClick={useMyLocation} disabled={locating} className={`flex-1 py-2 rounded border ${filters.lat ? 'bg-black text-white' : 'bg-white text-gray-700 hover:bg-gray-100'}`}>
+                                {locating ? 'Locating...' : filters.lat ? 'Near me ✓' : 'Near me'}
+                            </button>
+                            <select name="radius_km" value={filters.radius_km} onChange={handleFilterChange} className="p-2 border rounded">
+                                {[1, 5, 10, 25, 50].map(km => <option key={km} value={km}>{km} km</option>)}
+                            </select>
+                        </div>
                         
                         <div className="flex gap-2">
                             <button onClick={applyFilters} className="flex-1 bg-black text-white py-2 rounded hover:bg-gray-800">Apply</button>
@@ -245,8 +311,20 @@ const SearchPage = () => {
                             <div key={location.id} className="bg-white rounded-lg shadow-lg overflow-hidden relative">
                                 {/* Image Grid */}
                                 <div className="relative w-full h-64 grid grid-cols-3 gap-0.5">
-                                    {location.images && location.images.slice(0, 3).map((img, index) => (
-                                        <img key={index} src={img} alt="Loc" className="w-full h-full object-cover" />
+                                    {/* Thumbnails with a blurred inline placeholder while they load */}
+                                    {(location.thumbnails || (location.images || []).map(src => ({ src }))).slice(0, 3).map((img, index) => (
+                                        <img
+                                            key={index}
+                                            src={img.src}
+                                            srcSet={img.srcSet}
+                                            sizes="(min-width: 1024px) 20vw, 33vw"
+                                            width={img.width}
+                                            height={img.height}
+                                            loading={index === 0 ? 'eager' : 'lazy'}
+                                            alt="Loc"
+                                            className="w-full h-full object-cover"
+                                            style={img.placeholder ? { backgroundImage: `url(${img.placeholder})`, backgroundSize: 'cover' } : undefined}
+                                        />
                                     ))}
                                     {/* Fallback if no images */}
                                     {(!location.images || location.images.length === 0) && (
@@ -265,7 +343,7 @@ const SearchPage = () => {
                                                 {location.rooms && location.rooms.slice(0,3).map(r => <Pill key={r} text={r} type="Rooms & Areas" />)}
                                             </div>
                                             <div className="flex justify-end">
-                                                <button onClick={() => setSelectedLocation(location)} className="bg-white text-black px-4 py-2 rounded font-semibold hover:bg-gray-100 transition">
+                                                <button onClick={() => openLocation(location)} className="bg-white text-black px-4 py-2 rounded font-semibold hover:bg-gray-100 transition">
                                                     View Details
                                                 </button>
                                             </div>
@@ -276,6 +354,11 @@ const SearchPage = () => {
                         )) : (
                             <p className="text-center text-gray-500 mt-10">No locations found matching your criteria.</p>
                         )}
+                        {nextCursor && (
+                            <button onClick={loadMore} disabled={loadingMore} className="mx-auto px-6 py-2 bg-black text-white rounded-lg disabled:bg-gray-400">
+                                {loadingMore ? 'Loading...' : 'Load more'}
+                            </button>
+                        )}
                     </div>
                 ) : (
                     // Map View
@@ -286,7 +369,7 @@ const SearchPage = () => {
                                 <Marker key={loc.id} position={loc.coords}>
                                     <Popup>
                                         <strong>{loc.type}</strong><br/>{loc.location}<br/>
-                                        <button onClick={() => setSelectedLocation(loc)} className="text-blue-600 underline mt-1">View</button>
+                                        <button onClick={() => openLocation(loc)} className="text-blue-600 underline mt-1">View</button>
                                     </Popup>
                                 </Marker>
                             ))}
@@ -321,8 +404,8 @@ const SearchPage = () => {
                                     <h3 className="font-bold text-lg">Features</h3>
                                     <div className="flex flex-wrap gap-2 mt-2">
                                         <Pill text={selectedLocation.type} type="Type" />
-                                        {selectedLocation.rooms.map(r => <Pill key={r} text={r} type="Rooms & Areas" />)}
-                                        {selectedLocation.internalFeatures.map(f => <Pill key={f} text={f} type="Internal Features" />)}
+                                        {(selectedLocation.rooms || []).map(r => <Pill key={r} text={r} type="Rooms & Areas" />)}
+                                        {(selectedLocation.internalFeatures || []).map(f => <Pill key={f} text={f} type="Internal Features" />)}
                                     </div>
                                 </div>
                                 <div>